@@ -0,0 +1,420 @@
+"""
+Async variant of the database module for use from aiogram handlers.
+
+Every function mirrors the one with the same name in DataBase.database, but runs
+it on an SQLAlchemy AsyncSession over aiosqlite, so waiting on SQLite never blocks
+the event loop. The query logic itself lives in DataBase.database: each call is
+executed through AsyncSession.run_sync() with the session bound via
+database.bind_session(), so both modules always share one implementation.
+Inside unit_of_work() all calls share one AsyncSession instead of opening one each.
+"""
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from DataBase import database
+from DataBase.cache import MISSING
+# Pure helpers that don't touch the database are re-exported as is
+from DataBase.database import format_schedule_visualization, time_to_minutes, check_time_overlap
+# In-process read models shared with the sync module
+from DataBase.database import location_views
+
+# Global async engine and session factory
+engine = None
+AsyncSession = None
+
+# database.SessionBinding of the AsyncSession shared by the current unit of work
+_unit_of_work = ContextVar('async_unit_of_work', default=None)
+
+
+def init_async_db(db_path, max_connections=None):
+    """
+    Initialize the async engine (the schema is created by database.init_db).
+    Pass the number of updates processed at once as max_connections to let each of
+    them get a connection without waiting (the pool grows beyond the default 5+10).
+    """
+    global engine, AsyncSession
+
+    max_overflow = database.SQLITE_MAX_OVERFLOW
+    if max_connections is not None:
+        max_overflow = max(max_overflow, max_connections - database.SQLITE_POOL_SIZE)
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}",
+        echo=False,
+        pool_size=database.SQLITE_POOL_SIZE,
+        max_overflow=max_overflow
+    )
+    event.listen(engine.sync_engine, "connect", database.apply_sqlite_pragmas)
+    AsyncSession = async_sessionmaker(bind=engine)
+
+    logging.info("Async database initialized successfully")
+
+
+async def close_async_db():
+    """Close async database connections"""
+    if engine:
+        await engine.dispose()
+
+
+def _call_with_session(sync_session, func, args, kwargs, unit_of_work=False):
+    """Run a sync database function with session_scope() bound to sync_session"""
+    with database.bind_session(sync_session, unit_of_work):
+        result = func(*args, **kwargs)
+    if unit_of_work:
+        # End the transaction so the connection goes back to the pool: the update may now
+        # wait on Telegram for seconds, holding it would cap concurrency at the pool size
+        database.finish_unit_of_work(sync_session)
+    return result
+
+
+async def _run(func, *args, **kwargs):
+    """Run a DataBase.database function on the unit of work's AsyncSession, or a fresh one"""
+    binding = _unit_of_work.get()
+    if binding is not None and not binding.closed:
+        return await binding.session.run_sync(_call_with_session, func, args, kwargs, True)
+
+    async with AsyncSession() as session:
+        return await session.run_sync(_call_with_session, func, args, kwargs)
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """
+    Async counterpart of database.unit_of_work(): every call made inside shares one
+    AsyncSession, reads skip the commit and nothing is expired on commit. Unlike the
+    sync version the transaction ends after every call, so no pooled connection is held
+    while the caller awaits something else. Don't run calls of one unit of work
+    concurrently (asyncio.gather), a session isn't safe for that.
+    """
+    binding = _unit_of_work.get()
+    if binding is not None and not binding.closed:
+        yield binding.session
+        return
+
+    session = AsyncSession(expire_on_commit=False)
+    binding = database.SessionBinding(session, unit_of_work=True)
+    token = _unit_of_work.set(binding)
+    try:
+        yield session
+        await session.run_sync(database.finish_unit_of_work)
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        binding.closed = True
+        _unit_of_work.reset(token)
+        await session.close()
+
+
+# User functions
+async def add_user(user_data):
+    """Add a new user to the database"""
+    return await _run(database.add_user, user_data)
+
+
+async def update_user(user_id, first_name, patronymic, second_name, email, phone, role_id, confirm_email,
+                      confirm_phone, verified=None):
+    """Update user information"""
+    return await _run(database.update_user, user_id, first_name, patronymic, second_name, email, phone, role_id,
+                      confirm_email, confirm_phone, verified)
+
+
+async def update_user_verification_status(user_id, verified):
+    """Update user verification status"""
+    return await _run(database.update_user_verification_status, user_id, verified)
+
+
+async def get_user_by_email(email):
+    """Get user by email"""
+    return await _run(database.get_user_by_email, email)
+
+
+async def get_user_by_phone(phone):
+    """Get user by phone"""
+    return await _run(database.get_user_by_phone, phone)
+
+
+async def get_user_by_id(user_id):
+    """Get user by ID"""
+    return await _run(database.get_user_by_id, user_id)
+
+
+async def get_user_by_telegram_id(telegram_id):
+    """Get user by Telegram ID, a cache hit doesn't open a session at all"""
+    cached = database.user_cache.get(str(telegram_id))
+    if cached is not MISSING:
+        return dict(cached) if cached else None
+
+    return await _run(database.load_user_by_telegram_id, telegram_id)
+
+
+async def get_user_cache_stats():
+    """Hit/miss counters of the Telegram ID user cache"""
+    return database.get_user_cache_stats()
+
+
+async def get_all_users():
+    """Get all users"""
+    return await _run(database.get_all_users)
+
+
+async def get_filtered_users(search=None, role=None, email_verified=None, phone_verified=None, has_telegram=None,
+                             sort_by="first_name", sort_order="asc", limit=None):
+    """Users filtered and sorted in SQL"""
+    return await _run(database.get_filtered_users, search, role, email_verified, phone_verified, has_telegram,
+                      sort_by, sort_order, limit)
+
+
+async def search_users(query, limit=20):
+    """Users whose name, patronymic, email or phone contains query"""
+    return await _run(database.search_users, query, limit)
+
+
+async def get_users_page(after=None, before=None, limit=None):
+    """One page of users ordered by (second_name, id)"""
+    return await _run(database.get_users_page, after, before, limit)
+
+
+async def count_users():
+    """Number of users"""
+    return await _run(database.count_users)
+
+
+async def update_user_telegram_id(user_id, telegram_id):
+    """Update user's Telegram ID"""
+    return await _run(database.update_user_telegram_id, user_id, telegram_id)
+
+
+async def remove_user_telegram_id(user_id):
+    """Remove user's Telegram ID"""
+    return await _run(database.remove_user_telegram_id, user_id)
+
+
+async def update_user_email_verification(user_id, verified):
+    """Update user email verification status"""
+    return await _run(database.update_user_email_verification, user_id, verified)
+
+
+async def update_user_phone_verification(user_id, verified):
+    """Update user phone verification status"""
+    return await _run(database.update_user_phone_verification, user_id, verified)
+
+
+async def update_user_artist_form_status(user_id, status):
+    """Update artist form status"""
+    return await _run(database.update_user_artist_form_status, user_id, status)
+
+
+async def delete_user(user_id):
+    """Delete user from database"""
+    return await _run(database.delete_user, user_id)
+
+
+async def debug_existing_users():
+    """Debug function to check existing users in database"""
+    return await _run(database.debug_existing_users)
+
+
+# Verification token functions
+async def create_verification_token(user_id, type):
+    """Create a verification token for email or phone"""
+    return await _run(database.create_verification_token, user_id, type)
+
+
+async def verify_token(token, type):
+    """Verify a token and update user verification status"""
+    return await _run(database.verify_token, token, type)
+
+
+# Settings functions
+async def get_email_settings():
+    """Get email settings from database"""
+    if database.settings_store.snapshot() is not None:
+        return database.get_email_settings()
+    return await _run(database.get_email_settings)
+
+
+async def update_email_settings(settings_data):
+    """Update email settings"""
+    return await _run(database.update_email_settings, settings_data)
+
+
+# Role functions
+async def get_default_role():
+    """Get default user role ID"""
+    return await _run(database.get_default_role)
+
+
+async def get_admin_role():
+    """Get admin role ID"""
+    return await _run(database.get_admin_role)
+
+
+async def get_all_roles():
+    """Get all roles"""
+    return await _run(database.get_all_roles)
+
+
+async def set_user_role(user_id, role_name):
+    """Set user role by role name"""
+    return await _run(database.set_user_role, user_id, role_name)
+
+
+# Location functions
+async def add_location(location_data):
+    """Add a new location"""
+    return await _run(database.add_location, location_data)
+
+
+async def update_location(location_id, address):
+    """Update location information"""
+    return await _run(database.update_location, location_id, address)
+
+
+async def get_location_by_id(location_id):
+    """Get location by ID"""
+    return await _run(database.get_location_by_id, location_id)
+
+
+async def get_all_locations():
+    """Get all locations"""
+    return await _run(database.get_all_locations)
+
+
+async def search_locations(query, limit=None):
+    """Locations whose address contains query"""
+    return await _run(database.search_locations, query, limit)
+
+
+# Cooldown functions
+async def check_user_cooldown(user_id):
+    """Check if user is in cooldown period"""
+    return await _run(database.check_user_cooldown, user_id)
+
+
+async def get_cooldown_days():
+    """Get cooldown days setting"""
+    if database.settings_store.snapshot() is not None:
+        return database.get_cooldown_days()
+    return await _run(database.get_cooldown_days)
+
+
+async def set_cooldown_days(days):
+    """Set cooldown days setting"""
+    return await _run(database.set_cooldown_days, days)
+
+
+# Schedule functions
+async def get_location_schedule(location_id, date):
+    """Get detailed schedule for a location on a specific date"""
+    return await _run(database.get_location_schedule, location_id, date)
+
+
+async def get_available_time_suggestions(location_id, date, requested_start, requested_duration):
+    """Get alternative time suggestions when requested time is not available"""
+    return await _run(database.get_available_time_suggestions, location_id, date, requested_start,
+                      requested_duration)
+
+
+async def find_free_slots(date_from, date_to, duration_hours, limit=10, not_before=None):
+    """Find the earliest free windows across all locations"""
+    return await _run(database.find_free_slots, date_from, date_to, duration_hours, limit, not_before)
+
+
+# Booking functions
+async def create_booking(user_id, location_id, date, time, duration_hours):
+    """Create a new booking with time overlap checking and verification check"""
+    return await _run(database.create_booking, user_id, location_id, date, time, duration_hours)
+
+
+async def get_booking_by_id(booking_id):
+    """Get booking by ID"""
+    return await _run(database.get_booking_by_id, booking_id)
+
+
+async def update_booking(booking_id, date, time, duration_hours):
+    """Update booking information with overlap checking"""
+    return await _run(database.update_booking, booking_id, date, time, duration_hours)
+
+
+async def update_booking_status(booking_id, status):
+    """Update booking status"""
+    return await _run(database.update_booking_status, booking_id, status)
+
+
+async def get_user_bookings(user_id):
+    """Get all bookings for a user"""
+    return await _run(database.get_user_bookings, user_id)
+
+
+async def cancel_booking(booking_id, user_id):
+    """Cancel a booking"""
+    return await _run(database.cancel_booking, booking_id, user_id)
+
+
+async def delete_booking(booking_id):
+    """Delete booking from database"""
+    return await _run(database.delete_booking, booking_id)
+
+
+async def get_all_bookings_with_users():
+    """Get all bookings with user and location info"""
+    return await _run(database.get_all_bookings_with_users)
+
+
+async def get_upcoming_bookings_with_users(per_location=None, today=None, location_ids=None):
+    """Bookings from today on with user and location info, optionally the first N per location"""
+    return await _run(database.get_upcoming_bookings_with_users, per_location, today, location_ids)
+
+
+async def get_filtered_bookings(search=None, location_id=None, date_from=None, date_to=None, duration=None,
+                                sort_by="date", sort_order="asc", limit=None):
+    """Bookings with user and location info filtered and sorted in SQL"""
+    return await _run(database.get_filtered_bookings, search, location_id, date_from, date_to, duration,
+                      sort_by, sort_order, limit)
+
+
+async def get_bookings_page(after=None, before=None, limit=None, location_ids=None):
+    """One page of bookings with user and location info ordered by (date, time, id)"""
+    return await _run(database.get_bookings_page, after, before, limit, location_ids)
+
+
+async def count_bookings(location_ids=None):
+    """Number of bookings, optionally only at the given locations"""
+    return await _run(database.count_bookings, location_ids)
+
+
+# Statistics functions
+async def get_stats():
+    """User and booking statistics read from stats_counters"""
+    return await _run(database.get_stats)
+
+
+async def compute_stats():
+    """User and booking statistics recounted with GROUP BY queries"""
+    return await _run(database.compute_stats)
+
+
+# FSM storage functions
+async def get_fsm_record(key, not_before):
+    """(state, data JSON, updated_at) stored for key, or None if missing or expired"""
+    return await _run(database.get_fsm_record, key, not_before)
+
+
+async def save_fsm_records(records):
+    """Write (key, state, data JSON, updated_at) records in one transaction"""
+    return await _run(database.save_fsm_records, records)
+
+
+async def delete_expired_fsm_records(before):
+    """Delete FSM records last written before the given ISO datetime"""
+    return await _run(database.delete_expired_fsm_records, before)
+
+
+async def debug_database_tables():
+    """Debug function to check database contents"""
+    return await _run(database.debug_database_tables)
@@ -0,0 +1,109 @@
+"""
+In-memory availability index
+Keeps the booked intervals of every (location, date) that has been looked at, sorted by
+start minute, so schedules, suggestions and overlap checks are answered without SQLite.
+A day is loaded lazily on first use and then kept up to date by the booking functions
+of DataBase.database, which apply their changes once the transaction has committed.
+At most MAX_DAYS days are kept, the least recently used one is dropped first.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+# Days (location, date) kept in memory: every location for a few months ahead
+MAX_DAYS = 2048
+
+
+class DayIntervals:
+    """Bookings of one location on one date, sorted by start minute (never mutated in place)"""
+
+    def __init__(self, bookings):
+        self.bookings = sorted(bookings, key=lambda booking: booking['start_minute'])
+        self.starts = [booking['start_minute'] for booking in self.bookings]
+
+    def find_overlap(self, start_minute, end_minute, exclude_booking_id=None):
+        """First booking overlapping [start_minute, end_minute), or None"""
+        # Only bookings starting before end_minute can overlap
+        candidates = bisect.bisect_left(self.starts, end_minute)
+        for booking in self.bookings[:candidates]:
+            if booking['end_minute'] > start_minute and booking['id'] != exclude_booking_id:
+                return booking
+        return None
+
+    def booking_at(self, minute):
+        """Booking occupying the given minute, or None"""
+        return self.find_overlap(minute, minute + 1)
+
+    def is_free(self, start_minute, end_minute):
+        """Check if [start_minute, end_minute) doesn't overlap any booking"""
+        return self.find_overlap(start_minute, end_minute) is None
+
+    def with_booking(self, booking):
+        """Copy of the day with a booking added (or replaced)"""
+        return DayIntervals([b for b in self.bookings if b['id'] != booking['id']] + [booking])
+
+    def without_booking(self, booking_id):
+        """Copy of the day with a booking removed"""
+        return DayIntervals([b for b in self.bookings if b['id'] != booking_id])
+
+
+class AvailabilityIndex:
+    """Thread-safe LRU cache of DayIntervals keyed by (location_id, date)"""
+
+    def __init__(self, loader, max_days=MAX_DAYS):
+        # loader(session, location_id, date) -> list of booking dicts
+        self._loader = loader
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every change so a load racing with a commit is not cached
+        self._generation = 0
+
+    def day(self, session, location_id, date):
+        """Intervals of a location on a date, loaded through session on a miss"""
+        key = (location_id, date)
+        with self._lock:
+            day = self._days.get(key)
+            if day is not None:
+                self._days.move_to_end(key)
+                return day
+            generation = self._generation
+
+        day = DayIntervals(self._loader(session, location_id, date))
+
+        with self._lock:
+            if self._generation == generation:
+                self._days[key] = day
+                while len(self._days) > self.max_days:
+                    self._days.popitem(last=False)
+        return day
+
+    def add(self, booking):
+        """Record a committed booking (booking dict with start/end minutes)"""
+        key = (booking['location_id'], booking['date'])
+        with self._lock:
+            self._generation += 1
+            day = self._days.get(key)
+            if day is not None:
+                self._days[key] = day.with_booking(booking)
+
+    def remove(self, location_id, date, booking_id):
+        """Forget a committed cancellation or deletion"""
+        key = (location_id, date)
+        with self._lock:
+            self._generation += 1
+            day = self._days.get(key)
+            if day is not None:
+                self._days[key] = day.without_booking(booking_id)
+
+    def invalidate(self, location_id, date):
+        """Drop a day so it's reloaded on next use"""
+        with self._lock:
+            self._generation += 1
+            self._days.pop((location_id, date), None)
+
+    def clear(self):
+        """Drop everything (e.g. when switching databases)"""
+        with self._lock:
+            self._generation += 1
+            self._days.clear()
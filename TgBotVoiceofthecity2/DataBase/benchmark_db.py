@@ -0,0 +1,677 @@
+"""
+Database benchmark script
+Runs against a throw-away database file, the real database is never touched.
+
+Modes:
+    reads - how many reads the bot can serve while the admin API keeps writing
+    slots - hundreds of concurrent create_booking/update_booking calls for one slot,
+            exactly one of them must win; bookings right before and after it must
+            succeed and times off the 15-minute slot grid must be refused
+    lists - time and memory of the list queries (Core rows) against the ORM
+            hydration they replaced, on a database with 100k bookings
+    filters - SQL admin filters (DataBase/filters.py) against utils/filters.py over
+              a grid of parameters: results must be identical, times are compared; the
+              stats_counters statistics must match get_filter_stats() and a GROUP BY recount
+    search - full-text (FTS5 trigram) user search against a py_lower() scan at 100k users
+
+Usage: python DataBase/benchmark_db.py [reads|slots|lists|filters|search] [--seconds 5] [--readers 4] [--calls 300]
+                                       [--bookings 100000] [--users 100000]
+"""
+import os
+import sys
+import uuid
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from time import perf_counter, sleep
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.exc import OperationalError
+
+from DataBase import database
+from DataBase.models import User, Location, Booking
+from DataBase.migrations import run_migrations
+from DataBase import filters as sql_filters
+from utils import filters as python_filters
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Engine profiles to compare: SQLite defaults vs the profile used by init_db
+PROFILES = {
+    'default (DELETE journal)': {'journal_mode': 'DELETE'},
+    'production (WAL)': database.SQLITE_PRAGMAS,
+}
+
+LOCATIONS = 20
+BOOKINGS = 5000
+DATES = ['2025-06-%02d' % day for day in range(1, 31)]
+
+
+def create_profile_engine(db_path, pragmas):
+    """Create an engine configured like init_db, but with the given pragmas"""
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False},
+        pool_size=database.SQLITE_POOL_SIZE,
+        max_overflow=database.SQLITE_MAX_OVERFLOW
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+
+def seed_database(engine):
+    """Create the schema and fill it with locations and bookings"""
+    run_migrations(engine)
+
+    location_ids = [str(uuid.uuid4()) for _ in range(LOCATIONS)]
+    bookings = []
+    for _ in range(BOOKINGS):
+        start_minute = random.randrange(8, 20) * 60
+        bookings.append({
+            'id': str(uuid.uuid4()),
+            'user_id': str(uuid.uuid4()),
+            'location_id': random.choice(location_ids),
+            'date': random.choice(DATES),
+            'time': f"{start_minute // 60:02d}:00",
+            'duration_hours': 1,
+            'start_minute': start_minute,
+            'end_minute': start_minute + 60,
+        })
+
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO locations (id, address, img) VALUES (:id, :address, '')"),
+            [{'id': location_id, 'address': f"Адрес {i}"} for i, location_id in enumerate(location_ids)]
+        )
+        conn.execute(
+            text("INSERT INTO bookings (id, user_id, location_id, date, time, duration_hours, "
+                 "start_minute, end_minute, created_at) "
+                 "VALUES (:id, :user_id, :location_id, :date, :time, :duration_hours, "
+                 ":start_minute, :end_minute, CURRENT_TIMESTAMP)"),
+            bookings
+        )
+
+    return location_ids
+
+
+def writer(engine, stop, stats):
+    """Admin-like writer: short transactions that each hold the write lock for a moment"""
+    while not stop.is_set():
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("UPDATE bookings SET created_at = CURRENT_TIMESTAMP "
+                                  "WHERE id IN (SELECT id FROM bookings ORDER BY random() LIMIT 50)"))
+                sleep(0.005)
+            stats['writes'] += 1
+        except OperationalError:
+            stats['write_errors'] += 1
+
+
+def reader(engine, location_ids, stop, stats, latencies):
+    """Bot-like reader: schedule lookups for a location and date"""
+    while not stop.is_set():
+        started = perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(
+                    text("SELECT time, duration_hours FROM bookings "
+                         "WHERE location_id = :location_id AND date = :date "
+                         "ORDER BY start_minute"),
+                    {'location_id': random.choice(location_ids), 'date': random.choice(DATES)}
+                ).fetchall()
+            latencies.append(perf_counter() - started)
+        except OperationalError:
+            stats['read_errors'] += 1
+
+
+def run_profile(name, pragmas, seconds, readers):
+    """Run readers and one writer concurrently and return the collected numbers"""
+    db_dir = tempfile.mkdtemp(prefix='db_benchmark_')
+    db_path = os.path.join(db_dir, 'benchmark.db')
+    engine = create_profile_engine(db_path, pragmas)
+
+    try:
+        location_ids = seed_database(engine)
+
+        stop = threading.Event()
+        stats = {'writes': 0, 'write_errors': 0, 'read_errors': 0}
+        latencies = []
+
+        threads = [threading.Thread(target=writer, args=(engine, stop, stats))]
+        threads += [
+            threading.Thread(target=reader, args=(engine, location_ids, stop, stats, latencies))
+            for _ in range(readers)
+        ]
+
+        for thread in threads:
+            thread.start()
+        sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        return {
+            'profile': name,
+            'reads_per_sec': len(latencies) / seconds,
+            'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+            'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+            'writes_per_sec': stats['writes'] / seconds,
+            'read_errors': stats['read_errors'],
+            'write_errors': stats['write_errors'],
+        }
+    finally:
+        engine.dispose()
+        for file_name in os.listdir(db_dir):
+            os.remove(os.path.join(db_dir, file_name))
+        os.rmdir(db_dir)
+
+
+def run_slot_stress(calls, edits):
+    """Fire concurrent bookings (bot) and booking moves (admin) at one slot, return the outcome"""
+    db_dir = tempfile.mkdtemp(prefix='db_benchmark_')
+    db_path = os.path.join(db_dir, 'benchmark.db')
+    database.init_db(db_path)
+
+    try:
+        target_date = (date.today() + timedelta(days=30)).isoformat()
+        target_time, target_duration = '14:00', 2
+        location_id = database.add_location({'address': 'Стресс-тест', 'img': ''})
+
+        user_ids = [
+            database.add_user({
+                'first_name': 'Стресс',
+                'second_name': f'Тест{i}',
+                'email': f'stress{i}@example.com',
+                'phone': f'+7900{i:07d}',
+                'hash_password': 'stress',
+                'verified': True
+            })
+            for i in range(calls + edits)
+        ]
+
+        # Bookings the admin will try to move onto the target slot, one per day so they don't collide
+        edit_booking_ids = []
+        for i, user_id in enumerate(user_ids[calls:]):
+            edit_date = (date.today() + timedelta(days=60 + i)).isoformat()
+            database.create_booking(user_id, location_id, edit_date, target_time, target_duration)
+            with database.session_scope() as session:
+                edit_booking_ids.append(session.query(database.Booking.id).filter_by(user_id=user_id).scalar())
+
+        start = threading.Event()
+
+        def book(user_id):
+            start.wait()
+            success, _ = database.create_booking(user_id, location_id, target_date, target_time, target_duration)
+            return success
+
+        def move(booking_id):
+            start.wait()
+            return database.update_booking(booking_id, target_date, target_time, target_duration)
+
+        # Conflicts are logged as errors, keep the output readable
+        logging.disable(logging.CRITICAL)
+        with ThreadPoolExecutor(max_workers=calls + edits) as executor:
+            futures = [executor.submit(book, user_id) for user_id in user_ids[:calls]]
+            futures += [executor.submit(move, booking_id) for booking_id in edit_booking_ids]
+            started = perf_counter()
+            start.set()
+            results = [future.result() for future in futures]
+            elapsed = perf_counter() - started
+        logging.disable(logging.NOTSET)
+
+        with database.session_scope() as session:
+            bookings_in_slot = session.query(database.Booking).filter_by(
+                location_id=location_id, date=target_date
+            ).count()
+            slot_owners = {
+                row.booking_id for row in session.query(database.BookingSlot).filter_by(
+                    location_id=location_id, date=target_date
+                )
+            }
+
+        # Bookings that touch the winner without overlapping it must both succeed (12:00-14:00 and
+        # 16:00-17:00 around 14:00-16:00); a start off the slot grid must be refused everywhere
+        logging.disable(logging.CRITICAL)
+        adjacent = [
+            database.create_booking(user_ids[0], location_id, target_date, '12:00', 2)[0],
+            database.create_booking(user_ids[1], location_id, target_date, '16:00', 1)[0],
+        ]
+        off_grid = [
+            database.create_booking(user_ids[2], location_id, target_date, '17:10', 1)[0],
+            database.update_booking(edit_booking_ids[0], target_date, '17:10', 1) if edit_booking_ids else False,
+        ]
+        logging.disable(logging.NOTSET)
+
+        return {
+            'calls': calls + edits,
+            'successes': sum(1 for result in results if result),
+            'bookings_in_slot': bookings_in_slot,
+            'slot_owners': len(slot_owners),
+            'adjacent_booked': all(adjacent),
+            'off_grid_refused': not any(off_grid),
+            'elapsed': elapsed,
+        }
+    finally:
+        database.close_db()
+        for file_name in os.listdir(db_dir):
+            os.remove(os.path.join(db_dir, file_name))
+        os.rmdir(db_dir)
+
+
+def orm_get_all_users():
+    """get_all_users() as it was written with ORM objects"""
+    with database.session_scope() as session:
+        return [database.user_to_dict(user) for user in session.query(User).all()]
+
+
+def orm_get_user_bookings(user_id):
+    """get_user_bookings() as it was written with ORM objects"""
+    with database.session_scope() as session:
+        bookings = session.query(
+            Booking, Location.address.label('location_address')
+        ).join(
+            Location, Booking.location_id == Location.id
+        ).filter(
+            Booking.user_id == user_id
+        ).order_by(
+            Booking.date, Booking.time
+        ).all()
+
+        result = []
+        for booking, location_address in bookings:
+            booking_dict = database.booking_to_dict(booking)
+            booking_dict['location_address'] = location_address
+            result.append(booking_dict)
+        return result
+
+
+def orm_get_all_bookings_with_users():
+    """get_all_bookings_with_users() as it was written with ORM objects"""
+    with database.session_scope() as session:
+        bookings = session.query(
+            Booking, Location.address.label('location_address'),
+            User.id.label('user_id'), User.first_name, User.second_name, User.email, User.phone
+        ).join(
+            Location, Booking.location_id == Location.id
+        ).join(
+            User, Booking.user_id == User.id
+        ).order_by(
+            Booking.date, Booking.time
+        ).all()
+
+        result = []
+        for booking, location_address, user_id, first_name, second_name, email, phone in bookings:
+            booking_dict = database.booking_to_dict(booking)
+            booking_dict['location_address'] = location_address
+            booking_dict['available'] = False
+            booking_dict['speaker'] = {
+                'id': user_id, 'first_name': first_name, 'second_name': second_name, 'email': email, 'phone': phone
+            }
+            result.append(booking_dict)
+        return result
+
+
+def measure(func, *args):
+    """Run func twice: timed, then traced (tracemalloc slows it down), return (result, seconds, peak MB)"""
+    started = perf_counter()
+    result = func(*args)
+    elapsed = perf_counter() - started
+
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_list_queries(bookings):
+    """Compare the Core list queries with their ORM versions, results must be identical"""
+    db_dir = tempfile.mkdtemp(prefix='db_benchmark_')
+    db_path = os.path.join(db_dir, 'benchmark.db')
+    database.init_db(db_path)
+
+    try:
+        location_ids = [str(uuid.uuid4()) for _ in range(LOCATIONS)]
+        user_ids = [str(uuid.uuid4()) for _ in range(max(bookings // 100, 1))]
+        with database.engine.begin() as conn:
+            role_id = conn.execute(text("SELECT id FROM roles WHERE name = 'user'")).scalar()
+            conn.execute(
+                text("INSERT INTO locations (id, address, img) VALUES (:id, :address, '')"),
+                [{'id': location_id, 'address': f"Адрес {i}"} for i, location_id in enumerate(location_ids)]
+            )
+            conn.execute(
+                text("INSERT INTO users (id, first_name, second_name, email, confirm_email, phone, confirm_phone, "
+                     "hash_password, cooldown, role_id, agreements_status, verified, artist_form_filled) "
+                     "VALUES (:id, 'Имя', 'Фамилия', :email, 0, :phone, 0, 'hash', CURRENT_TIMESTAMP, :role_id, "
+                     "1, 1, 0)"),
+                [{'id': user_id, 'email': f"user{i}@example.com", 'phone': f"+7900{i:07d}", 'role_id': role_id}
+                 for i, user_id in enumerate(user_ids)]
+            )
+            rows = []
+            for _ in range(bookings):
+                start_minute = random.randrange(8, 20) * 60
+                rows.append({
+                    'id': str(uuid.uuid4()),
+                    'user_id': random.choice(user_ids),
+                    'location_id': random.choice(location_ids),
+                    'date': random.choice(DATES),
+                    'time': f"{start_minute // 60:02d}:00",
+                    'start_minute': start_minute,
+                    'end_minute': start_minute + 60,
+                })
+            conn.execute(
+                text("INSERT INTO bookings (id, user_id, location_id, date, time, duration_hours, "
+                     "start_minute, end_minute, created_at) "
+                     "VALUES (:id, :user_id, :location_id, :date, :time, 1, "
+                     ":start_minute, :end_minute, CURRENT_TIMESTAMP)"),
+                rows
+            )
+
+        cases = [
+            ('get_all_bookings_with_users', database.get_all_bookings_with_users, orm_get_all_bookings_with_users, ()),
+            ('get_all_users', database.get_all_users, orm_get_all_users, ()),
+            ('get_user_bookings', database.get_user_bookings, orm_get_user_bookings, (user_ids[0],)),
+        ]
+
+        results = []
+        for name, core_func, orm_func, args in cases:
+            orm_result, orm_seconds, orm_peak = measure(orm_func, *args)
+            core_result, core_seconds, core_peak = measure(core_func, *args)
+            results.append({
+                'query': name,
+                'rows': len(core_result),
+                'orm_ms': orm_seconds * 1000,
+                'core_ms': core_seconds * 1000,
+                'orm_mb': orm_peak,
+                'core_mb': core_peak,
+                'same': core_result == orm_result,
+            })
+        return results
+    finally:
+        database.close_db()
+        for file_name in os.listdir(db_dir):
+            os.remove(os.path.join(db_dir, file_name))
+        os.rmdir(db_dir)
+
+
+FIRST_NAMES = ['Иван', 'иван', 'Пётр', 'Анна', 'Zoe', 'adam', 'Ёлка']
+SECOND_NAMES = ['Иванов', 'Петров', 'Сидорова', 'Smith', 'smith', 'Орлов', 'Ёжиков']
+ADDRESSES = ['Арбат, 1', 'арбат, 2', 'Невский пр.', 'Red Square', 'Парк Горького']
+
+
+def seed_filter_data(users, bookings):
+    """Users and bookings with mixed case, Cyrillic, duplicates and NULL flags"""
+    location_ids = [str(uuid.uuid4()) for _ in ADDRESSES]
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    with database.engine.begin() as conn:
+        role_ids = list(conn.execute(text("SELECT id FROM roles")).scalars())
+        conn.execute(
+            text("INSERT INTO locations (id, address, img) VALUES (:id, :address, '')"),
+            [{'id': location_id, 'address': address} for location_id, address in zip(location_ids, ADDRESSES)]
+        )
+        conn.execute(
+            text("INSERT INTO users (id, first_name, patronymic, second_name, email, confirm_email, phone, "
+                 "confirm_phone, hash_password, cooldown, role_id, agreements_status, telegram_id, verified, "
+                 "artist_form_filled) "
+                 "VALUES (:id, :first_name, :patronymic, :second_name, :email, :confirm_email, :phone, "
+                 ":confirm_phone, 'hash', :cooldown, :role_id, 1, :telegram_id, :verified, 0)"),
+            [{
+                'id': user_id,
+                'first_name': random.choice(FIRST_NAMES),
+                'patronymic': random.choice(['', 'Иванович', 'Петровна']),
+                'second_name': random.choice(SECOND_NAMES),
+                'email': f"User{i}@Example.com",
+                'confirm_email': random.choice([0, 1]),
+                'phone': f"+7900{i:07d}",
+                'confirm_phone': random.choice([0, 1]),
+                'cooldown': f"2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}T10:00:00",
+                'role_id': random.choice(role_ids),
+                'telegram_id': random.choice([None, '', str(random.randint(1, 10 ** 9))]),
+                'verified': random.choice([0, 1, None]),
+            } for i, user_id in enumerate(user_ids)]
+        )
+        rows = []
+        for _ in range(bookings):
+            start_minute = random.randrange(9, 21) * 60
+            duration_hours = random.choice([1, 2])
+            rows.append({
+                'id': str(uuid.uuid4()),
+                'user_id': random.choice(user_ids),
+                'location_id': random.choice(location_ids),
+                'date': random.choice(DATES),
+                'time': f"{start_minute // 60:02d}:00",
+                'duration_hours': duration_hours,
+                'start_minute': start_minute,
+                'end_minute': start_minute + duration_hours * 60,
+                'created_at': f"2025-05-{random.randint(1, 28):02d}T{random.randint(0, 23):02d}:00:00",
+            })
+        if rows:
+            conn.execute(
+                text("INSERT INTO bookings (id, user_id, location_id, date, time, duration_hours, "
+                     "start_minute, end_minute, created_at) "
+                     "VALUES (:id, :user_id, :location_id, :date, :time, :duration_hours, "
+                     ":start_minute, :end_minute, :created_at)"),
+                rows
+            )
+    return role_ids, location_ids
+
+
+def run_filter_parity(users, bookings):
+    """Run both filter implementations over a grid of parameters, return (cases, mismatches, times)"""
+    db_dir = tempfile.mkdtemp(prefix='db_benchmark_')
+    db_path = os.path.join(db_dir, 'benchmark.db')
+    database.init_db(db_path)
+
+    try:
+        role_ids, location_ids = seed_filter_data(users, bookings)
+
+        user_cases = [
+            dict(search=search, role=role, email_verified=email_verified, has_telegram=has_telegram,
+                 sort_by=sort_by, sort_order=sort_order)
+            for search in [None, 'иван', 'SMITH', 'ё', '@example', '900000']
+            for role in [None, role_ids[0]]
+            for email_verified in [None, True]
+            for has_telegram in [None, True, False]
+            for sort_by in ['first_name', 'second_name', 'cooldown', 'verified', 'telegram_id', 'unknown']
+            for sort_order in ['asc', 'desc']
+        ]
+        booking_cases = [
+            dict(search=search, location_id=location_id, date_from=date_from, date_to=date_to, duration=duration,
+                 sort_by=sort_by, sort_order=sort_order)
+            for search in [None, 'арбат', 'Smith', 'иван']
+            for location_id in [None, location_ids[0]]
+            for date_from, date_to in [(None, None), ('2025-06-10', '2025-6-20'), ('bad', None)]
+            for duration in [None, 2]
+            for sort_by in ['date', 'time', 'location_address', 'speaker_name', 'duration_hours', 'created_at']
+            for sort_order in ['asc', 'desc']
+        ]
+
+        mismatches = []
+        times = {'python': 0.0, 'sql': 0.0}
+
+        for params in user_cases:
+            started = perf_counter()
+            expected = python_filters.filter_users(database.get_all_users(), **params)
+            times['python'] += perf_counter() - started
+            # get_filtered_users() leaves the password hash out
+            expected = [{key: value for key, value in user.items() if key != 'hash_password'} for user in expected]
+            started = perf_counter()
+            actual = database.get_filtered_users(**params)
+            times['sql'] += perf_counter() - started
+            if actual != expected:
+                mismatches.append(('users', params))
+
+        for params in booking_cases:
+            started = perf_counter()
+            expected = python_filters.filter_bookings(database.get_all_bookings_with_users(), **params)
+            times['python'] += perf_counter() - started
+            started = perf_counter()
+            actual = database.get_filtered_bookings(**params)
+            times['sql'] += perf_counter() - started
+            if actual != expected:
+                mismatches.append(('bookings', params))
+
+        # LIMIT must return the head of the full result
+        for params in user_cases[:20]:
+            if database.get_filtered_users(limit=10, **params) != database.get_filtered_users(**params)[:10]:
+                mismatches.append(('users limit', params))
+
+        # Trigger-maintained counters must match a GROUP BY recount and the Python stats,
+        # also after bookings were cancelled and users changed
+        for step in range(2):
+            expected = python_filters.get_filter_stats(
+                database.get_all_users(), database.get_all_bookings_with_users()
+            )
+            if not database.get_stats() == database.compute_stats() == expected:
+                mismatches.append(('stats', {'step': step}))
+            with database.session_scope() as session:
+                session.execute(text("DELETE FROM bookings WHERE rowid % 3 = 0"))
+                session.execute(text("UPDATE users SET confirm_email = NOT confirm_email, telegram_id = NULL "
+                                     "WHERE rowid % 4 = 0"))
+
+        return len(user_cases) + len(booking_cases) + 2, mismatches, times
+    finally:
+        database.close_db()
+        for file_name in os.listdir(db_dir):
+            os.remove(os.path.join(db_dir, file_name))
+        os.rmdir(db_dir)
+
+
+SEARCH_QUERIES = ['иван', 'smith', 'user4242@', '+790000123', 'петровна', 'нет такого']
+
+
+def run_search(users):
+    """Time search_users() (FTS) and the same search as a full scan, results must be identical"""
+    db_dir = tempfile.mkdtemp(prefix='db_benchmark_')
+    db_path = os.path.join(db_dir, 'benchmark.db')
+    database.init_db(db_path)
+
+    try:
+        seed_filter_data(users, 0)
+        user_table = User.__table__
+        columns = ['first_name', 'second_name', 'patronymic', 'email', 'phone']
+        repeats = 20
+
+        results = []
+        for query in SEARCH_QUERIES:
+            started = perf_counter()
+            for _ in range(repeats):
+                found = database.search_users(query, limit=20)
+            fts_ms = (perf_counter() - started) / repeats * 1000
+
+            # The same search without the index: py_lower() on every row
+            scan = select(user_table).where(
+                sql_filters.contains([user_table.c[column] for column in columns], query)
+            ).order_by(sql_filters.rowid(user_table)).limit(20)
+            started = perf_counter()
+            for _ in range(repeats):
+                with database.session_scope() as session:
+                    scanned = [dict(row) for row in session.execute(scan).mappings()]
+                scanned.sort(key=lambda user: (user['second_name'], user['id']))
+            scan_ms = (perf_counter() - started) / repeats * 1000
+
+            results.append({'query': query, 'found': len(found), 'fts_ms': fts_ms, 'scan_ms': scan_ms,
+                            'same': found == scanned})
+        return results
+    finally:
+        database.close_db()
+        for file_name in os.listdir(db_dir):
+            os.remove(os.path.join(db_dir, file_name))
+        os.rmdir(db_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite access patterns of the bot")
+    parser.add_argument('mode', nargs='?', default='reads', choices=['reads', 'slots', 'lists', 'filters', 'search'], help="what to measure")
+    parser.add_argument('--seconds', type=float, default=5, help="duration of each reads run")
+    parser.add_argument('--readers', type=int, default=4, help="number of reader threads")
+    parser.add_argument('--calls', type=int, default=300, help="concurrent create_booking calls in slots mode")
+    parser.add_argument('--edits', type=int, default=30, help="concurrent update_booking calls in slots mode")
+    parser.add_argument('--bookings', type=int, default=100000, help="bookings in the database in lists mode")
+    parser.add_argument('--users', type=int, default=100000, help="users in the database in search mode")
+    args = parser.parse_args()
+
+    if args.mode == 'search':
+        results = run_search(args.users)
+        print(f"\n{'query':<14} {'found':>6} {'FTS ms':>8} {'scan ms':>8} {'same':>5}")
+        for result in results:
+            print(f"{result['query']:<14} {result['found']:>6} {result['fts_ms']:>8.2f} {result['scan_ms']:>8.2f} "
+                  f"{'yes' if result['same'] else 'NO':>5}")
+        if not all(result['same'] for result in results):
+            sys.exit(1)
+        return
+
+    if args.mode == 'filters':
+        cases, mismatches, times = run_filter_parity(users=2000, bookings=10000)
+        print(f"\n{cases} parameter combinations: Python filters {times['python']:.2f}s, SQL {times['sql']:.2f}s")
+        for name, params in mismatches:
+            print(f"❌ {name} differ for {params}")
+        if mismatches:
+            sys.exit(1)
+        print("✅ SQL filters return exactly what utils/filters.py returns")
+        return
+
+    if args.mode == 'lists':
+        results = run_list_queries(args.bookings)
+        print(f"\n{'query':<28} {'rows':>7} {'ORM ms':>8} {'Core ms':>8} {'ORM MB':>7} {'Core MB':>8} {'same':>5}")
+        for result in results:
+            print(f"{result['query']:<28} {result['rows']:>7} {result['orm_ms']:>8.0f} {result['core_ms']:>8.0f} "
+                  f"{result['orm_mb']:>7.1f} {result['core_mb']:>8.1f} {'yes' if result['same'] else 'NO':>5}")
+        if not all(result['same'] for result in results):
+            sys.exit(1)
+        return
+
+    if args.mode == 'slots':
+        result = run_slot_stress(args.calls, args.edits)
+        print(f"\n{result['calls']} concurrent calls in {result['elapsed']:.2f}s: "
+              f"{result['successes']} succeeded, {result['bookings_in_slot']} booking(s) in the slot, "
+              f"{result['slot_owners']} slot owner(s)")
+        if result['successes'] == result['bookings_in_slot'] == result['slot_owners'] == 1:
+            print("✅ Exactly one booking won the slot")
+        else:
+            print("❌ Double booking detected!")
+            sys.exit(1)
+        if result['adjacent_booked'] and result['off_grid_refused']:
+            print("✅ Adjacent bookings accepted, times off the slot grid refused")
+        else:
+            print(f"❌ Adjacent bookings accepted: {result['adjacent_booked']}, "
+                  f"off-grid times refused: {result['off_grid_refused']}")
+            sys.exit(1)
+        return
+
+    results = []
+    for name, pragmas in PROFILES.items():
+        logger.info(f"Running profile: {name}")
+        results.append(run_profile(name, pragmas, args.seconds, args.readers))
+
+    print(f"\n{'profile':<26} {'reads/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'writes/s':>9} "
+          f"{'read err':>9} {'write err':>10}")
+    for result in results:
+        print(f"{result['profile']:<26} {result['reads_per_sec']:>10.0f} {result['p50_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['writes_per_sec']:>9.0f} "
+              f"{result['read_errors']:>9} {result['write_errors']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Small in-process caches for hot read paths
+"""
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+# Returned by TTLCache.get() on a miss, so that None can be cached as well
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry time to live and hit/miss counters"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation, see set()
+        self.generation = 0
+
+    def get(self, key):
+        """Cached value for key, or MISSING if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, generation=None):
+        """
+        Store value for key, evicting the least recently used entry when full.
+        Pass the generation read before loading value to skip storing it if an
+        invalidation happened meanwhile (the loaded value may already be stale).
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop one key"""
+        with self._lock:
+            self.generation += 1
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+class SettingsStore:
+    """Thread-safe process-wide copy of the settings table, loaded with one query"""
+
+    def __init__(self, loader):
+        # loader(session) -> {key: value} for the whole table
+        self._loader = loader
+        self._values = None
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def snapshot(self):
+        """Copy of all settings, or None if they haven't been loaded yet"""
+        with self._lock:
+            return dict(self._values) if self._values is not None else None
+
+    def values(self, session):
+        """Copy of all settings, loaded through session on first use"""
+        with self._lock:
+            if self._values is not None:
+                return dict(self._values)
+            generation = self._generation
+
+        values = self._loader(session)
+
+        with self._lock:
+            if self._generation == generation:
+                self._values = values
+        return dict(values)
+
+    def update(self, changes):
+        """Apply committed changes ({key: value}) to the cached copy"""
+        with self._lock:
+            self._generation += 1
+            if self._values is not None:
+                # Replace rather than mutate, readers may still hold the old dict
+                self._values = {**self._values, **changes}
+
+    def invalidate(self):
+        """Drop the cached copy so it's reloaded on next use"""
+        with self._lock:
+            self._generation += 1
+            self._values = None
@@ -1,283 +1,225 @@
-from sqlalchemy import create_engine, and_, or_, update, text
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine, event, and_, or_, update, select, func, tuple_, text
+from sqlalchemy.orm import sessionmaker, scoped_session, Session as OrmSession
 from sqlalchemy.exc import IntegrityError
 from contextlib import contextmanager
+from contextvars import ContextVar
 import logging
 import uuid
 import secrets
-import os
+from time import perf_counter
 from datetime import datetime, timedelta
 
-from DataBase.models import Base, Role, User, Location, Booking, Settings, VerificationToken
+from DataBase.models import (
+    Base, Role, User, Location, Booking, BookingSlot, Settings, StatsCounter, FSMState, VerificationToken, slot_range,
+    on_slot_grid, SLOT_MINUTES
+)
+from DataBase import migrations
+from DataBase.migrations import run_migrations, SEARCH_TABLES
+from DataBase.availability import AvailabilityIndex
+from DataBase import filters
+from DataBase.cache import TTLCache, SettingsStore, MISSING
 
 # Global engine and session factory
 engine = None
 Session = None
 
+# SessionBinding that session_scope() should reuse instead of opening its own session
+_bound_session = ContextVar('bound_session', default=None)
 
-def init_db(db_path):
-    """Initialize the database with SQLAlchemy"""
-    global engine, Session
-
-    # Create SQLite engine
-    connection_string = f"sqlite:///{db_path}"
-    engine = create_engine(connection_string, echo=False)
-
-    # Create session factory
-    Session = scoped_session(sessionmaker(bind=engine))
-
-    # Force check for schema changes and recreate if needed
-    logging.info("Checking database schema...")
-    needs_recreation = check_if_needs_recreation(db_path)
-
-    if needs_recreation:
-        logging.info("Database schema needs update - recreating tables...")
-        recreate_database_tables()
-    else:
-        # Create tables if they don't exist
-        Base.metadata.create_all(engine)
-
-    # Initialize default data
-    with session_scope() as session:
-        # Create default roles if they don't exist
-        if not session.query(Role).filter_by(name="user").first():
-            session.add(Role(name="user"))
-
-        if not session.query(Role).filter_by(name="admin").first():
-            session.add(Role(name="admin"))
+# Users by Telegram ID (None is cached too), invalidated after commits that change a user
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
-        # Create default settings if they don't exist
-        if not session.query(Settings).filter_by(key="cooldown_days").first():
-            session.add(Settings(key="cooldown_days", value="2"))
+# Rendered booking tables of the bot's "📋 Точки" view by location ID (filled by
+# handlers.bookings), invalidated after commits that change what a table shows
+LOCATION_VIEW_CACHE_SIZE = 256
+LOCATION_VIEW_CACHE_TTL = 3600
+location_views = TTLCache(maxsize=LOCATION_VIEW_CACHE_SIZE, ttl=LOCATION_VIEW_CACHE_TTL)
 
-        # Create email settings if they don't exist
-        if not session.query(Settings).filter_by(key="smtp_server").first():
-            session.add(Settings(key="smtp_server", value="smtp.gmail.com"))
 
-        if not session.query(Settings).filter_by(key="smtp_port").first():
-            session.add(Settings(key="smtp_port", value="587"))
+class SessionBinding:
+    """Session shared by every session_scope() of the current context"""
 
-        if not session.query(Settings).filter_by(key="smtp_username").first():
-            session.add(Settings(key="smtp_username", value="your-email@gmail.com"))
+    def __init__(self, session, unit_of_work=False):
+        self.session = session
+        # In a unit of work only scopes that wrote something commit, see session_scope()
+        self.unit_of_work = unit_of_work
+        # Set once the owner is done with the session; tasks that copied the context
+        # (and outlive the update) then fall back to sessions of their own
+        self.closed = False
 
-        if not session.query(Settings).filter_by(key="smtp_password").first():
-            session.add(Settings(key="smtp_password", value="your-app-password"))
 
-        if not session.query(Settings).filter_by(key="email_from").first():
-            session.add(Settings(key="email_from", value="Voice of the City <your-email@gmail.com>"))
+@contextmanager
+def bind_session(session, unit_of_work=False):
+    """Make every session_scope() in the current context reuse the given session"""
+    binding = SessionBinding(session, unit_of_work)
+    token = _bound_session.set(binding)
+    try:
+        yield session
+    finally:
+        binding.closed = True
+        _bound_session.reset(token)
 
-    logging.info("Database initialized successfully")
 
+def active_unit_of_work():
+    """Session of the unit of work the current context runs in, or None"""
+    binding = _bound_session.get()
+    if binding is not None and binding.unit_of_work and not binding.closed:
+        return binding.session
+    return None
 
-def check_if_needs_recreation(db_path):
-    """Check if database needs recreation due to schema changes"""
-    if not os.path.exists(db_path):
-        return False
 
+@contextmanager
+def unit_of_work():
+    """
+    Share one session between all database calls of a bot update or API request.
+    Reads don't commit (pysqlite doesn't even open a transaction for a SELECT), writes
+    are still committed by the session_scope() that made them, so the write lock is
+    never held across handler code. Objects are not expired on commit: whatever was
+    loaded earlier in the unit of work is not reloaded by the next call. Nested calls
+    join the outer unit of work.
+    """
+    if active_unit_of_work() is not None:
+        yield active_unit_of_work()
+        return
+
+    session = Session.session_factory(expire_on_commit=False)
     try:
-        # Try to connect and check table structure
-        temp_engine = create_engine(f"sqlite:///{db_path}")
-        with temp_engine.connect() as conn:
-            # Check if users table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='users'"))
-            if not result.fetchone():
-                temp_engine.dispose()
-                return False
-
-            # Check table structure
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            columns = [row[1] for row in result.fetchall()]
-
-            logging.info(f"Current users table columns: {columns}")
-
-            # Check for old schema (passport column) or missing new schema (verified column)
-            if 'passport' in columns:
-                logging.info("Found passport column - database needs recreation")
-                temp_engine.dispose()
-                return True
+        with bind_session(session, unit_of_work=True):
+            yield session
+        finish_unit_of_work(session)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
-            if 'verified' not in columns:
-                logging.info("Missing verified column - database needs recreation")
-                temp_engine.dispose()
-                return True
 
-        temp_engine.dispose()
-        return False
-    except Exception as e:
-        logging.error(f"Error checking database schema: {e}")
-        return True  # Force recreation if we can't check
+def has_writes(session):
+    """Check if the session's transaction wrote (or is about to flush) anything"""
+    return bool(session.info.get('has_writes') or session.new or session.dirty or session.deleted)
 
 
-def recreate_database_tables():
-    """Recreate database tables with new schema"""
-    try:
-        logging.info("Starting database recreation process...")
+def finish_unit_of_work(session):
+    """Commit writes left by code that used the session directly, end a read-only transaction"""
+    if has_writes(session):
+        session.commit()
+    elif session.in_transaction():
+        session.rollback()
 
-        # Backup existing data
-        backup_data = backup_existing_data()
-        logging.info("Data backup completed")
 
-        # Drop all tables
-        Base.metadata.drop_all(engine)
-        logging.info("Dropped old tables")
+# Pragmas applied to every new SQLite connection (bot, admin API and async engine)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # Readers no longer wait for the writer
+    "synchronous": "NORMAL",  # Safe with WAL, fsync only at checkpoints
+    "busy_timeout": 5000,  # Wait up to 5s for a lock instead of failing with "database is locked"
+    "cache_size": -32000,  # 32 MB page cache per connection
+    "mmap_size": 268435456,  # 256 MB of the file read through mmap
+    "temp_store": "MEMORY",
+}
 
-        # Create new tables
-        Base.metadata.create_all(engine)
-        logging.info("Created new tables with updated schema")
+# Connection pool shared by the bot and admin API threads
+SQLITE_POOL_SIZE = 5
+SQLITE_MAX_OVERFLOW = 10
 
-        # Restore data
-        restore_data(backup_data)
-        logging.info("Restored data to new schema")
 
-        # Verify the new schema
-        with engine.connect() as conn:
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            new_columns = [row[1] for row in result.fetchall()]
-            logging.info(f"New users table columns: {new_columns}")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure a new SQLite connection (SQLAlchemy "connect" event listener)"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
 
-            if 'passport' not in new_columns and 'verified' in new_columns:
-                logging.info("✅ Database recreation successful - passport column removed, verified column added")
-            else:
-                logging.error("❌ Database recreation failed - schema not updated correctly")
+    # Unicode-aware lower() for the admin filters, see DataBase/filters.py
+    dbapi_connection.create_function("py_lower", 1, filters.py_lower, deterministic=True)
 
-    except Exception as e:
-        logging.error(f"Error recreating database: {e}")
-        raise
 
+# Default rows created on first start, existing rows are left untouched
+DEFAULT_ROLES = ["user", "admin"]
 
-def backup_existing_data():
-    """Backup existing data before recreation"""
-    backup = {
-        'users': [],
-        'locations': [],
-        'bookings': [],
-        'roles': [],
-        'settings': [],
-        'verification_tokens': []
-    }
+DEFAULT_SETTINGS = {
+    "cooldown_days": "2",
+    "smtp_server": "smtp.gmail.com",
+    "smtp_port": "587",
+    "smtp_username": "your-email@gmail.com",
+    "smtp_password": "your-app-password",
+    "email_from": "Voice of the City <your-email@gmail.com>",
+}
 
-    try:
-        with engine.connect() as conn:
-            # Backup users (excluding passport, including verified if exists)
-            try:
-                # First check what columns exist
-                result = conn.execute(text("PRAGMA table_info(users)"))
-                columns = [row[1] for row in result.fetchall()]
-
-                # Build SELECT query based on available columns
-                user_columns = ['id', 'first_name', 'patronymic', 'second_name', 'email', 'confirm_email',
-                                'phone', 'confirm_phone', 'hash_password', 'cooldown', 'role_id',
-                                'agreements_status', 'telegram_id', 'saved_telegram_id']
-
-                # Add verified column if it exists
-                if 'verified' in columns:
-                    user_columns.append('verified')
-
-                # Filter out columns that don't exist
-                existing_columns = [col for col in user_columns if col in columns]
-
-                query = f"SELECT {', '.join(existing_columns)} FROM users"
-                result = conn.execute(text(query))
-                backup['users'] = [dict(row._mapping) for row in result.fetchall()]
-                logging.info(f"Backed up {len(backup['users'])} users")
-            except Exception as e:
-                logging.warning(f"Could not backup users: {e}")
-
-            # Backup other tables
-            for table in ['locations', 'bookings', 'roles', 'settings', 'verification_tokens']:
-                try:
-                    result = conn.execute(text(f"SELECT * FROM {table}"))
-                    backup[table] = [dict(row._mapping) for row in result.fetchall()]
-                    logging.info(f"Backed up {len(backup[table])} {table}")
-                except Exception as e:
-                    logging.warning(f"Could not backup {table}: {e}")
 
-    except Exception as e:
-        logging.error(f"Error during backup: {e}")
+def init_db(db_path):
+    """Initialize the database with SQLAlchemy"""
+    global engine, Session
 
-    return backup
+    timings = {}
+    started = perf_counter()
 
+    # Create SQLite engine
+    connection_string = f"sqlite:///{db_path}"
+    engine = create_engine(
+        connection_string,
+        echo=False,
+        connect_args={"check_same_thread": False},
+        pool_size=SQLITE_POOL_SIZE,
+        max_overflow=SQLITE_MAX_OVERFLOW
+    )
+    event.listen(engine, "connect", apply_sqlite_pragmas)
 
-def restore_data(backup_data):
-    """Restore data after recreation"""
-    with session_scope() as session:
-        try:
-            # Restore roles first
-            for role_data in backup_data['roles']:
-                role = Role(name=role_data['name'])
-                role.id = role_data['id']
-                session.merge(role)
-
-            # Restore settings
-            for setting_data in backup_data['settings']:
-                setting = Settings(key=setting_data['key'], value=setting_data['value'])
-                setting.id = setting_data['id']
-                session.merge(setting)
-
-            # Restore locations
-            for location_data in backup_data['locations']:
-                location = Location(address=location_data['address'], img=location_data['img'])
-                location.id = location_data['id']
-                session.merge(location)
-
-            # Restore users (without passport, with verified)
-            for user_data in backup_data['users']:
-                user = User(
-                    first_name=user_data['first_name'],
-                    patronymic=user_data.get('patronymic', ''),
-                    second_name=user_data['second_name'],
-                    email=user_data['email'],
-                    phone=user_data['phone'],
-                    hash_password=user_data['hash_password'],
-                    role_id=user_data['role_id'],
-                    telegram_id=user_data.get('telegram_id'),
-                    saved_telegram_id=user_data.get('saved_telegram_id')
-                )
-                user.id = user_data['id']
-                user.confirm_email = user_data.get('confirm_email', False)
-                user.confirm_phone = user_data.get('confirm_phone', False)
-                user.cooldown = user_data.get('cooldown', datetime.now().isoformat())
-                user.agreements_status = user_data.get('agreements_status', True)
-                user.verified = user_data.get('verified', False)  # Restore verified status or default to False
-                session.merge(user)
-
-            # Restore bookings
-            for booking_data in backup_data['bookings']:
-                booking = Booking()
-                booking.id = booking_data['id']
-                booking.user_id = booking_data['user_id']
-                booking.location_id = booking_data['location_id']
-                booking.date = booking_data['date']
-                booking.time = booking_data['time']
-                booking.duration_hours = booking_data['duration_hours']
-                booking.created_at = booking_data['created_at']
-                session.merge(booking)
-
-            # Restore verification tokens
-            for token_data in backup_data['verification_tokens']:
-                token = VerificationToken(
-                    user_id=token_data['user_id'],
-                    token=token_data['token'],
-                    type=token_data['type']
-                )
-                token.id = token_data['id']
-                token.created_at = token_data['created_at']
-                token.expires_at = token_data['expires_at']
-                token.is_used = token_data.get('is_used', False)
-                session.merge(token)
+    # Create session factory
+    Session = scoped_session(sessionmaker(bind=engine))
+    availability.clear()
+    user_cache.clear()
+    location_views.clear()
+    settings_store.invalidate()
+    timings['engine'] = perf_counter() - started
 
-            session.commit()
-            logging.info("Successfully restored all data")
+    # Apply pending schema migrations (a single user_version read when up to date)
+    stage_started = perf_counter()
+    run_migrations(engine)
+    timings['schema'] = perf_counter() - stage_started
 
-        except Exception as e:
-            logging.error(f"Error restoring data: {e}")
-            session.rollback()
-            raise
+    # Initialize default data
+    stage_started = perf_counter()
+    seed_default_data()
+    timings['seed'] = perf_counter() - stage_started
+
+    timings['total'] = perf_counter() - started
+    logging.info("Database initialized successfully (" +
+                 ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items()) + ")")
+    return timings
+
+
+def seed_default_data():
+    """Create default roles and settings with one idempotent INSERT OR IGNORE batch"""
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT OR IGNORE INTO roles (id, name) VALUES (:id, :name)"),
+            [{"id": str(uuid.uuid4()), "name": name} for name in DEFAULT_ROLES]
+        )
+        conn.execute(
+            text("INSERT OR IGNORE INTO settings (id, key, value) VALUES (:id, :key, :value)"),
+            [{"id": str(uuid.uuid4()), "key": key, "value": value} for key, value in DEFAULT_SETTINGS.items()]
+        )
 
 
 @contextmanager
 def session_scope():
     """Provide a transactional scope around a series of operations"""
+    binding = _bound_session.get()
+    if binding is not None and not binding.closed:
+        # Reuse the session bound by the caller (async_database, unit_of_work) instead of opening a new one
+        bound_session = binding.session
+        try:
+            yield bound_session
+            if not binding.unit_of_work or has_writes(bound_session):
+                bound_session.commit()
+        except Exception as e:
+            bound_session.rollback()
+            logging.error(f"Database error: {e}")
+            raise
+        return
+
     session = Session()
     try:
         yield session
@@ -290,6 +232,94 @@ def session_scope():
         session.close()
 
 
+def run_after_commit(session, func, *args):
+    """Call func(*args) once the session's transaction commits (dropped on rollback)"""
+    session.info.setdefault('after_commit', []).append((func, args))
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _run_after_commit_callbacks(session):
+    session.info.pop('has_writes', None)
+    for func, args in session.info.pop('after_commit', []):
+        func(*args)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_after_commit_callbacks(session):
+    session.info.pop('has_writes', None)
+    session.info.pop('after_commit', None)
+
+
+# Track whether the current transaction wrote anything, so read-only scopes can skip the commit
+@event.listens_for(OrmSession, "after_flush")
+def _mark_flush_written(session, flush_context):
+    session.info['has_writes'] = True
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _mark_statement_written(orm_execute_state):
+    # update()/delete() and raw text() statements; selects never write
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['has_writes'] = True
+
+
+def invalidate_cached_user(session, *telegram_ids):
+    """Drop users from user_cache once the session commits"""
+    for telegram_id in telegram_ids:
+        if telegram_id:
+            run_after_commit(session, user_cache.invalidate, str(telegram_id))
+
+
+def invalidate_location_views(session, *location_ids):
+    """Drop rendered location booking tables once the session commits"""
+    for location_id in location_ids:
+        run_after_commit(session, location_views.invalidate, location_id)
+
+
+def get_user_cache_stats():
+    """Hit/miss counters of the Telegram ID user cache"""
+    return user_cache.stats()
+
+
+# Default number of rows per page of the admin lists
+PAGE_SIZE = 20
+
+
+def keyset_page(session, stmt, key_columns, after=None, before=None, limit=PAGE_SIZE):
+    """
+    Fetch one page of stmt ordered by key_columns, whose last column must be the unique id.
+    Cursors are ids of rows: the page starts right after `after` or ends right before
+    `before`, so every page costs one index range scan however deep it is. A cursor row
+    that no longer exists restarts from the first page.
+    Returns (rows, prev_cursor, next_cursor), a cursor is None when there is no such page.
+    """
+    id_column = key_columns[-1]
+    cursor = before or after
+    key = None
+    if cursor:
+        key = session.execute(select(*key_columns).where(id_column == cursor)).first()
+
+    backwards = key is not None and before is not None
+    if key is not None:
+        keys = tuple_(*key_columns)
+        stmt = stmt.where(keys < tuple_(*key) if backwards else keys > tuple_(*key))
+
+    order = [column.desc() for column in key_columns] if backwards else key_columns
+    rows = session.execute(stmt.order_by(*order).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if backwards:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = key is not None, has_more
+
+    prev_cursor = rows[0]._mapping[id_column] if rows and has_prev else None
+    next_cursor = rows[-1]._mapping[id_column] if rows and has_next else None
+    return rows, prev_cursor, next_cursor
+
+
 def close_db():
     """Close database connections"""
     if Session:
@@ -349,6 +379,7 @@ def add_user(user_data):
 
             session.add(new_user)
             session.flush()  # Flush to get the ID and check for constraint violations
+            invalidate_cached_user(session, new_user.telegram_id)
 
             logging.info(f"User successfully added with ID: {new_user.id}")
             return new_user.id
@@ -383,6 +414,13 @@ def update_user(user_id, first_name, patronymic, second_name, email, phone, role
             if not user:
                 return False
 
+            invalidate_cached_user(session, user.telegram_id)
+            if (user.first_name, user.second_name) != (first_name, second_name):
+                # Speaker names are part of the rendered location tables
+                invalidate_location_views(session, *session.execute(
+                    select(Booking.__table__.c.location_id).where(Booking.__table__.c.user_id == user_id).distinct()
+                ).scalars())
+
             # Update user fields
             user.first_name = first_name
             user.patronymic = patronymic
@@ -412,6 +450,7 @@ def update_user_verification_status(user_id, verified):
                 return False
 
             user.verified = verified
+            invalidate_cached_user(session, user.telegram_id)
             return True
         except Exception as e:
             logging.error(f"Error updating user verification status: {e}")
@@ -440,17 +479,76 @@ def get_user_by_id(user_id):
 
 
 def get_user_by_telegram_id(telegram_id):
-    """Get user by Telegram ID"""
+    """Get user by Telegram ID (read-through user_cache)"""
+    cached = user_cache.get(str(telegram_id))
+    if cached is not MISSING:
+        return dict(cached) if cached else None
+
+    return load_user_by_telegram_id(telegram_id)
+
+
+def load_user_by_telegram_id(telegram_id):
+    """Load user by Telegram ID from the database and store it in user_cache"""
+    generation = user_cache.generation
     with session_scope() as session:
         user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        return user_to_dict(user) if user else None
+        user_dict = user_to_dict(user) if user else None
+
+    user_cache.set(str(telegram_id), user_dict, generation=generation)
+    return dict(user_dict) if user_dict else None
 
 
 def get_all_users():
     """Get all users"""
     with session_scope() as session:
-        users = session.query(User).all()
-        return [user_to_dict(user) for user in users]
+        # Plain rows straight into dicts, no ORM objects to build and track
+        return [dict(row) for row in session.execute(select(User.__table__)).mappings()]
+
+
+def get_filtered_users(search=None, role=None, email_verified=None, phone_verified=None, has_telegram=None,
+                       sort_by="first_name", sort_order="asc", limit=None):
+    """Users filtered and sorted in SQL (without hash_password), see DataBase/filters.py"""
+    stmt = filters.users_filter_query(
+        search, role, email_verified, phone_verified, has_telegram, sort_by, sort_order, limit
+    )
+    with session_scope() as session:
+        return [dict(row) for row in session.execute(stmt).mappings()]
+
+
+def search_users(query, limit=20):
+    """
+    Users whose name, patronymic, email or phone contains query (case-insensitive):
+    the first `limit` matches in registration order, sorted by last name
+    """
+    stmt = filters.text_search_query(
+        User.__table__, 'users_fts', ['first_name', 'second_name', 'patronymic', 'email', 'phone'], query
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    with session_scope() as session:
+        users = [dict(row) for row in session.execute(stmt).mappings()]
+    return sorted(users, key=lambda user: (user['second_name'], user['id']))
+
+
+def get_users_page(after=None, before=None, limit=None):
+    """One page of users ordered by (second_name, id), see keyset_page()"""
+    users = User.__table__
+    with session_scope() as session:
+        rows, prev_cursor, next_cursor = keyset_page(
+            session, select(users), [users.c.second_name, users.c.id], after, before, limit or PAGE_SIZE
+        )
+        return {
+            'items': [dict(row._mapping) for row in rows],
+            'prev_cursor': prev_cursor,
+            'next_cursor': next_cursor
+        }
+
+
+def count_users():
+    """Number of users (from stats_counters)"""
+    with session_scope() as session:
+        return read_counters(session, [migrations.STATS_USERS])[migrations.STATS_USERS]
 
 
 def update_user_telegram_id(user_id, telegram_id):
@@ -458,6 +556,8 @@ def update_user_telegram_id(user_id, telegram_id):
     with session_scope() as session:
         user = session.query(User).filter_by(id=user_id).first()
         if user:
+            # Both the old and the new ID may be cached (the new one as "no user")
+            invalidate_cached_user(session, user.telegram_id, telegram_id)
             user.telegram_id = telegram_id
             return True
         return False
@@ -468,6 +568,7 @@ def remove_user_telegram_id(user_id):
     with session_scope() as session:
         user = session.query(User).filter_by(id=user_id).first()
         if user:
+            invalidate_cached_user(session, user.telegram_id)
             user.telegram_id = None
             return True
         return False
@@ -479,6 +580,7 @@ def update_user_email_verification(user_id, verified):
         user = session.query(User).filter_by(id=user_id).first()
         if user:
             user.confirm_email = verified
+            invalidate_cached_user(session, user.telegram_id)
             return True
         return False
 
@@ -489,6 +591,7 @@ def update_user_phone_verification(user_id, verified):
         user = session.query(User).filter_by(id=user_id).first()
         if user:
             user.confirm_phone = verified
+            invalidate_cached_user(session, user.telegram_id)
             return True
         return False
 
@@ -572,20 +675,37 @@ def verify_token(token, type):
             user.confirm_email = True
         elif type == 'phone':
             user.confirm_phone = True
+        invalidate_cached_user(session, user.telegram_id)
 
         return True, "Верификация успешно завершена"
 
 
-def get_email_settings():
-    """Get email settings from database"""
+EMAIL_SETTING_KEYS = ['smtp_server', 'smtp_port', 'smtp_username', 'smtp_password', 'email_from']
+
+
+def load_settings(session):
+    """Load the whole settings table as {key: value} with one query"""
+    return {key: value for key, value in session.query(Settings.key, Settings.value)}
+
+
+# Process-wide copy of the settings table, refreshed after committed updates
+settings_store = SettingsStore(load_settings)
+
+
+def get_settings():
+    """Get all settings as a dict (from settings_store)"""
+    values = settings_store.snapshot()
+    if values is not None:
+        return values
+
     with session_scope() as session:
-        settings = {}
-        for key in ['smtp_server', 'smtp_port', 'smtp_username', 'smtp_password', 'email_from']:
-            setting = session.query(Settings).filter_by(key=key).first()
-            if setting:
-                settings[key] = setting.value
+        return settings_store.values(session)
 
-        return settings
+
+def get_email_settings():
+    """Get email settings from database"""
+    settings = get_settings()
+    return {key: settings[key] for key in EMAIL_SETTING_KEYS if key in settings}
 
 
 def update_email_settings(settings_data):
@@ -598,6 +718,7 @@ def update_email_settings(settings_data):
             else:
                 session.add(Settings(key=key, value=value))
 
+        run_after_commit(session, settings_store.update, dict(settings_data))
         return True
 
 
@@ -635,6 +756,7 @@ def set_user_role(user_id, role_name):
             return False, "User not found"
 
         user.role_id = role.id
+        invalidate_cached_user(session, user.telegram_id)
         return True, f"User role updated to {role_name}"
 
 
@@ -660,6 +782,7 @@ def update_location(location_id, address):
                 return False
 
             location.address = address
+            invalidate_location_views(session, location_id)
             return True
         except Exception as e:
             logging.error(f"Error updating location: {e}")
@@ -676,8 +799,32 @@ def get_location_by_id(location_id):
 def get_all_locations():
     """Get all locations"""
     with session_scope() as session:
-        locations = session.query(Location).all()
-        return [location_to_dict(location) for location in locations]
+        return [dict(row) for row in session.execute(select(Location.__table__)).mappings()]
+
+
+def search_locations(query, limit=None):
+    """Locations whose address contains query (case-insensitive), sorted by address"""
+    stmt = filters.text_search_query(Location.__table__, 'locations_fts', ['address'], query)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    with session_scope() as session:
+        locations = [dict(row) for row in session.execute(stmt).mappings()]
+    return sorted(locations, key=lambda location: (location['address'], location['id']))
+
+
+def rebuild_search_index():
+    """Rebuild the full-text search tables from users and locations (e.g. after a VACUUM)"""
+    with session_scope() as session:
+        for fts_table in SEARCH_TABLES:
+            session.execute(text(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')"))
+    return True
+
+
+def has_locations():
+    """Check if at least one location exists"""
+    with session_scope() as session:
+        return session.query(Location.id).first() is not None
 
 
 # Cooldown functions
@@ -688,9 +835,7 @@ def check_user_cooldown(user_id):
 
 def get_cooldown_days():
     """Get cooldown days setting"""
-    with session_scope() as session:
-        setting = session.query(Settings).filter_by(key="cooldown_days").first()
-        return int(setting.value) if setting else 2
+    return int(get_settings().get("cooldown_days", 2))
 
 
 def set_cooldown_days(days):
@@ -699,6 +844,7 @@ def set_cooldown_days(days):
         setting = session.query(Settings).filter_by(key="cooldown_days").first()
         if setting:
             setting.value = str(days)
+            run_after_commit(session, settings_store.update, {"cooldown_days": str(days)})
             return True
         return False
 
@@ -730,101 +876,218 @@ def check_time_overlap(new_start, new_duration, existing_start, existing_duratio
     return new_start_min < existing_end_min and new_end_min > existing_start_min
 
 
+def load_day_bookings(session, location_id, date):
+    """Load bookings of a location on a date for the availability index"""
+    bookings = session.query(Booking).filter(
+        and_(
+            Booking.location_id == location_id,
+            Booking.date == date
+        )
+    ).order_by(Booking.start_minute).all()
+    return [booking_to_dict(booking) for booking in bookings]
+
+
+# Booked intervals per (location, date), see DataBase.availability
+availability = AvailabilityIndex(load_day_bookings)
+
+
+def reserve_booking_slots(session, booking):
+    """Claim the booking_slots rows of a booking, raises IntegrityError if any of them is taken"""
+    session.add_all([
+        BookingSlot(booking.location_id, booking.date, slot, booking.id)
+        for slot in slot_range(booking.start_minute, booking.end_minute)
+    ])
+    session.flush()
+
+
+def release_booking_slots(session, booking_id):
+    """Free the booking_slots rows held by a booking"""
+    session.query(BookingSlot).filter_by(booking_id=booking_id).delete()
+
+
 def get_location_schedule(location_id, date):
     """Get detailed schedule for a location on a specific date"""
     with session_scope() as session:
-        # Get all bookings for this location and date
-        bookings = session.query(Booking).filter(
-            and_(
-                Booking.location_id == location_id,
-                Booking.date == date
-            )
-        ).order_by(Booking.time).all()
-
-        # Create time slots from 9:00 to 22:00
-        schedule = []
-        for hour in range(9, 23):
-            time_slot = f"{hour:02d}:00"
-
-            # Check if this hour is occupied
-            is_occupied = False
-            occupying_booking = None
-
-            for booking in bookings:
-                booking_start = time_to_minutes(booking.time)
-                booking_end = booking_start + (booking.duration_hours * 60)
-                current_hour_minutes = hour * 60
-
-                # Check if current hour falls within any booking
-                if booking_start <= current_hour_minutes < booking_end:
-                    is_occupied = True
-                    occupying_booking = booking
-                    break
-
-            schedule.append({
-                'time': time_slot,
-                'hour': hour,
-                'is_occupied': is_occupied,
-                'booking': booking_to_dict(occupying_booking) if occupying_booking else None,
-                'can_book_1h': not is_occupied,
-                'can_book_2h': not is_occupied and hour < 20  # Can book 2h if current and next hour are free
-            })
-
-        # Check 2-hour availability more precisely
-        for i, slot in enumerate(schedule):
-            if not slot['is_occupied'] and i < len(schedule) - 1:
-                next_slot = schedule[i + 1]
-                slot['can_book_2h'] = not next_slot['is_occupied']
-
-        return schedule
+        day = availability.day(session, location_id, date)
+
+    return build_schedule(day)
+
+
+def build_schedule(day):
+    """Build the hourly schedule of one location and date from its DayIntervals"""
+    # Create time slots from 9:00 to 22:00
+    schedule = []
+    for hour in range(9, 23):
+        # Booking covering the start of this hour, if any
+        occupying_booking = day.booking_at(hour * 60)
+        is_occupied = occupying_booking is not None
+
+        schedule.append({
+            'time': f"{hour:02d}:00",
+            'hour': hour,
+            'is_occupied': is_occupied,
+            'booking': dict(occupying_booking) if occupying_booking else None,
+            'can_book_1h': not is_occupied,
+            'can_book_2h': not is_occupied and hour < 20  # Can book 2h if current and next hour are free
+        })
+
+    # Check 2-hour availability more precisely
+    for i, slot in enumerate(schedule):
+        if not slot['is_occupied'] and i < len(schedule) - 1:
+            next_slot = schedule[i + 1]
+            slot['can_book_2h'] = not next_slot['is_occupied']
+
+    return schedule
 
 
 def get_available_time_suggestions(location_id, date, requested_start, requested_duration):
     """Get alternative time suggestions when requested time is not available"""
     with session_scope() as session:
-        # Get all bookings for this location and date
-        existing_bookings = session.query(Booking).filter(
-            and_(
-                Booking.location_id == location_id,
-                Booking.date == date
-            )
-        ).all()
+        day = availability.day(session, location_id, date)
 
-        suggestions = []
+    return build_time_suggestions(day, requested_start, requested_duration)
 
-        # Check common time slots (every hour from 9:00 to 20:00)
-        for hour in range(9, 21):
-            for duration in [1, 2]:
-                start_time = f"{hour:02d}:00"
 
-                # Skip if this is the same as requested (we know it's not available)
-                if start_time == requested_start and duration == requested_duration:
-                    continue
+def build_time_suggestions(day, requested_start, requested_duration):
+    """Pick up to 5 free alternatives to the requested time from DayIntervals"""
+    suggestions = []
 
-                # Skip 2-hour slots that would go past 21:00
-                if duration == 2 and hour >= 20:
-                    continue
+    # Check common time slots (every hour from 9:00 to 20:00)
+    for hour in range(9, 21):
+        for duration in [1, 2]:
+            start_time = f"{hour:02d}:00"
+
+            # Skip if this is the same as requested (we know it's not available)
+            if start_time == requested_start and duration == requested_duration:
+                continue
+
+            # Skip 2-hour slots that would go past 21:00
+            if duration == 2 and hour >= 20:
+                continue
+
+            # Check if this slot is available
+            if day.is_free(hour * 60, (hour + duration) * 60):
+                end_hour = hour + duration
+                suggestions.append({
+                    'start_time': start_time,
+                    'duration': duration,
+                    'end_time': f"{end_hour:02d}:00",
+                    'description': f"{start_time}-{end_hour:02d}:00 ({duration} час{'а' if duration == 2 else ''})"
+                })
 
-                # Check if this slot is available
-                is_available = True
-                for booking in existing_bookings:
-                    if check_time_overlap(start_time, duration, booking.time, booking.duration_hours):
-                        is_available = False
-                        break
+    # Sort suggestions by start time
+    suggestions.sort(key=lambda x: x['start_time'])
 
-                if is_available:
-                    end_hour = hour + duration
-                    suggestions.append({
-                        'start_time': start_time,
-                        'duration': duration,
-                        'end_time': f"{end_hour:02d}:00",
-                        'description': f"{start_time}-{end_hour:02d}:00 ({duration} час{'а' if duration == 2 else ''})"
-                    })
+    return suggestions[:5]  # Return first 5 suggestions
 
-        # Sort suggestions by start time
-        suggestions.sort(key=lambda x: x['start_time'])
 
-        return suggestions[:5]  # Return first 5 suggestions
+# Free slot search across locations
+# Hours a booking may take: starting from 9:00 and ending by 21:00
+BOOKING_DAY_START_HOUR = 9
+BOOKING_DAY_END_HOUR = 21
+
+
+def occupancy_mask(start_minute, end_minute):
+    """Bitmask of the working hours touched by [start_minute, end_minute), bit 0 is 9:00"""
+    first_hour = max(start_minute // 60, BOOKING_DAY_START_HOUR)
+    last_hour = min((end_minute - 1) // 60, BOOKING_DAY_END_HOUR - 1)
+    if last_hour < first_hour:
+        return 0
+    return ((1 << (last_hour - first_hour + 1)) - 1) << (first_hour - BOOKING_DAY_START_HOUR)
+
+
+def find_free_slots(date_from, date_to, duration_hours, limit=10, not_before=None):
+    """
+    Find the earliest free windows of duration_hours across all locations.
+    Dates are ISO strings (inclusive range); windows starting before not_before are skipped.
+    Occupancy is a (location, date) -> hour bitmask matrix built from a single query.
+    """
+    with session_scope() as session:
+        rows = session.query(
+            Location.id, Location.address, Booking.date, Booking.start_minute, Booking.end_minute
+        ).outerjoin(
+            Booking, and_(
+                Booking.location_id == Location.id,
+                Booking.date >= date_from,
+                Booking.date <= date_to
+            )
+        ).all()
+
+    addresses = {}
+    occupancy = {}
+    for location_id, address, date, start_minute, end_minute in rows:
+        addresses[location_id] = address
+        if date is not None:
+            key = (location_id, date)
+            occupancy[key] = occupancy.get(key, 0) | occupancy_mask(start_minute, end_minute)
+
+    location_ids = sorted(addresses, key=lambda location_id: addresses[location_id])
+    window = (1 << duration_hours) - 1
+
+    free_slots = []
+    day = datetime.fromisoformat(date_from)
+    last_day = datetime.fromisoformat(date_to)
+    while day <= last_day:
+        date = day.date().isoformat()
+        for hour in range(BOOKING_DAY_START_HOUR, BOOKING_DAY_END_HOUR - duration_hours + 1):
+            if not_before and day.replace(hour=hour) <= not_before:
+                continue
+
+            mask = window << (hour - BOOKING_DAY_START_HOUR)
+            for location_id in location_ids:
+                if occupancy.get((location_id, date), 0) & mask:
+                    continue
+
+                free_slots.append({
+                    'location_id': location_id,
+                    'location_address': addresses[location_id],
+                    'date': date,
+                    'start_time': f"{hour:02d}:00",
+                    'end_time': f"{hour + duration_hours:02d}:00",
+                    'duration_hours': duration_hours
+                })
+                if len(free_slots) >= limit:
+                    return free_slots
+
+        day += timedelta(days=1)
+
+    return free_slots
+
+
+def build_conflict_report(day, requested_start, requested_duration):
+    """
+    Build everything shown for a rejected booking from the one DayIntervals already loaded:
+    schedule, its text, alternatives and the final message, with the time spent per stage
+    """
+    timings = {}
+    started = perf_counter()
+
+    schedule = build_schedule(day)
+    timings['schedule'] = perf_counter() - started
+
+    stage_started = perf_counter()
+    schedule_text = format_schedule_visualization(schedule)
+    timings['render'] = perf_counter() - stage_started
+
+    stage_started = perf_counter()
+    suggestions = build_time_suggestions(day, requested_start, requested_duration)
+    if suggestions:
+        suggestion_text = "\n\n💡 Доступные альтернативы:\n" + "\n".join([
+            f"• {s['description']}" for s in suggestions
+        ])
+    else:
+        suggestion_text = "\n\n❌ К сожалению, на эту дату нет свободных слотов."
+    timings['suggestions'] = perf_counter() - stage_started
+
+    timings['total'] = perf_counter() - started
+
+    return {
+        'schedule': schedule,
+        'schedule_text': schedule_text,
+        'suggestions': suggestions,
+        'message': f"Выбранное время пересекается с существующим бронированием.\n\n{schedule_text}{suggestion_text}",
+        'timings': timings
+    }
 
 
 def format_schedule_visualization(schedule):
@@ -876,6 +1139,14 @@ def format_schedule_visualization(schedule):
 
 
 # Booking functions
+def conflict_response(day, time, duration_hours):
+    """Conflict message for create_booking, logging how long the report took"""
+    report = build_conflict_report(day, time, duration_hours)
+    logging.info("Conflict report built (" +
+                 ", ".join(f"{stage}={seconds * 1000:.3f}ms" for stage, seconds in report['timings'].items()) + ")")
+    return report['message']
+
+
 def create_booking(user_id, location_id, date, time, duration_hours):
     """Create a new booking with time overlap checking and verification check"""
     logging.info(
@@ -891,39 +1162,23 @@ def create_booking(user_id, location_id, date, time, duration_hours):
             if not user.verified:
                 return False, "Ваш аккаунт не подтвержден администратором. Обратитесь к администратору для подтверждения."
 
-            # Get all existing bookings for this location and date
-            existing_bookings = session.query(Booking).filter(
-                and_(
-                    Booking.location_id == location_id,
-                    Booking.date == date
-                )
-            ).all()
-
             # Check for time overlaps with existing bookings
-            for existing_booking in existing_bookings:
-                if check_time_overlap(time, duration_hours, existing_booking.time, existing_booking.duration_hours):
-                    logging.error(
-                        f"Time overlap detected: new {time}-{duration_hours}h conflicts with existing {existing_booking.time}-{existing_booking.duration_hours}h")
-
-                    # Get schedule visualization
-                    schedule = get_location_schedule(location_id, date)
-                    schedule_text = format_schedule_visualization(schedule)
-
-                    # Get alternative suggestions
-                    suggestions = get_available_time_suggestions(location_id, date, time, duration_hours)
-
-                    if suggestions:
-                        suggestion_text = "\n\n💡 Доступные альтернативы:\n" + "\n".join([
-                            f"• {s['description']}" for s in suggestions
-                        ])
-                    else:
-                        suggestion_text = "\n\n❌ К сожалению, на эту дату нет свободных слотов."
-
-                    return False, f"Выбранное время пересекается с существующим бронированием.\n\n{schedule_text}{suggestion_text}"
-
-            # Get cooldown days within the same session
-            cooldown_setting = session.query(Settings).filter_by(key="cooldown_days").first()
-            cooldown_days = int(cooldown_setting.value) if cooldown_setting else 2
+            start_minute = time_to_minutes(time)
+            if start_minute is None:
+                return False, "Неверный формат времени"
+
+            end_minute = start_minute + duration_hours * 60
+            if not on_slot_grid(start_minute, end_minute):
+                return False, f"Время должно быть кратно {SLOT_MINUTES} минутам (например, 14:00 или 14:15)"
+            day = availability.day(session, location_id, date)
+            existing_booking = day.find_overlap(start_minute, end_minute)
+            if existing_booking:
+                logging.error(
+                    f"Time overlap detected: new {time}-{duration_hours}h conflicts with existing {existing_booking['time']}-{existing_booking['duration_hours']}h")
+                return False, conflict_response(day, time, duration_hours)
+
+            # Get cooldown days (loaded within the same session on a cold cache)
+            cooldown_days = int(settings_store.values(session).get("cooldown_days", 2))
 
             # Create the booking with explicit values
             booking_id = str(uuid.uuid4())
@@ -934,18 +1189,33 @@ def create_booking(user_id, location_id, date, time, duration_hours):
             new_booking.user_id = user_id
             new_booking.location_id = location_id
             new_booking.date = date
-            new_booking.time = time
-            new_booking.duration_hours = duration_hours
+            new_booking.set_time(time, duration_hours)
             new_booking.created_at = created_at
 
             session.add(new_booking)
 
+            # The check above is only a fast path: a booking committed concurrently is
+            # caught here by the booking_slots primary key, in the same transaction
+            try:
+                reserve_booking_slots(session, new_booking)
+            except IntegrityError:
+                session.rollback()
+                # Booked behind the index's back (another process), reload the day
+                availability.invalidate(location_id, date)
+                logging.error(f"Slot already reserved: {location_id} {date} {time}-{duration_hours}h")
+                day = availability.day(session, location_id, date)
+                return False, conflict_response(day, time, duration_hours)
+
+            run_after_commit(session, availability.add, booking_to_dict(new_booking))
+            invalidate_location_views(session, location_id)
+
             # Update user cooldown
             booking_date = datetime.fromisoformat(date)
             cooldown_end = booking_date + timedelta(days=cooldown_days)
 
             # Update the same user object we already retrieved
             user.cooldown = cooldown_end.isoformat()
+            invalidate_cached_user(session, user.telegram_id)
 
             # Commit the transaction
             session.commit()
@@ -986,24 +1256,37 @@ def update_booking(booking_id, date, time, duration_hours):
                 return False
 
             # Check for overlaps with other bookings (excluding this one)
-            existing_bookings = session.query(Booking).filter(
-                and_(
-                    Booking.location_id == booking.location_id,
-                    Booking.date == date,
-                    Booking.id != booking_id  # Exclude current booking
-                )
-            ).all()
-
-            # Check for time overlaps
-            for existing_booking in existing_bookings:
-                if check_time_overlap(time, duration_hours, existing_booking.time, existing_booking.duration_hours):
-                    logging.error(f"Time overlap detected during update")
-                    return False
-
-            # Update booking
+            start_minute = time_to_minutes(time)
+            if start_minute is None:
+                logging.error(f"Invalid booking time: {time}")
+                return False
+
+            end_minute = start_minute + duration_hours * 60
+            if not on_slot_grid(start_minute, end_minute):
+                logging.error(f"Booking time not on the {SLOT_MINUTES}-minute grid: {time}")
+                return False
+            day = availability.day(session, booking.location_id, date)
+            if day.find_overlap(start_minute, end_minute, exclude_booking_id=booking_id):
+                logging.error(f"Time overlap detected during update")
+                return False
+
+            # Update booking and move its slot reservation
+            old_date = booking.date
+            release_booking_slots(session, booking_id)
             booking.date = date
-            booking.time = time
-            booking.duration_hours = duration_hours
+            booking.set_time(time, duration_hours)
+
+            try:
+                reserve_booking_slots(session, booking)
+            except IntegrityError:
+                session.rollback()
+                availability.invalidate(booking.location_id, date)
+                logging.error(f"Time overlap detected during update: slot already reserved")
+                return False
+
+            run_after_commit(session, availability.remove, booking.location_id, old_date, booking_id)
+            run_after_commit(session, availability.add, booking_to_dict(booking))
+            invalidate_location_views(session, booking.location_id)
             return True
         except Exception as e:
             logging.error(f"Error updating booking: {e}")
@@ -1013,23 +1296,22 @@ def update_booking(booking_id, date, time, duration_hours):
 def get_user_bookings(user_id):
     """Get all bookings for a user"""
     with session_scope() as session:
-        logging.info(f"Getting bookings for user: {user_id}")
-
-        bookings = session.query(
-            Booking, Location.address.label('location_address')
-        ).join(
-            Location, Booking.location_id == Location.id
-        ).filter(
-            Booking.user_id == user_id
-        ).order_by(
-            Booking.date, Booking.time
-        ).all()
+        logging.debug(f"Getting bookings for user: {user_id}")
+
+        bookings, locations = Booking.__table__, Location.__table__
+        rows = session.execute(
+            select(
+                bookings, locations.c.address.label('location_address')
+            ).join(
+                locations, bookings.c.location_id == locations.c.id
+            ).where(
+                bookings.c.user_id == user_id
+            ).order_by(
+                bookings.c.date, bookings.c.time
+            )
+        ).mappings()
 
-        result = []
-        for booking, location_address in bookings:
-            booking_dict = booking_to_dict(booking)
-            booking_dict['location_address'] = location_address
-            result.append(booking_dict)
+        result = [dict(row) for row in rows]
 
         logging.info(f"Found {len(result)} bookings for user {user_id}")
         return result
@@ -1049,51 +1331,252 @@ def cancel_booking(booking_id, user_id):
         if not booking:
             return False, "Бронирование не найдено"
 
-        # Delete the booking
+        # Delete the booking and free its slots
+        release_booking_slots(session, booking_id)
+        run_after_commit(session, availability.remove, booking.location_id, booking.date, booking_id)
+        invalidate_location_views(session, booking.location_id)
         session.delete(booking)
 
         # Reset user cooldown
         user = session.query(User).filter_by(id=user_id).first()
         if user:
             user.cooldown = datetime.now().isoformat()
+            invalidate_cached_user(session, user.telegram_id)
 
         return True, "Бронирование успешно отменено"
 
 
+def bookings_with_users_query():
+    """Select of bookings joined with their location and user, rows for booking_with_user_to_dict()"""
+    bookings, locations, users = Booking.__table__, Location.__table__, User.__table__
+    return select(
+        bookings.c.id, bookings.c.user_id, bookings.c.location_id, bookings.c.date, bookings.c.time,
+        bookings.c.duration_hours, bookings.c.start_minute, bookings.c.end_minute, bookings.c.created_at,
+        locations.c.address,
+        users.c.first_name,
+        users.c.second_name,
+        users.c.email,
+        users.c.phone
+    ).join(
+        locations, bookings.c.location_id == locations.c.id
+    ).join(
+        users, bookings.c.user_id == users.c.id
+    )
+
+
+def booking_with_user_to_dict(row):
+    """Convert a bookings_with_users_query() row to a booking dictionary with a 'speaker'"""
+    (booking_id, user_id, location_id, date, time, duration_hours, start_minute, end_minute, created_at,
+     location_address, first_name, second_name, email, phone) = row
+    return {
+        'id': booking_id,
+        'user_id': user_id,
+        'location_id': location_id,
+        'date': date,
+        'time': time,
+        'duration_hours': duration_hours,
+        'start_minute': start_minute,
+        'end_minute': end_minute,
+        'created_at': created_at,
+        'location_address': location_address,
+        'available': False,
+        'speaker': {
+            'id': user_id,
+            'first_name': first_name,
+            'second_name': second_name,
+            'email': email,
+            'phone': phone
+        }
+    }
+
+
 def get_all_bookings_with_users():
     """Get all bookings with user and location info"""
+    bookings = Booking.__table__
     with session_scope() as session:
-        bookings = session.query(
-            Booking,
-            Location.address.label('location_address'),
-            User.id.label('user_id'),
-            User.first_name,
-            User.second_name,
-            User.email,
-            User.phone
-        ).join(
-            Location, Booking.location_id == Location.id
-        ).join(
-            User, Booking.user_id == User.id
-        ).order_by(
-            Booking.date, Booking.time
-        ).all()
+        rows = session.execute(bookings_with_users_query().order_by(bookings.c.date, bookings.c.time, bookings.c.id))
+        return [booking_with_user_to_dict(row) for row in rows]
+
+
+def get_upcoming_bookings_with_users(per_location=None, today=None, location_ids=None):
+    """
+    Bookings from today (ISO date, default the current date) on with user and location
+    info, ordered by (date, time, id), optionally only at the given locations.
+    per_location keeps only the first N of every location.
+    The date range is read from ix_bookings_date_time_id, so past bookings are never scanned.
+    """
+    bookings = Booking.__table__
+    order = (bookings.c.date, bookings.c.time, bookings.c.id)
+    stmt = bookings_with_users_query().where(bookings.c.date >= (today or datetime.now().date().isoformat()))
+    if location_ids is not None:
+        stmt = stmt.where(bookings.c.location_id.in_(location_ids))
+
+    if per_location is not None:
+        # Materialized first: otherwise SQLite walks ix_bookings_location_date over the whole
+        # history to get the rows in partition order, instead of using the date range
+        upcoming = stmt.cte('upcoming').prefix_with('MATERIALIZED')
+        position = func.row_number().over(
+            partition_by=upcoming.c.location_id, order_by=(upcoming.c.date, upcoming.c.time, upcoming.c.id)
+        )
+        ranked = select(upcoming, position.label('position')).subquery()
+        columns = [column for column in ranked.c if column.name != 'position']
+        stmt = select(*columns).where(ranked.c.position <= per_location).order_by(
+            ranked.c.date, ranked.c.time, ranked.c.id
+        )
+    else:
+        stmt = stmt.order_by(*order)
+
+    with session_scope() as session:
+        return [booking_with_user_to_dict(row) for row in session.execute(stmt)]
 
-        result = []
-        for booking, location_address, user_id, first_name, second_name, email, phone in bookings:
-            booking_dict = booking_to_dict(booking)
-            booking_dict['location_address'] = location_address
-            booking_dict['available'] = False
-            booking_dict['speaker'] = {
-                'id': user_id,
-                'first_name': first_name,
-                'second_name': second_name,
-                'email': email,
-                'phone': phone
-            }
-            result.append(booking_dict)
 
-        return result
+def get_filtered_bookings(search=None, location_id=None, date_from=None, date_to=None, duration=None,
+                          sort_by="date", sort_order="asc", limit=None):
+    """Bookings with user and location info filtered and sorted in SQL, see DataBase/filters.py"""
+    stmt = filters.bookings_filter_query(
+        bookings_with_users_query(), search, location_id, date_from, date_to, duration, sort_by, sort_order, limit
+    )
+    with session_scope() as session:
+        return [booking_with_user_to_dict(row) for row in session.execute(stmt)]
+
+
+def get_bookings_page(after=None, before=None, limit=None, location_ids=None):
+    """
+    One page of bookings with user and location info ordered by (date, time, id),
+    optionally only at the given locations, see keyset_page()
+    """
+    bookings = Booking.__table__
+    stmt = bookings_with_users_query()
+    if location_ids is not None:
+        stmt = stmt.where(bookings.c.location_id.in_(location_ids))
+
+    with session_scope() as session:
+        rows, prev_cursor, next_cursor = keyset_page(
+            session, stmt, [bookings.c.date, bookings.c.time, bookings.c.id], after, before, limit or PAGE_SIZE
+        )
+        return {
+            'items': [booking_with_user_to_dict(row) for row in rows],
+            'prev_cursor': prev_cursor,
+            'next_cursor': next_cursor
+        }
+
+
+def get_booked_location_ids():
+    """IDs of locations that have at least one booking"""
+    with session_scope() as session:
+        return set(session.execute(select(Booking.__table__.c.location_id).distinct()).scalars())
+
+
+def count_bookings(location_ids=None):
+    """Number of bookings, optionally only at the given locations (from stats_counters)"""
+    if location_ids is None:
+        names = [migrations.STATS_BOOKINGS]
+    else:
+        names = [migrations.STATS_BOOKINGS_BY_LOCATION + location_id for location_id in location_ids]
+
+    with session_scope() as session:
+        return sum(read_counters(session, names).values())
+
+
+# Statistics
+def read_counters(session, names=None):
+    """Values of the given stats_counters (0 for missing ones), or of all of them"""
+    stmt = select(StatsCounter.name, StatsCounter.value)
+    if names is None:
+        return dict(session.execute(stmt).all())
+
+    values = dict.fromkeys(names, 0)
+    # Chunked to stay under SQLite's limit of bound parameters
+    for start in range(0, len(names), 500):
+        values.update(session.execute(stmt.where(StatsCounter.name.in_(names[start:start + 500]))).all())
+    return values
+
+
+def stats_from_counters(session, counters):
+    """Shape counters (name -> value) like utils.filters.get_filter_stats() does"""
+    locations = Location.__table__
+    addresses = dict(session.execute(select(locations.c.id, locations.c.address)).all())
+
+    stats = {
+        'total_users': counters.get(migrations.STATS_USERS, 0),
+        'verified_email_users': counters.get(migrations.STATS_USERS_CONFIRMED_EMAIL, 0),
+        'verified_phone_users': counters.get(migrations.STATS_USERS_CONFIRMED_PHONE, 0),
+        'users_with_telegram': counters.get(migrations.STATS_USERS_WITH_TELEGRAM, 0),
+        'total_bookings': counters.get(migrations.STATS_BOOKINGS, 0),
+        'bookings_by_duration': {},
+        'bookings_by_location': {}
+    }
+
+    for name, value in counters.items():
+        # Counters of values that no longer occur stay at 0
+        if not value:
+            continue
+        if name.startswith(migrations.STATS_BOOKINGS_BY_DURATION):
+            duration = int(name[len(migrations.STATS_BOOKINGS_BY_DURATION):])
+            stats['bookings_by_duration'][duration] = value
+        elif name.startswith(migrations.STATS_BOOKINGS_BY_LOCATION):
+            address = addresses.get(name[len(migrations.STATS_BOOKINGS_BY_LOCATION):], 'Unknown')
+            stats['bookings_by_location'][address] = stats['bookings_by_location'].get(address, 0) + value
+
+    return stats
+
+
+def get_stats():
+    """User and booking statistics read from stats_counters, without scanning any table"""
+    with session_scope() as session:
+        return stats_from_counters(session, read_counters(session))
+
+
+def compute_stats():
+    """The same statistics recounted from the tables with GROUP BY queries"""
+    with session_scope() as session:
+        return stats_from_counters(session, dict(migrations.count_stats(session.connection())))
+
+
+def rebuild_stats_counters():
+    """Recount stats_counters from the tables (e.g. after editing the database by hand)"""
+    with session_scope() as session:
+        migrations.fill_stats_counters(session.connection())
+    return True
+
+
+# FSM storage functions (see DataBase/fsm_storage.py)
+def get_fsm_record(key, not_before):
+    """(state, data JSON, updated_at) stored for key, or None if missing or last written before not_before"""
+    with session_scope() as session:
+        row = session.execute(
+            select(FSMState.state, FSMState.data, FSMState.updated_at).where(
+                FSMState.key == key, FSMState.updated_at >= not_before
+            )
+        ).first()
+        return tuple(row) if row else None
+
+
+def save_fsm_records(records):
+    """Write (key, state, data JSON, updated_at) records in one transaction, empty ones are deleted"""
+    upserts = [
+        {"key": key, "state": state, "data": data, "updated_at": updated_at}
+        for key, state, data, updated_at in records if state is not None or data != '{}'
+    ]
+    deletes = [{"key": key} for key, state, data, _ in records if state is None and data == '{}']
+
+    with session_scope() as session:
+        if upserts:
+            session.execute(text(
+                "INSERT INTO fsm_states (key, state, data, updated_at) VALUES (:key, :state, :data, :updated_at) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                "updated_at = excluded.updated_at"
+            ), upserts)
+        if deletes:
+            session.execute(text("DELETE FROM fsm_states WHERE key = :key"), deletes)
+    return True
+
+
+def delete_expired_fsm_records(before):
+    """Delete FSM records last written before the given ISO datetime, return how many"""
+    with session_scope() as session:
+        result = session.execute(text("DELETE FROM fsm_states WHERE updated_at < :before"), {"before": before})
+        return result.rowcount
 
 
 def debug_database_tables():
@@ -1166,6 +1649,8 @@ def booking_to_dict(booking):
         'date': booking.date,
         'time': booking.time,
         'duration_hours': booking.duration_hours,
+        'start_minute': booking.start_minute,
+        'end_minute': booking.end_minute,
         'created_at': booking.created_at
     }
 
@@ -1179,6 +1664,7 @@ def update_user_artist_form_status(user_id: str, status: bool) -> bool:
                 return False
 
             user.artist_form_filled = status
+            invalidate_cached_user(session, user.telegram_id)
             session.commit()
             return True
     except Exception as e:
@@ -1217,7 +1703,20 @@ def delete_user(user_id: str) -> bool:
     """Delete user from database"""
     try:
         with session_scope() as session:
+            telegram_id = session.query(User.telegram_id).filter(User.id == user_id).scalar()
+            invalidate_cached_user(session, telegram_id)
+
             # Удаляем все связанные записи
+            for booking_id, location_id, date in session.query(
+                    Booking.id, Booking.location_id, Booking.date
+            ).filter(Booking.user_id == user_id):
+                run_after_commit(session, availability.remove, location_id, date, booking_id)
+                invalidate_location_views(session, location_id)
+
+            session.execute(
+                text("DELETE FROM booking_slots WHERE booking_id IN (SELECT id FROM bookings WHERE user_id = :user_id)"),
+                {"user_id": user_id}
+            )
             session.execute(text("DELETE FROM bookings WHERE user_id = :user_id"), {"user_id": user_id})
             session.execute(text("DELETE FROM verification_tokens WHERE user_id = :user_id"), {"user_id": user_id})
             
@@ -1234,7 +1733,13 @@ def delete_booking(booking_id: str) -> bool:
     """Delete booking from database"""
     try:
         with session_scope() as session:
-            # Удаляем бронирование
+            # Удаляем бронирование и занятые им слоты
+            booking = session.query(Booking.location_id, Booking.date).filter(Booking.id == booking_id).first()
+            if booking:
+                run_after_commit(session, availability.remove, booking.location_id, booking.date, booking_id)
+                invalidate_location_views(session, booking.location_id)
+
+            session.execute(text("DELETE FROM booking_slots WHERE booking_id = :booking_id"), {"booking_id": booking_id})
             result = session.execute(text("DELETE FROM bookings WHERE id = :booking_id"), {"booking_id": booking_id})
             session.commit()
             return result.rowcount > 0
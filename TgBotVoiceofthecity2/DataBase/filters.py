@@ -0,0 +1,204 @@
+"""
+SQL versions of the admin list filters in utils/filters.py
+Build selects that apply the same filter and sort parameters as filter_users() and
+filter_bookings() in SQLite, so only the matching rows (up to a limit) are read.
+Search terms of 3+ characters are looked up in the FTS5 trigram tables (see
+migrations.SEARCH_TABLES), shorter ones fall back to scanning with py_lower(), Python's
+str.lower() registered as an SQLite function (SQLite's lower() only folds ASCII).
+Ties keep the order of get_all_users() / get_all_bookings_with_users(), like the
+stable sort of the Python filters does.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, func, case, literal_column, table, column as sql_column, or_
+
+from DataBase.models import User, Location, Booking
+
+
+def py_lower(value):
+    """str.lower() for SQLite, registered on every connection by database.apply_sqlite_pragmas()"""
+    return value.lower() if isinstance(value, str) else value
+
+
+def lower(column):
+    """Lowercased column, NULL treated as an empty string"""
+    return func.py_lower(func.coalesce(column, ''))
+
+
+# The trigram tokenizer can't match anything shorter
+TRIGRAM_MIN_LENGTH = 3
+
+
+def contains(columns, search):
+    """Condition: search occurs in any of the columns, case-insensitively (full scan)"""
+    needle = search.lower()
+    # instr() instead of LIKE, so % and _ in the search term are matched literally
+    return or_(*[func.instr(lower(column), needle) > 0 for column in columns])
+
+
+def fts_match(fts_table, search, columns=None):
+    """(FTS table, condition) matching rows whose indexed columns (all, or the given ones) contain search"""
+    # One quoted phrase: the whole term must occur as a substring, FTS5 syntax is not interpreted
+    query = '"' + search.replace('"', '""') + '"'
+    if columns:
+        query = f"{{{' '.join(columns)}}} : {query}"
+
+    fts = table(fts_table, sql_column('rowid'), sql_column(fts_table))
+    return fts, fts.c[fts_table].op('MATCH')(query)
+
+
+def rowid(source):
+    """rowid column of a table"""
+    return literal_column(f'{source.name}.rowid')
+
+
+def text_search(source, fts_table, columns, search):
+    """Condition: search occurs in any of the columns of source, through the FTS index when possible"""
+    if len(search) < TRIGRAM_MIN_LENGTH:
+        return contains([source.c[column] for column in columns], search)
+
+    fts, condition = fts_match(fts_table, search, columns)
+    return rowid(source).in_(select(fts.c.rowid).where(condition))
+
+
+def text_search_query(source, fts_table, columns, search):
+    """
+    Select of source rows where search occurs in any of the columns, in rowid order.
+    Matches are streamed from the FTS index, so a LIMIT stops the search early
+    (text_search() inside IN has to collect every match first).
+    """
+    if len(search) < TRIGRAM_MIN_LENGTH:
+        return select(source).where(
+            contains([source.c[column] for column in columns], search)
+        ).order_by(rowid(source))
+
+    fts, condition = fts_match(fts_table, search, columns)
+    return select(source).select_from(fts).join(source, rowid(source) == fts.c.rowid).where(
+        condition
+    ).order_by(fts.c.rowid)
+
+
+def boolean_sort_key(column):
+    """
+    Sort key of a nullable boolean column matching the Python filters: False < True, and
+    when NULLs are present they fall back to string order 'false' < 'none' < 'true'
+    """
+    return case((column.is_(None), 0.5), else_=column)
+
+
+def parse_filter_date(value):
+    """Date filter value as ISO date, or None if it isn't a valid YYYY-MM-DD date (filter skipped)"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        return None
+
+
+# Columns of users returned by users_filter_query(): everything except the password hash
+USER_PUBLIC_COLUMNS = [column for column in User.__table__.c if column.name != 'hash_password']
+
+
+def users_filter_query(search=None, role=None, email_verified=None, phone_verified=None, has_telegram=None,
+                       sort_by="first_name", sort_order="asc", limit=None):
+    """Select of users filtered and sorted like utils.filters.filter_users()"""
+    users = User.__table__
+    stmt = select(*USER_PUBLIC_COLUMNS)
+
+    if search:
+        stmt = stmt.where(text_search(
+            users, 'users_fts', ['first_name', 'second_name', 'patronymic', 'email', 'phone'], search
+        ))
+
+    if role:
+        stmt = stmt.where(users.c.role_id == role)
+
+    # NULL flags match neither True nor False, as in the Python filter
+    if email_verified is not None:
+        stmt = stmt.where(users.c.confirm_email == email_verified)
+
+    if phone_verified is not None:
+        stmt = stmt.where(users.c.confirm_phone == phone_verified)
+
+    if has_telegram is not None:
+        if has_telegram:
+            stmt = stmt.where(users.c.telegram_id.is_not(None), users.c.telegram_id != '')
+        else:
+            stmt = stmt.where(or_(users.c.telegram_id.is_(None), users.c.telegram_id == ''))
+
+    column = users.c.get(sort_by)
+    if column is None:
+        # Unknown field: every key is equal, the original order is kept
+        sort_key = None
+    elif column.type.python_type is bool:
+        sort_key = boolean_sort_key(column)
+    elif sort_by == 'cooldown':
+        # ISO datetimes sort chronologically as strings
+        sort_key = column
+    else:
+        sort_key = lower(column)
+
+    order = []
+    if sort_key is not None:
+        order.append(sort_key.desc() if sort_order.lower() == 'desc' else sort_key)
+    # get_all_users() returns users in table (rowid) order
+    order.append(literal_column('users.rowid'))
+
+    stmt = stmt.order_by(*order)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def bookings_filter_query(base, search=None, location_id=None, date_from=None, date_to=None, duration=None,
+                          sort_by="date", sort_order="asc", limit=None):
+    """
+    Select of bookings filtered and sorted like utils.filters.filter_bookings()
+    base is database.bookings_with_users_query(), which joins locations and users
+    """
+    bookings, locations, users = Booking.__table__, Location.__table__, User.__table__
+    stmt = base
+
+    if search:
+        stmt = stmt.where(or_(
+            text_search(locations, 'locations_fts', ['address'], search),
+            text_search(users, 'users_fts', ['first_name', 'second_name', 'email', 'phone'], search)
+        ))
+
+    if location_id:
+        stmt = stmt.where(bookings.c.location_id == location_id)
+
+    # Invalid dates skip the filter; booking dates are stored as ISO strings and compare as such
+    if date_from and parse_filter_date(date_from):
+        stmt = stmt.where(bookings.c.date >= parse_filter_date(date_from))
+
+    if date_to and parse_filter_date(date_to):
+        stmt = stmt.where(bookings.c.date <= parse_filter_date(date_to))
+
+    if duration is not None:
+        stmt = stmt.where(bookings.c.duration_hours == duration)
+
+    sort_keys = {
+        'date': bookings.c.date,
+        'time': bookings.c.start_minute,
+        'location_address': lower(locations.c.address),
+        'speaker_name': lower(users.c.first_name + ' ' + users.c.second_name),
+        'duration_hours': bookings.c.duration_hours,
+        'created_at': bookings.c.created_at,
+    }
+    if sort_by in sort_keys:
+        sort_key = sort_keys[sort_by]
+    elif sort_by in bookings.c:
+        sort_key = lower(bookings.c[sort_by])
+    else:
+        sort_key = None
+
+    order = []
+    if sort_key is not None:
+        order.append(sort_key.desc() if sort_order.lower() == 'desc' else sort_key)
+    # get_all_bookings_with_users() order
+    order += [bookings.c.date, bookings.c.time, bookings.c.id]
+
+    stmt = stmt.order_by(*order)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
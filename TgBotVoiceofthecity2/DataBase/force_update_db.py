@@ -9,7 +9,9 @@ import logging
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from DataBase import database
+from sqlalchemy import create_engine
+
+from DataBase import database, migrations
 from datetime import datetime
 
 # Configure logging
@@ -33,17 +35,19 @@ def force_update_database():
         return False
 
     try:
-        # Initialize database connection
+        # Check current schema version before migrating
+        temp_engine = create_engine(f"sqlite:///{DB_PATH}")
+        with temp_engine.connect() as conn:
+            current_version = migrations.get_schema_version(conn)
+        temp_engine.dispose()
+
+        logger.info(f"Current schema version: {current_version}, latest: {migrations.SCHEMA_VERSION}")
+
+        # Initialize database connection (applies pending migrations)
         logger.info("Initializing database connection...")
         database.init_db(DB_PATH)
 
-        # Check current schema
-        logger.info("Checking current database schema...")
-        needs_update = database.check_if_needs_recreation(DB_PATH)
-
-        if needs_update:
-            logger.info("Database needs update - forcing recreation...")
-            database.recreate_database_tables()
+        if current_version < migrations.SCHEMA_VERSION:
             logger.info("✅ Database update completed successfully!")
         else:
             logger.info("Database schema is already up to date")
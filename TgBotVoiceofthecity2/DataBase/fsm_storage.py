@@ -0,0 +1,180 @@
+"""
+FSM storage kept in the fsm_states table, so conversations survive restarts
+Reads go through a small LRU cache. Writes are coalesced: changed records wait in memory
+and are written in one transaction every FLUSH_INTERVAL seconds (set_state() followed by
+update_data() in one handler costs a single row write), and on close(). Records not
+written for `ttl` seconds (Settings.config.FSM_STATE_TTL) read as empty and are deleted
+every EVICT_INTERVAL seconds. Only meant for a single bot process: the cache isn't
+shared between processes.
+"""
+import json
+import asyncio
+import logging
+import contextvars
+from datetime import datetime, timedelta
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from DataBase import async_database
+from DataBase.cache import TTLCache, MISSING
+from Settings.config import FSM_STATE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Seconds changed records wait before being written
+FLUSH_INTERVAL = 1.0
+
+# Seconds between deletions of expired records
+EVICT_INTERVAL = 600
+
+# Records of recently active chats kept in memory
+CACHE_SIZE = 5000
+CACHE_TTL = 600
+
+# State and data of a chat without an active conversation
+EMPTY = (None, {})
+
+
+class SQLiteStorage(BaseStorage):
+    """aiogram FSM storage backed by the fsm_states table through DataBase.async_database"""
+
+    def __init__(self, ttl=FSM_STATE_TTL, flush_interval=FLUSH_INTERVAL, cache_size=CACHE_SIZE,
+                 key_builder=None):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # key -> (state, data, updated_at) as stored or about to be stored
+        self._cache = TTLCache(maxsize=cache_size, ttl=CACHE_TTL)
+        # key -> ((state, data, updated_at), data as JSON) waiting for the next flush
+        self._dirty = {}
+        self._task = None
+        self._loop = None
+        self._next_eviction = 0.0
+        self.flushes = 0
+        self.written = 0
+        self.evicted = 0
+
+    def _start(self):
+        """Start the flush worker in the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+
+        self._loop = loop
+        # Own empty context: the worker must not inherit the unit of work of the update that started it
+        self._task = contextvars.Context().run(loop.create_task, self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if self._loop.time() >= self._next_eviction:
+                self._next_eviction = self._loop.time() + EVICT_INTERVAL
+                await self.evict_expired()
+
+    def _expires_before(self):
+        """Records last written before this ISO datetime are expired"""
+        return (datetime.now() - timedelta(seconds=self.ttl)).isoformat(timespec='seconds')
+
+    async def _load(self, key):
+        """(state, data) of key, the data must not be modified"""
+        queued = self._dirty.get(key)
+        record = queued[0] if queued else self._cache.get(key)
+        if record is MISSING:
+            # Writes bump the cache generation, see _store()
+            generation = self._cache.generation
+            row = await async_database.get_fsm_record(key, self._expires_before())
+            record = (row[0], json.loads(row[1]), row[2]) if row else (None, {}, '')
+            self._cache.set(key, record, generation)
+
+        state, data, updated_at = record
+        if updated_at and updated_at < self._expires_before():
+            return EMPTY
+        return state, data
+
+    def _store(self, key, state, data):
+        """Queue (state, data) of key for the next flush, raises TypeError if data isn't JSON serializable"""
+        # Serialized here, so a bad value fails the handler that stored it rather than the flush
+        data_json = json.dumps(data, ensure_ascii=False)
+        self._start()
+        record = (state, data, datetime.now().isoformat(timespec='seconds'))
+        self._cache.invalidate(key)
+        self._cache.set(key, record)
+        self._dirty[key] = (record, data_json)
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        storage_key = self.key_builder.build(key)
+        _, data = await self._load(storage_key)
+        self._store(storage_key, state, data)
+
+    async def get_state(self, key):
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key, data):
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._load(storage_key)
+        self._store(storage_key, state, dict(data))
+
+    async def get_data(self, key):
+        _, data = await self._load(self.key_builder.build(key))
+        return dict(data)
+
+    async def flush(self):
+        """Write the queued records in one transaction (kept queued if that fails)"""
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        records = [(key, state, data_json, updated_at)
+                   for key, ((state, _, updated_at), data_json) in dirty.items()]
+        try:
+            await async_database.save_fsm_records(records)
+        except asyncio.CancelledError:
+            # Stopped by close() mid-write, which flushes them again
+            self._dirty = {**dirty, **self._dirty}
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save {len(records)} FSM record(s), retrying later: {e}")
+            # Newer changes made meanwhile win
+            self._dirty = {**dirty, **self._dirty}
+            return
+
+        self.flushes += 1
+        self.written += len(records)
+
+    async def evict_expired(self):
+        """Delete records that expired, return how many"""
+        try:
+            deleted = await async_database.delete_expired_fsm_records(self._expires_before())
+        except Exception as e:
+            logger.error(f"Failed to delete expired FSM records: {e}")
+            return 0
+
+        if deleted:
+            logger.info(f"Deleted {deleted} expired FSM record(s)")
+        self.evicted += deleted
+        return deleted
+
+    async def close(self):
+        """Stop the worker and write what is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        """Queued records, flush/eviction counters and the read cache's counters"""
+        return {
+            'queued': len(self._dirty),
+            'flushes': self.flushes,
+            'written': self.written,
+            'evicted': self.evicted,
+            'cache': self._cache.stats()
+        }
@@ -0,0 +1,359 @@
+"""
+Versioned schema migrations
+The schema version is stored in PRAGMA user_version. Pending steps are applied in
+order, in place, inside a single transaction - data never leaves SQLite.
+"""
+import logging
+
+from DataBase.models import Base, BookingSlot, StatsCounter, FSMState, SLOT_MINUTES
+
+# Users table layout as of migration 1, used when the table has to be rebuilt
+USERS_TABLE_DDL = """
+CREATE TABLE users_new (
+    id VARCHAR NOT NULL,
+    first_name VARCHAR NOT NULL,
+    patronymic VARCHAR,
+    second_name VARCHAR NOT NULL,
+    email VARCHAR NOT NULL,
+    confirm_email BOOLEAN,
+    phone VARCHAR NOT NULL,
+    confirm_phone BOOLEAN,
+    hash_password VARCHAR NOT NULL,
+    cooldown VARCHAR NOT NULL,
+    role_id VARCHAR NOT NULL,
+    agreements_status BOOLEAN,
+    telegram_id VARCHAR,
+    saved_telegram_id VARCHAR,
+    verified BOOLEAN,
+    artist_form_filled BOOLEAN,
+    PRIMARY KEY (id),
+    UNIQUE (email),
+    UNIQUE (phone),
+    FOREIGN KEY(role_id) REFERENCES roles (id)
+)
+"""
+
+# Values for users columns that may be missing in old databases
+USERS_COLUMN_DEFAULTS = {
+    'patronymic': "''",
+    'confirm_email': '0',
+    'confirm_phone': '0',
+    'agreements_status': '1',
+    'telegram_id': 'NULL',
+    'saved_telegram_id': 'NULL',
+    'verified': '0',
+    'artist_form_filled': '0',
+}
+
+
+def table_exists(conn, table):
+    """Check if a table exists"""
+    result = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return result.first() is not None
+
+
+def table_columns(conn, table):
+    """Get column names of a table"""
+    return [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+
+
+def get_schema_version(conn):
+    """Read the schema version stored in PRAGMA user_version"""
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate_users_columns(conn):
+    """Drop the legacy passport column and add verified/artist_form_filled"""
+    if not table_exists(conn, 'users'):
+        return
+
+    columns = table_columns(conn, 'users')
+
+    if 'passport' in columns:
+        # SQLite can't drop a column referenced by constraints, so rebuild the table
+        logging.info("Rebuilding users table without passport column")
+        conn.exec_driver_sql(USERS_TABLE_DDL)
+
+        target_columns = ['id', 'first_name', 'patronymic', 'second_name', 'email', 'confirm_email',
+                          'phone', 'confirm_phone', 'hash_password', 'cooldown', 'role_id',
+                          'agreements_status', 'telegram_id', 'saved_telegram_id', 'verified',
+                          'artist_form_filled']
+        select_list = [
+            column if column in columns else f"{USERS_COLUMN_DEFAULTS[column]} AS {column}"
+            for column in target_columns
+        ]
+
+        conn.exec_driver_sql(
+            f"INSERT INTO users_new ({', '.join(target_columns)}) "
+            f"SELECT {', '.join(select_list)} FROM users"
+        )
+        conn.exec_driver_sql("DROP TABLE users")
+        conn.exec_driver_sql("ALTER TABLE users_new RENAME TO users")
+        return
+
+    for column in ['verified', 'artist_form_filled']:
+        if column not in columns:
+            logging.info(f"Adding users.{column} column")
+            conn.exec_driver_sql(
+                f"ALTER TABLE users ADD COLUMN {column} BOOLEAN DEFAULT {USERS_COLUMN_DEFAULTS[column]}"
+            )
+
+
+def migrate_booking_minutes(conn):
+    """Add integer start/end minute columns to bookings and the (location_id, date) index"""
+    if not table_exists(conn, 'bookings'):
+        return
+
+    columns = table_columns(conn, 'bookings')
+
+    if 'start_minute' not in columns:
+        logging.info("Adding bookings.start_minute/end_minute columns")
+        conn.exec_driver_sql("ALTER TABLE bookings ADD COLUMN start_minute INTEGER NOT NULL DEFAULT 0")
+        conn.exec_driver_sql("ALTER TABLE bookings ADD COLUMN end_minute INTEGER NOT NULL DEFAULT 0")
+
+        # Backfill from the HH:MM time string
+        conn.exec_driver_sql("""
+            UPDATE bookings
+            SET start_minute = CAST(substr(time, 1, instr(time, ':') - 1) AS INTEGER) * 60
+                             + CAST(substr(time, instr(time, ':') + 1) AS INTEGER)
+        """)
+        conn.exec_driver_sql("UPDATE bookings SET end_minute = start_minute + duration_hours * 60")
+
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_bookings_location_date ON bookings (location_id, date)"
+    )
+
+
+def migrate_booking_slots(conn):
+    """Create booking_slots and reserve the slots of existing bookings"""
+    BookingSlot.__table__.create(conn, checkfirst=True)
+
+    if not table_exists(conn, 'bookings'):
+        return
+
+    # Expand every booking into its slots; bookings that already overlapped keep the earliest one
+    conn.exec_driver_sql(f"""
+        WITH RECURSIVE slots(location_id, date, slot, end_minute, booking_id, created_at) AS (
+            SELECT location_id, date, start_minute - start_minute % {SLOT_MINUTES}, end_minute, id, created_at
+            FROM bookings
+            WHERE end_minute > start_minute
+            UNION ALL
+            SELECT location_id, date, slot + {SLOT_MINUTES}, end_minute, booking_id, created_at
+            FROM slots
+            WHERE slot + {SLOT_MINUTES} < end_minute
+        )
+        INSERT OR IGNORE INTO booking_slots (location_id, date, slot, booking_id)
+        SELECT location_id, date, slot, booking_id FROM slots ORDER BY created_at, slot
+    """)
+    reserved = conn.exec_driver_sql("SELECT COUNT(*) FROM booking_slots").scalar()
+    logging.info(f"Reserved {reserved} booking slots for existing bookings")
+
+
+def migrate_pagination_indexes(conn):
+    """Add the indexes behind keyset pagination of the admin lists"""
+    if table_exists(conn, 'users'):
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_second_name_id ON users (second_name, id)")
+    if table_exists(conn, 'bookings'):
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_bookings_date_time_id ON bookings (date, time, id)")
+
+
+# FTS5 trigram indexes over the searchable text columns, kept in sync with the tables by triggers.
+# The trigram tokenizer matches any substring of 3+ characters and folds case (Cyrillic too).
+# They reference rows by rowid: after a VACUUM (which may renumber rowids) call
+# database.rebuild_search_index().
+SEARCH_TABLES = {
+    'users_fts': ('users', ['first_name', 'second_name', 'patronymic', 'email', 'phone']),
+    'locations_fts': ('locations', ['address']),
+}
+
+
+def create_search_tables(conn):
+    """Create missing FTS5 search tables with their sync triggers and fill new ones"""
+    for fts_table, (table, columns) in SEARCH_TABLES.items():
+        if table_exists(conn, fts_table) or not table_exists(conn, table):
+            continue
+
+        logging.info(f"Creating full-text search table {fts_table}")
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f"new.{column}" for column in columns)
+        old_values = ', '.join(f"old.{column}" for column in columns)
+
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {fts_table} USING fts5({column_list}, "
+            f"content='{table}', content_rowid='rowid', tokenize='trigram')"
+        )
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER {fts_table}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.rowid, {new_values});
+            END
+        """)
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER {fts_table}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+            END
+        """)
+        # Only changes of indexed columns touch the index (cooldown updates etc. don't)
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER {fts_table}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.rowid, {new_values});
+            END
+        """)
+        conn.exec_driver_sql(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+
+# Counters in stats_counters, each maintained by the triggers below in the same transaction
+# as the write that changes it. Per-value counters are named '<prefix><value>'.
+STATS_USERS = 'users'
+STATS_USERS_CONFIRMED_EMAIL = 'users_confirmed_email'
+STATS_USERS_CONFIRMED_PHONE = 'users_confirmed_phone'
+STATS_USERS_WITH_TELEGRAM = 'users_with_telegram'
+STATS_BOOKINGS = 'bookings'
+STATS_BOOKINGS_BY_DURATION = 'bookings_by_duration:'
+STATS_BOOKINGS_BY_LOCATION = 'bookings_by_location:'
+
+# SQL of the value each user row adds to a counter
+USER_STATS = {
+    STATS_USERS: "1",
+    STATS_USERS_CONFIRMED_EMAIL: "CASE WHEN {row}.confirm_email THEN 1 ELSE 0 END",
+    STATS_USERS_CONFIRMED_PHONE: "CASE WHEN {row}.confirm_phone THEN 1 ELSE 0 END",
+    STATS_USERS_WITH_TELEGRAM: "CASE WHEN coalesce({row}.telegram_id, '') != '' THEN 1 ELSE 0 END",
+}
+
+
+def stats_upsert(name, delta):
+    """Statement adding delta (SQL expressions) to a counter, creating it if needed"""
+    return (
+        f"INSERT INTO stats_counters (name, value) VALUES ({name}, {delta}) "
+        f"ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;"
+    )
+
+
+def user_stats_statements(row, sign):
+    """Counter updates for adding (sign '+') or removing (sign '-') a users row"""
+    return "\n".join(
+        stats_upsert(f"'{name}'", f"{sign}({expression.format(row=row)})") for name, expression in USER_STATS.items()
+    )
+
+
+def booking_stats_statements(row, sign):
+    """Counter updates for adding (sign '+') or removing (sign '-') a bookings row"""
+    return "\n".join([
+        stats_upsert(f"'{STATS_BOOKINGS}'", f"{sign}1"),
+        stats_upsert(f"'{STATS_BOOKINGS_BY_DURATION}' || {row}.duration_hours", f"{sign}1"),
+        stats_upsert(f"'{STATS_BOOKINGS_BY_LOCATION}' || {row}.location_id", f"{sign}1"),
+    ])
+
+
+STATS_TRIGGERS = {
+    'stats_users_insert': f"AFTER INSERT ON users BEGIN {user_stats_statements('new', '+')} END",
+    'stats_users_delete': f"AFTER DELETE ON users BEGIN {user_stats_statements('old', '-')} END",
+    'stats_users_update': (
+        f"AFTER UPDATE OF confirm_email, confirm_phone, telegram_id ON users BEGIN "
+        f"{user_stats_statements('old', '-')} {user_stats_statements('new', '+')} END"
+    ),
+    'stats_bookings_insert': f"AFTER INSERT ON bookings BEGIN {booking_stats_statements('new', '+')} END",
+    'stats_bookings_delete': f"AFTER DELETE ON bookings BEGIN {booking_stats_statements('old', '-')} END",
+    'stats_bookings_update': (
+        f"AFTER UPDATE OF duration_hours, location_id ON bookings BEGIN "
+        f"{booking_stats_statements('old', '-')} {booking_stats_statements('new', '+')} END"
+    ),
+}
+
+
+def count_stats(conn):
+    """Every counter recounted from the tables as (name, value) pairs, one query per dimension"""
+    user_columns = ', '.join(
+        f"SUM({expression.format(row='users')})" for expression in USER_STATS.values()
+    )
+    user_values = conn.exec_driver_sql(f"SELECT {user_columns} FROM users").first()
+    counters = [(name, value or 0) for name, value in zip(USER_STATS, user_values)]
+
+    counters.append((STATS_BOOKINGS, conn.exec_driver_sql("SELECT COUNT(*) FROM bookings").scalar()))
+    counters += conn.exec_driver_sql(
+        f"SELECT '{STATS_BOOKINGS_BY_DURATION}' || duration_hours, COUNT(*) FROM bookings GROUP BY duration_hours"
+    ).all()
+    counters += conn.exec_driver_sql(
+        f"SELECT '{STATS_BOOKINGS_BY_LOCATION}' || location_id, COUNT(*) FROM bookings GROUP BY location_id"
+    ).all()
+    return [tuple(counter) for counter in counters]
+
+
+def fill_stats_counters(conn):
+    """Replace stats_counters with values recounted from the tables"""
+    conn.exec_driver_sql("DELETE FROM stats_counters")
+    conn.exec_driver_sql("INSERT INTO stats_counters (name, value) VALUES (?, ?)", count_stats(conn))
+
+
+def create_stats_counters(conn):
+    """Create stats_counters with its triggers if missing and fill it from the tables"""
+    if not table_exists(conn, 'users') or not table_exists(conn, 'bookings'):
+        return
+
+    existing = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='trigger'")}
+    if set(STATS_TRIGGERS) <= existing:
+        return
+
+    logging.info("Creating statistics counters")
+    StatsCounter.__table__.create(conn, checkfirst=True)
+    for name, definition in STATS_TRIGGERS.items():
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {definition}")
+    fill_stats_counters(conn)
+
+
+def create_fsm_states(conn):
+    """Create the FSM storage table"""
+    FSMState.__table__.create(conn, checkfirst=True)
+
+
+# Ordered list of (version, description, migration function)
+MIGRATIONS = [
+    (1, "users: drop passport, add verified/artist_form_filled", migrate_users_columns),
+    (2, "bookings: integer start/end minutes and (location_id, date) index", migrate_booking_minutes),
+    (3, "booking_slots: atomic slot reservation table", migrate_booking_slots),
+    (4, "users/bookings: keyset pagination indexes", migrate_pagination_indexes),
+    (5, "users_fts/locations_fts: FTS5 trigram search", create_search_tables),
+    (6, "stats_counters: counters maintained by triggers", create_stats_counters),
+    (7, "fsm_states: persistent FSM storage", create_fsm_states),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(engine):
+    """Apply pending migrations in one transaction and return the resulting schema version"""
+    # Transaction is managed by hand so that DDL is part of it as well
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        version = get_schema_version(conn)
+
+        if version == SCHEMA_VERSION:
+            return version
+
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Database schema version {version} is newer than supported {SCHEMA_VERSION}")
+
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            if not table_exists(conn, 'users'):
+                logging.info("Empty database - creating schema from models")
+            else:
+                for target_version, description, migrate in MIGRATIONS:
+                    if target_version > version:
+                        logging.info(f"Applying migration {target_version}: {description}")
+                        migrate(conn)
+
+            # Create tables that don't exist yet (fresh database or newly added models)
+            Base.metadata.create_all(conn)
+            # Search tables and triggers aren't models, a fresh database gets them here
+            create_search_tables(conn)
+            create_stats_counters(conn)
+
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.exec_driver_sql("COMMIT")
+        except Exception as e:
+            conn.exec_driver_sql("ROLLBACK")
+            logging.error(f"Migration failed, schema left at version {version}: {e}")
+            raise
+
+        logging.info(f"Database schema migrated from version {version} to {SCHEMA_VERSION}")
+        return SCHEMA_VERSION
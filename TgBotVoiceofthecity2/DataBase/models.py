@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, UniqueConstraint
+from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -6,6 +6,22 @@ import uuid
 
 Base = declarative_base()
 
+# Granularity of booking_slots rows in minutes
+SLOT_MINUTES = 15
+
+
+def slot_range(start_minute, end_minute):
+    """Start minutes of every slot touched by the interval [start_minute, end_minute)"""
+    return range(start_minute - start_minute % SLOT_MINUTES, end_minute, SLOT_MINUTES)
+
+
+def on_slot_grid(start_minute, end_minute):
+    """
+    Check that [start_minute, end_minute) starts and ends on slot boundaries. Only such
+    intervals map to disjoint slots: 10:10-11:10 and 11:10-12:10 would both claim 11:00.
+    """
+    return start_minute % SLOT_MINUTES == 0 and end_minute % SLOT_MINUTES == 0
+
 class Role(Base):
     __tablename__ = 'roles'
 
@@ -39,6 +55,11 @@ class User(Base):
     verified = Column(Boolean, default=False)  # New field for admin verification
     artist_form_filled = Column(Boolean, default=False)  # Новое поле для статуса анкеты
 
+    # Keyset pagination of the admin users list
+    __table_args__ = (
+        Index('ix_users_second_name_id', 'second_name', 'id'),
+    )
+
     # Relationships
     role = relationship("Role", back_populates="users")
     bookings = relationship("Booking", back_populates="user")
@@ -86,8 +107,17 @@ class Booking(Base):
     date = Column(String, nullable=False)  # ISO format date string
     time = Column(String, nullable=False)
     duration_hours = Column(Integer, nullable=False)
+    start_minute = Column(Integer, nullable=False)  # Minutes since midnight, derived from time
+    end_minute = Column(Integer, nullable=False)  # start_minute + duration_hours * 60
     created_at = Column(String, nullable=False)  # ISO format datetime string
 
+    # Conflict checks and schedules always filter on location and date
+    __table_args__ = (
+        Index('ix_bookings_location_date', 'location_id', 'date'),
+        # Keyset pagination of the admin bookings list
+        Index('ix_bookings_date_time_id', 'date', 'time', 'id'),
+    )
+
     # Relationships
     user = relationship("User", back_populates="bookings")
     location = relationship("Location", back_populates="bookings")
@@ -98,10 +128,58 @@ class Booking(Base):
             self.user_id = user_id
             self.location_id = location_id
             self.date = date
-            self.time = time
-            self.duration_hours = duration_hours
+            self.set_time(time, duration_hours)
             self.created_at = datetime.now().isoformat()
 
+    def set_time(self, time, duration_hours):
+        """Set start time (HH:MM) and duration, keeping the minute columns in sync"""
+        hours, minutes = map(int, time.split(':'))
+        self.time = time
+        self.duration_hours = duration_hours
+        self.start_minute = hours * 60 + minutes
+        self.end_minute = self.start_minute + duration_hours * 60
+
+class BookingSlot(Base):
+    """One reserved slot of a location on a date; the primary key makes double booking impossible"""
+    __tablename__ = 'booking_slots'
+
+    location_id = Column(String, ForeignKey('locations.id'), primary_key=True)
+    date = Column(String, primary_key=True)  # ISO format date string
+    slot = Column(Integer, primary_key=True)  # Slot start, minutes since midnight
+    booking_id = Column(String, ForeignKey('bookings.id'), nullable=False, index=True)
+
+    def __init__(self, location_id, date, slot, booking_id):
+        self.location_id = location_id
+        self.date = date
+        self.slot = slot
+        self.booking_id = booking_id
+
+class StatsCounter(Base):
+    """Named counter kept up to date by triggers (see migrations.STATS_TRIGGERS)"""
+    __tablename__ = 'stats_counters'
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+    def __init__(self, name, value=0):
+        self.name = name
+        self.value = value
+
+class FSMState(Base):
+    """FSM state and data of one chat/user (see DataBase/fsm_storage.py)"""
+    __tablename__ = 'fsm_states'
+
+    key = Column(String, primary_key=True)  # DefaultKeyBuilder key
+    state = Column(String)
+    data = Column(String, nullable=False, default='{}')  # JSON object
+    updated_at = Column(String, nullable=False, index=True)  # ISO format datetime string, for TTL eviction
+
+    def __init__(self, key, state, data, updated_at):
+        self.key = key
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+
 class Settings(Base):
     __tablename__ = 'settings'
 
@@ -1,24 +1,34 @@
 from aiogram import Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from handlers.auth import register_auth_handlers
 from handlers.start import register_start_handlers
 from handlers.profile import register_profile_handlers
 from handlers.bookings import register_booking_handlers
+from handlers.free_slots import register_free_slot_handlers
 from handlers.help import register_help_handlers
 from handlers.admin import register_admin_handlers
 from handlers.common import register_common_handlers
+from Main.middlewares import UnitOfWorkMiddleware, UserMiddleware
+from DataBase.fsm_storage import SQLiteStorage
 
 
 def setup_bot():
     """Set up the bot with all handlers and middleware"""
-    dp = Dispatcher(storage=MemoryStorage())
+    # Conversation states live in the database: they survive restarts and expire when abandoned
+    dp = Dispatcher(storage=SQLiteStorage())
+
+    # One database session per update, shared by the middlewares and handlers below
+    dp.update.outer_middleware(UnitOfWorkMiddleware())
+
+    # Resolve the current user once per update, handlers get it as `user` / `is_admin`
+    dp.update.outer_middleware(UserMiddleware())
 
     # Register all handlers
     register_start_handlers(dp)
     register_auth_handlers(dp)
     register_profile_handlers(dp)
     register_booking_handlers(dp)
+    register_free_slot_handlers(dp)
     register_help_handlers(dp)
     register_admin_handlers(dp)  # Register admin handlers
     register_common_handlers(dp)
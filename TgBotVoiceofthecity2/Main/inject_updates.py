@@ -0,0 +1,200 @@
+"""
+Local update injector for benchmarking the webhook endpoint
+POSTs synthetic message updates (/start, /help, /bookings from many users) the way
+Telegram does, with the secret token header, from several concurrent clients.
+
+Without --url the endpoint is started in this process on a throw-away database, with
+a fake Telegram API that answers every call after --api-latency seconds (nothing is
+sent to Telegram, and the send scheduler's flood limits are left out), so both the
+acknowledgement latency and the time until every update is processed are measured.
+With --url updates are sent to a running bot (UPDATES_MODE = "webhook"), only the
+acknowledgements can be measured then.
+
+Usage: python Main/inject_updates.py [--url http://127.0.0.1:8080/webhook --secret S]
+                                     [--updates 2000] [--clients 50] [--users 200]
+                                     [--concurrency 32] [--api-latency 0.05]
+"""
+import os
+import sys
+import asyncio
+import logging
+import argparse
+import tempfile
+from time import perf_counter, time
+from datetime import datetime
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Message, Chat
+
+from DataBase import database, async_database
+from DataBase.init_bookings import create_sample_bookings
+from Main.bot import setup_bot
+from Main.webhook import create_webhook_app
+from Settings.config import WEBHOOK_PATH, UPDATES_CONCURRENCY
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TEXTS = ['/start', '/help', '/bookings']
+
+# Syntactically valid, never sent anywhere
+FAKE_TOKEN = '42:' + 'A' * 35
+LOCAL_SECRET = 'benchmark-secret'
+
+
+class FakeTelegramSession(BaseSession):
+    """Answers every Bot API call after a fixed delay instead of sending it"""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if method.__returning__ is Message:
+            return Message(message_id=1, date=datetime.now(), chat=Chat(id=getattr(method, 'chat_id', 1),
+                                                                        type='private'), text='')
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def make_update(update_id, user_id):
+    """Update with a text message from user_id, as Telegram would POST it"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+            'from': user,
+            'text': TEXTS[update_id % len(TEXTS)]
+        }
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def inject(url, secret, updates, clients, users):
+    """POST updates from concurrent clients, return (acknowledgement latencies, status counts, elapsed)"""
+    update_ids = iter(range(1, updates + 1))
+    latencies = []
+    statuses = {}
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret}
+
+    async def client(session):
+        for update_id in update_ids:
+            started = perf_counter()
+            async with session.post(url, json=make_update(update_id, 1000 + update_id % users),
+                                    headers=headers) as response:
+                await response.read()
+            latencies.append(perf_counter() - started)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    started = perf_counter()
+    async with ClientSession() as session:
+        await asyncio.gather(*[client(session) for _ in range(clients)])
+    return latencies, statuses, perf_counter() - started
+
+
+async def check_secret(url):
+    """Status of a request with a wrong secret token (must be 401)"""
+    async with ClientSession() as session:
+        async with session.post(url, json=make_update(0, 1),
+                                headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'}) as response:
+            return response.status
+
+
+async def run_local(args):
+    """Start the endpoint on a throw-away database, inject updates and wait until they're processed"""
+    db_path = os.path.join(tempfile.mkdtemp(prefix='inject_updates_'), 'database.db')
+    database.init_db(db_path)
+    async_database.init_async_db(db_path, max_connections=args.concurrency)
+    create_sample_bookings()
+
+    session = FakeTelegramSession(args.api_latency)
+    bot = Bot(FAKE_TOKEN, session=session)
+    dp = setup_bot()
+    app, handler = create_webhook_app(dp, bot, LOCAL_SECRET, concurrency=args.concurrency)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = f'http://127.0.0.1:{port}{WEBHOOK_PATH}'
+
+    try:
+        wrong_secret_status = await check_secret(url)
+        started = perf_counter()
+        latencies, statuses, acked = await inject(url, LOCAL_SECRET, args.updates, args.clients, args.users)
+        await handler.wait_idle()
+        processed = perf_counter() - started
+    finally:
+        await runner.cleanup()
+        await async_database.close_async_db()
+        database.close_db()
+
+    return latencies, statuses, acked, processed, wrong_secret_status, handler.stats(), session.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inject synthetic updates into the webhook endpoint")
+    parser.add_argument('--url', help="endpoint of a running bot (default: start one in this process)")
+    parser.add_argument('--secret', default='', help="secret token of the running bot's webhook")
+    parser.add_argument('--updates', type=int, default=2000, help="number of updates to send")
+    parser.add_argument('--clients', type=int, default=50, help="concurrent HTTP clients")
+    parser.add_argument('--users', type=int, default=200, help="distinct users sending the updates")
+    parser.add_argument('--concurrency', type=int, default=UPDATES_CONCURRENCY,
+                        help="updates processed at the same time by the local endpoint")
+    parser.add_argument('--api-latency', type=float, default=0.05,
+                        help="seconds the fake Telegram API takes to answer a call")
+    args = parser.parse_args()
+
+    if args.url:
+        latencies, statuses, acked = asyncio.run(
+            inject(args.url, args.secret, args.updates, args.clients, args.users)
+        )
+    else:
+        latencies, statuses, acked, processed, wrong_secret_status, stats, calls = asyncio.run(run_local(args))
+
+    print(f"\n{len(latencies)} updates acknowledged in {acked:.2f}s ({len(latencies) / acked:.0f}/s), "
+          f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms, "
+          f"statuses {statuses}")
+    if args.url:
+        if set(statuses) != {200}:
+            sys.exit(1)
+        return
+
+    print(f"processed in {processed:.2f}s ({stats['processed'] / processed:.0f}/s) with concurrency "
+          f"{stats['concurrency']}: avg latency {stats['avg_latency'] * 1000:.1f}ms, max "
+          f"{stats['max_latency'] * 1000:.1f}ms, avg wait for a slot {stats['avg_wait'] * 1000:.1f}ms, "
+          f"{calls} Bot API calls")
+    print(f"wrong secret token answered with {wrong_secret_status}")
+    if stats['processed'] != args.updates or stats['failed'] or wrong_secret_status != 401 or set(statuses) != {200}:
+        print("❌ Some updates were rejected or failed")
+        sys.exit(1)
+    print("✅ Every update was processed, the wrong secret token was rejected")
+
+
+if __name__ == "__main__":
+    main()
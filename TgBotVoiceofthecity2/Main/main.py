@@ -3,14 +3,18 @@ import logging
 import os
 import threading
 from datetime import date
+from time import perf_counter
 
 from aiogram import Bot
 
-from DataBase import database
+from DataBase import database, async_database
 from DataBase.init_bookings import create_sample_bookings
 from Main.bot import setup_bot
-from Settings.config import BOT_TOKEN
+from Main.middlewares import SendSchedulerMiddleware
+from Main.webhook import run_webhook
+from Settings.config import BOT_TOKEN, UPDATES_MODE, UPDATES_CONCURRENCY
 from api_server import start_server
+from utils.send_scheduler import send_scheduler
 
 # Configure logging
 logging.basicConfig(
@@ -32,14 +36,17 @@ async def main():
     os.makedirs(STORAGE_DIR, exist_ok=True)
 
     # Initialize database
-    database.init_db(DB_PATH)
+    timings = database.init_db(DB_PATH)
+    # Enough connections for every update processed at the same time
+    async_database.init_async_db(DB_PATH, max_connections=UPDATES_CONCURRENCY)
 
     # Check if database has any locations, if not, initialize with sample bookings
-    locations = database.get_all_locations()
-    if not locations:
+    stage_started = perf_counter()
+    if not database.has_locations():
         logger.info("No locations found. Initializing with sample data...")
         create_sample_bookings()
         logger.info("Database initialized with sample locations")
+    timings['sample_data'] = perf_counter() - stage_started
 
     # Start FastAPI server in a separate thread
     logger.info("Starting FastAPI server...")
@@ -48,16 +55,31 @@ async def main():
     logger.info("FastAPI server started on http://localhost:8000")
 
     # Create and setup bot
+    stage_started = perf_counter()
     bot = Bot(token=BOT_TOKEN)
+    # Throttle outgoing messages to Telegram's flood limits
+    bot.session.middleware(SendSchedulerMiddleware())
     dp = setup_bot()
+    timings['bot_setup'] = perf_counter() - stage_started
+
+    logger.info("Startup timings: " +
+                ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items()))
 
     # Start the bot
     try:
-        logger.info("Bot started")
-        await dp.start_polling(bot)
+        if UPDATES_MODE == "webhook":
+            logger.info("Bot started (webhook)")
+            await run_webhook(dp, bot)
+        else:
+            logger.info("Bot started (polling)")
+            # getUpdates doesn't work while a webhook is set, e.g. after switching modes
+            await bot.delete_webhook()
+            await dp.start_polling(bot, tasks_concurrency_limit=UPDATES_CONCURRENCY)
     finally:
         logger.info("Bot stopped")
         await bot.session.close()
+        await send_scheduler.close()
+        await async_database.close_async_db()
         database.close_db()
 
 
@@ -0,0 +1,93 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod, Response
+from aiogram.types import TelegramObject
+
+from utils.admin import is_admin
+from utils.send_scheduler import send_scheduler
+from DataBase import async_database
+
+logger = logging.getLogger(__name__)
+
+
+class UserMiddleware(BaseMiddleware):
+    """
+    Resolve the sender once per update and pass it to handlers as data kwargs:
+    `user` (user dict or None when not logged in) and `is_admin` (bool).
+    Registered as an outer middleware on dp.update, after aiogram's own
+    UserContextMiddleware has put the sender into data['event_from_user'].
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        event_user = data.get('event_from_user')
+
+        if event_user:
+            data['user'] = await async_database.get_user_by_telegram_id(str(event_user.id))
+            data['is_admin'] = is_admin(event_user.id)
+        else:
+            data['user'] = None
+            data['is_admin'] = False
+
+        return await handler(event, data)
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """
+    Run the whole update in one async_database.unit_of_work(), so every database
+    call of the update (UserMiddleware's lookup included) shares one session. The
+    pooled connection is only held during those calls, not across Telegram API calls.
+    Registered as an outer middleware on dp.update before UserMiddleware.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        async with async_database.unit_of_work():
+            return await handler(event, data)
+
+
+class SendSchedulerMiddleware(BaseRequestMiddleware):
+    """
+    Pass every API call addressed to a chat through utils.send_scheduler, so the bot stays
+    within Telegram's flood limits, and retry calls answered with 429 after retry_after.
+    Registered on bot.session, it covers all outgoing calls whatever handler makes them.
+    """
+
+    # Attempts of one call before TelegramRetryAfter is raised to the handler
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, scheduler=send_scheduler):
+        self.scheduler = scheduler
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType,
+            bot,
+            method: TelegramMethod
+    ) -> Response:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            await self.scheduler.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.MAX_ATTEMPTS:
+                    raise
+                logger.warning(f"Flood limit hit in chat {chat_id}, retrying {method.__api_method__} "
+                               f"in {e.retry_after}s")
+                self.scheduler.retry_after(chat_id, e.retry_after)
@@ -0,0 +1,145 @@
+"""
+Webhook mode: Telegram POSTs updates to an aiohttp endpoint instead of the bot polling
+getUpdates. Requests must carry the secret token registered with setWebhook, they are
+acknowledged at once and processed in the background, at most UPDATES_CONCURRENCY at a
+time (the rest wait for a free slot). See Settings/config.py for the settings and
+Main/inject_updates.py for a local load generator.
+"""
+import asyncio
+import logging
+import secrets
+from time import perf_counter
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from Settings.config import (
+    WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, UPDATES_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler processing at most `concurrency` updates at a time, with counters"""
+
+    def __init__(self, dispatcher, bot, concurrency=UPDATES_CONCURRENCY, **kwargs):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.received = 0
+        self.rejected = 0
+        self.waiting = 0
+        self.processing = 0
+        self.processed = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    async def handle(self, request):
+        response = await super().handle(request)
+        if response.status == 401:
+            self.rejected += 1
+            logger.warning(f"Rejected webhook request from {request.remote}: wrong secret token")
+        else:
+            self.received += 1
+        return response
+
+    async def _background_feed_update(self, bot, update):
+        queued_at = perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started = perf_counter()
+        self.processing += 1
+        try:
+            await super()._background_feed_update(bot, update)
+            self.processed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception(f"Failed to process update {update.get('update_id')}")
+        finally:
+            self.processing -= 1
+            self._semaphore.release()
+
+        finished = perf_counter()
+        self._wait_total += started - queued_at
+        self._wait_max = max(self._wait_max, started - queued_at)
+        self._latency_total += finished - queued_at
+        self._latency_max = max(self._latency_max, finished - queued_at)
+
+    async def wait_idle(self):
+        """Wait until every received update has been processed"""
+        while self._background_feed_update_tasks:
+            await asyncio.gather(*self._background_feed_update_tasks, return_exceptions=True)
+
+    async def close(self):
+        """Finish the updates already acknowledged to Telegram, then close the bot session"""
+        await self.wait_idle()
+        await super().close()
+
+    def stats(self):
+        """Request counters, queue depth and waiting/processing times in seconds"""
+        done = self.processed + self.failed
+        return {
+            'concurrency': self.concurrency,
+            'received': self.received,
+            'rejected': self.rejected,
+            'waiting': self.waiting,
+            'processing': self.processing,
+            'processed': self.processed,
+            'failed': self.failed,
+            'avg_wait': round(self._wait_total / done, 4) if done else 0.0,
+            'max_wait': round(self._wait_max, 4),
+            'avg_latency': round(self._latency_total / done, 4) if done else 0.0,
+            'max_latency': round(self._latency_max, 4)
+        }
+
+
+def create_webhook_app(dp, bot, secret_token, concurrency=UPDATES_CONCURRENCY, path=WEBHOOK_PATH):
+    """aiohttp application serving the webhook endpoint, and its request handler"""
+    app = web.Application()
+    handler = LimitedRequestHandler(dp, bot, concurrency=concurrency, secret_token=secret_token)
+    handler.register(app, path=path)
+    # Emits the dispatcher's startup/shutdown events, like start_polling() does
+    setup_application(app, dp, bot=bot)
+    return app, handler
+
+
+async def run_webhook(dp, bot):
+    """Serve updates on WEBHOOK_HOST:WEBHOOK_PORT until cancelled, registering WEBHOOK_URL if set"""
+    secret_token = WEBHOOK_SECRET
+    if not secret_token:
+        if not WEBHOOK_URL:
+            raise RuntimeError("WEBHOOK_SECRET is required when the webhook is registered outside the bot")
+        # Only we and Telegram need to know it, a fresh one per run will do
+        secret_token = secrets.token_urlsafe(32)
+
+    app, handler = create_webhook_app(dp, bot, secret_token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook endpoint listening on http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH} "
+                f"(up to {handler.concurrency} updates at a time)")
+
+    try:
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                WEBHOOK_URL,
+                secret_token=secret_token,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=min(max(handler.concurrency, 1), 100)
+            )
+            logger.info(f"Webhook registered: {WEBHOOK_URL}")
+
+        # Serve until the task is cancelled (Ctrl+C)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        logger.info(f"Webhook stats: {handler.stats()}")
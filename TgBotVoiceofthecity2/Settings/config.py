@@ -4,3 +4,24 @@ ADMIN_TELEGRAM_IDS = [""]
 
 ADMIN_API_USERNAME = "admin"
 ADMIN_API_PASSWORD = "admin"
+
+# How the bot receives updates: "polling" (getUpdates) or "webhook" (Telegram POSTs them to us)
+UPDATES_MODE = "polling"
+
+# Webhook mode: public HTTPS URL of the endpoint as registered with Telegram, e.g.
+# "https://bot.example.com/webhook" (leave empty if the webhook is registered elsewhere)
+WEBHOOK_URL = ""
+# Local address and path the endpoint listens on (behind the HTTPS reverse proxy)
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8080
+WEBHOOK_PATH = "/webhook"
+# Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token, requests without it are rejected
+# (1-256 characters A-Z, a-z, 0-9, _ and -)
+WEBHOOK_SECRET = ""
+
+# Most updates processed at the same time (both modes), the rest wait their turn.
+# The bot's database connection pool is sized to match (at least 15 connections)
+UPDATES_CONCURRENCY = 32
+
+# Conversation states (registration, booking...) untouched for this many seconds are dropped
+FSM_STATE_TTL = 24 * 60 * 60
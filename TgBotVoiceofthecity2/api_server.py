@@ -13,6 +13,7 @@ from pathlib import Path
 from DataBase import database
 from utils.admin import format_bookings_data, format_users_data
 from utils.email_sender import send_verification_email, send_test_email
+from utils.send_scheduler import send_scheduler
 from Settings.config import ADMIN_API_USERNAME, ADMIN_API_PASSWORD
 
 # Get absolute path to database file
@@ -31,6 +32,14 @@ app = FastAPI(title="Voice of the City Admin API", description="Admin API for Vo
 # Mount static files directory
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+
+@app.middleware("http")
+async def unit_of_work_middleware(request: Request, call_next):
+    """Serve each request from one database session shared by all database.* calls"""
+    with database.unit_of_work():
+        return await call_next(request)
+
+
 # Initialize templates
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
@@ -66,17 +75,34 @@ async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+def page_urls(request: Request, page):
+    """Links to the previous and next page of a keyset-paginated list (None if there is none)"""
+    url = request.url.remove_query_params(["after", "before"])
+    return {
+        "prev_url": str(url.include_query_params(before=page['prev_cursor'])) if page['prev_cursor'] else None,
+        "next_url": str(url.include_query_params(after=page['next_cursor'])) if page['next_cursor'] else None
+    }
+
+
 @app.get("/users", response_class=HTMLResponse)
-async def get_users(request: Request, admin: str = Depends(get_current_admin)):
-    """Get all users as HTML table"""
-    users = database.get_all_users()
+async def get_users(
+        request: Request,
+        admin: str = Depends(get_current_admin),
+        after: Optional[str] = Query(None, description="ID пользователя, после которого начинается страница"),
+        before: Optional[str] = Query(None, description="ID пользователя, перед которым заканчивается страница"),
+        limit: int = Query(database.PAGE_SIZE, ge=1, le=200, description="Пользователей на странице")
+):
+    """Get one page of users (ordered by last name) as HTML table"""
+    page = database.get_users_page(after=after, before=before, limit=limit)
     roles = database.get_all_roles()
-    users_data = format_users_data(users)
+    users_data = format_users_data(page['items'])
 
     return templates.TemplateResponse("users.html", {
         "request": request,
         "users": users_data,
-        "roles": roles
+        "roles": roles,
+        "total_users": database.count_users(),
+        **page_urls(request, page)
     })
 
 
@@ -285,38 +311,39 @@ async def test_email(
 async def get_bookings(
         request: Request,
         admin: str = Depends(get_current_admin),
-        search: Optional[str] = Query(None, description="Поиск по названию точки")
+        search: Optional[str] = Query(None, description="Поиск по названию точки"),
+        after: Optional[str] = Query(None, description="ID бронирования, после которого начинается страница"),
+        before: Optional[str] = Query(None, description="ID бронирования, перед которым заканчивается страница"),
+        limit: int = Query(database.PAGE_SIZE, ge=1, le=200, description="Бронирований на странице")
 ):
-    """Get all locations with their bookings"""
+    """Get locations with one page of their bookings (ordered by date and time)"""
     # Get all locations first
     all_locations = database.get_all_locations()
 
-    # Apply search filter to locations if provided
+    # Apply search filter to locations if provided (full-text index)
     if search:
-        search_lower = search.lower()
-        filtered_locations = [
-            location for location in all_locations
-            if search_lower in location.get('address', '').lower()
-        ]
+        found_ids = {location['id'] for location in database.search_locations(search)}
+        filtered_locations = [location for location in all_locations if location['id'] in found_ids]
     else:
         filtered_locations = all_locations
 
-    # Get all bookings
-    all_bookings = database.get_all_bookings_with_users()
+    # Get one page of bookings of the shown locations
+    location_ids = [location['id'] for location in filtered_locations] if search else None
+    page = database.get_bookings_page(after=after, before=before, limit=limit, location_ids=location_ids)
 
     # Group bookings by location
     bookings_by_location = {}
-    for booking in all_bookings:
-        location_id = booking.get('location_id')
-        if location_id not in bookings_by_location:
-            bookings_by_location[location_id] = []
-        bookings_by_location[location_id].append(booking)
+    for booking in page['items']:
+        bookings_by_location.setdefault(booking['location_id'], []).append(booking)
 
-    # Create locations data with their bookings
+    # Locations with bookings on this page, plus the ones without any bookings on the first page
+    booked_location_ids = database.get_booked_location_ids()
     locations_data = []
     for location in filtered_locations:
         location_id = location['id']
         location_bookings = bookings_by_location.get(location_id, [])
+        if not location_bookings and (page['prev_cursor'] or location_id in booked_location_ids):
+            continue
 
         locations_data.append({
             'id': location_id,
@@ -325,8 +352,8 @@ async def get_bookings(
         })
 
     # Count total bookings for search results
-    total_bookings = sum(len(bookings_by_location.get(loc['id'], [])) for loc in all_locations)
-    filtered_bookings = sum(len(loc['bookings']) for loc in locations_data)
+    total_bookings = database.count_bookings()
+    filtered_bookings = database.count_bookings(location_ids) if search else total_bookings
 
     return templates.TemplateResponse("bookings.html", {
         "request": request,
@@ -335,10 +362,97 @@ async def get_bookings(
         "total_locations": len(all_locations),
         "filtered_locations": len(filtered_locations),
         "total_bookings": total_bookings,
-        "filtered_bookings": filtered_bookings
+        "filtered_bookings": filtered_bookings,
+        **page_urls(request, page)
     })
 
 
+@app.get("/api/free-slots")
+async def get_free_slots(
+        admin: str = Depends(get_current_admin),
+        date_from: str = Query(..., description="Начало периода (YYYY-MM-DD)"),
+        date_to: Optional[str] = Query(None, description="Конец периода (YYYY-MM-DD), по умолчанию date_from"),
+        duration: int = Query(1, ge=1, le=2, description="Продолжительность в часах"),
+        limit: int = Query(10, ge=1, le=100, description="Максимум вариантов")
+):
+    """Earliest free windows across all locations as JSON"""
+    try:
+        start = datetime.strptime(date_from, '%Y-%m-%d')
+        end = datetime.strptime(date_to, '%Y-%m-%d') if date_to else start
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+    if end < start:
+        raise HTTPException(status_code=400, detail="date_to is before date_from")
+    if (end - start).days > 62:
+        raise HTTPException(status_code=400, detail="Date range is limited to 62 days")
+
+    slots = database.find_free_slots(
+        start.date().isoformat(), end.date().isoformat(), duration, limit=limit, not_before=datetime.now()
+    )
+    return {"status": "success", "slots": slots}
+
+
+@app.get("/api/users")
+async def search_users(
+        admin: str = Depends(get_current_admin),
+        search: Optional[str] = Query(None, description="Поиск по имени, фамилии, отчеству, email и телефону"),
+        role: Optional[str] = Query(None, description="ID роли"),
+        email_verified: Optional[bool] = Query(None, description="Email подтвержден"),
+        phone_verified: Optional[bool] = Query(None, description="Телефон подтвержден"),
+        has_telegram: Optional[bool] = Query(None, description="Привязан Telegram"),
+        sort_by: str = Query("first_name", description="Поле сортировки"),
+        sort_order: str = Query("asc", pattern="^(asc|desc)$", description="Порядок сортировки"),
+        limit: int = Query(100, ge=1, le=1000, description="Максимум пользователей")
+):
+    """Users filtered and sorted in the database as JSON"""
+    users = database.get_filtered_users(
+        search, role, email_verified, phone_verified, has_telegram, sort_by, sort_order, limit
+    )
+    return {"status": "success", "users": users}
+
+
+@app.get("/api/bookings")
+async def search_bookings(
+        admin: str = Depends(get_current_admin),
+        search: Optional[str] = Query(None, description="Поиск по адресу точки и данным участника"),
+        location_id: Optional[str] = Query(None, description="ID точки"),
+        date_from: Optional[str] = Query(None, description="Начало периода (YYYY-MM-DD)"),
+        date_to: Optional[str] = Query(None, description="Конец периода (YYYY-MM-DD)"),
+        duration: Optional[int] = Query(None, ge=1, le=2, description="Продолжительность в часах"),
+        sort_by: str = Query("date", description="Поле сортировки"),
+        sort_order: str = Query("asc", pattern="^(asc|desc)$", description="Порядок сортировки"),
+        limit: int = Query(100, ge=1, le=1000, description="Максимум бронирований")
+):
+    """Bookings filtered and sorted in the database as JSON"""
+    bookings = database.get_filtered_bookings(
+        search, location_id, date_from, date_to, duration, sort_by, sort_order, limit
+    )
+    return {"status": "success", "bookings": bookings}
+
+
+@app.get("/api/stats")
+async def get_stats(admin: str = Depends(get_current_admin)):
+    """User and booking statistics, read from the incrementally maintained counters"""
+    return {"status": "success", "stats": database.get_stats()}
+
+
+@app.get("/api/cache-stats")
+async def get_cache_stats(admin: str = Depends(get_current_admin)):
+    """Counters of the in-process caches"""
+    return {
+        "status": "success",
+        "user_cache": database.get_user_cache_stats(),
+        "location_views": database.location_views.stats()
+    }
+
+
+@app.get("/api/send-stats")
+async def get_send_stats(admin: str = Depends(get_current_admin)):
+    """Queue depth, waiting times and flood-limit retries of the bot's outgoing messages"""
+    return {"status": "success", "send_scheduler": send_scheduler.stats()}
+
+
 @app.get("/locations/{location_id}/edit", response_class=HTMLResponse)
 async def edit_location_form(request: Request, location_id: str, admin: str = Depends(get_current_admin)):
     """Show form to edit a location"""
@@ -394,6 +508,13 @@ async def update_booking(
         admin: str = Depends(get_current_admin)
 ):
     """Update booking information"""
+    start_minute = database.time_to_minutes(time)
+    if start_minute is None or not database.on_slot_grid(start_minute, start_minute + duration_hours * 60):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Время должно быть в формате ЧЧ:ММ и кратно {database.SLOT_MINUTES} минутам"
+        )
+
     success = database.update_booking(
         booking_id=booking_id,
         date=date,
@@ -1,14 +1,24 @@
 import logging
+from html import escape
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 
-from utils.admin import is_admin, format_users_table
-from utils.keyboards import get_admin_cooldown_keyboard
-from DataBase import database
+from utils.admin import format_users_table
+from utils.formatters import MESSAGE_LIMIT, message_length, pack_html_blocks
+from utils.keyboards import get_admin_cooldown_keyboard, get_page_keyboard
+from utils.send_scheduler import bulk
+from DataBase import async_database
 
 logger = logging.getLogger(__name__)
 
+# Rows per page of the admin lists at most, a page is one message (see fit_page())
+USERS_PAGE_SIZE = 20
+BOOKINGS_PAGE_SIZE = 10
+
+# Results of each kind shown by /find
+FIND_LIMIT = 10
+
 
 def register_admin_handlers(dp):
     """Register admin handlers"""
@@ -16,36 +26,34 @@ def register_admin_handlers(dp):
 
     # Admin command to view all users
     @router.message(Command("users"))
-    async def cmd_users(message: Message):
+    async def cmd_users(message: Message, is_admin: bool):
         # Check if user is an admin
-        if not is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("❌ У вас нет доступа к этой команде.")
             return
 
         try:
-            # Get all users from database
-            users = database.get_all_users()
+            # Get the first page of users
+            page = fit_page(await async_database.get_users_page(limit=USERS_PAGE_SIZE), format_users_table)
 
-            # Format users as HTML table
-            users_table = format_users_table(users)
+            # Send it as HTML table with prev/next buttons
+            await show_page(message, page, "users_page")
 
-            # Send the table
-            await message.answer(users_table, parse_mode="HTML")
-
-            # Inform about the web interface
-            await message.answer(
-                "📊 Вы также можете просмотреть таблицу пользователей в веб-интерфейсе:\n"
-                "http://localhost:8000/users"
-            )
+            # Inform about the web interface (after any waiting replies to other users)
+            with bulk():
+                await message.answer(
+                    "📊 Вы также можете просмотреть таблицу пользователей в веб-интерфейсе:\n"
+                    "http://localhost:8000/users"
+                )
         except Exception as e:
             logger.error(f"Error in admin users command: {e}")
             await message.answer("❌ Произошла ошибка при получении списка пользователей.")
 
     # Admin command to promote a user to admin
     @router.message(Command("add_admin"))
-    async def cmd_add_admin(message: Message):
+    async def cmd_add_admin(message: Message, is_admin: bool):
         # Check if user is an admin
-        if not is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("❌ У вас нет доступа к этой команде.")
             return
 
@@ -59,13 +67,13 @@ def register_admin_handlers(dp):
 
         try:
             # Check if user exists
-            user = database.get_user_by_id(user_id)
+            user = await async_database.get_user_by_id(user_id)
             if not user:
                 await message.answer(f"❌ Пользователь с ID {user_id} не найден.")
                 return
 
             # Set user role to admin
-            success, msg = database.set_user_role(user_id, "admin")
+            success, msg = await async_database.set_user_role(user_id, "admin")
 
             if success:
                 await message.answer(f"✅ Пользователь {user['first_name']} {user['second_name']} теперь администратор.")
@@ -77,54 +85,108 @@ def register_admin_handlers(dp):
 
     # Admin command to view all bookings with registered users
     @router.message(Command("bookings_list"))
-    async def cmd_bookings_list(message: Message):
+    async def cmd_bookings_list(message: Message, is_admin: bool):
         # Check if user is an admin
-        if not is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("❌ У вас нет доступа к этой команде.")
             return
 
         try:
-            # Get all bookings
-            bookings = database.get_all_bookings_with_users()
+            # Get the first page of bookings
+            page = await async_database.get_bookings_page(limit=BOOKINGS_PAGE_SIZE)
 
-            if not bookings:
+            if not page['items']:
                 await message.answer("В настоящее время нет забронированных точек.")
                 return
 
-            # Send a message for each booking
-            for booking in bookings:
-                speaker = booking['speaker']  # Fixed: was 'musician', now 'speaker'
+            # Send the page as one message with prev/next buttons
+            page = fit_page(page, format_bookings_page)
+            await show_page(message, page, "bookings_page")
+
+            # Inform about the web interface (after any waiting replies to other users)
+            with bulk():
                 await message.answer(
-                    f"🔹 <b>ID:</b> {booking['id']}\n"
-                    f"📍 Место: {booking['location_address']}\n"
-                    f"📅 Дата: {booking['date']}\n"
-                    f"🕒 Время: {booking['time']}\n"
-                    f"⏱ Продолжительность: {booking['duration_hours']} час{'а' if booking['duration_hours'] == 2 else ''}\n"
-                    f"🎤 <b>Музыкант:</b> {speaker['first_name']} {speaker['second_name']}\n"
-                    f"📧 Email: {speaker['email']}\n"
-                    f"📱 Телефон: {speaker['phone']}\n"
-                    f"🆔 ID: {speaker['id']}",
-                    parse_mode="HTML"
+                    "📊 Вы также можете просмотреть подробную информацию о точках в веб-интерфейсе:\n"
+                    "http://localhost:8000/bookings"
                 )
-
-            # Inform about the web interface
-            await message.answer(
-                "📊 Вы также можете просмотреть подробную информацию о точках в веб-интерфейсе:\n"
-                "http://localhost:8000/bookings"
-            )
         except Exception as e:
             logger.error(f"Error in bookings_list command: {e}")
             await message.answer("❌ Произошла ошибка при получении списка точек.")
 
+    # Users list pagination: replace the page in place
+    @router.callback_query(F.data.startswith("users_page_"))
+    async def process_users_page(callback_query: CallbackQuery, is_admin: bool):
+        if not is_admin:
+            await callback_query.answer("❌ У вас нет доступа к этой функции.")
+            return
+
+        direction, cursor = callback_query.data[len("users_page_"):].split("_", 1)
+        if direction == "n":
+            page = await async_database.get_users_page(after=cursor, limit=USERS_PAGE_SIZE)
+        else:
+            page = await async_database.get_users_page(before=cursor, limit=USERS_PAGE_SIZE)
+        page = fit_page(page, format_users_table, backwards=direction == "p")
+
+        await show_page(callback_query.message, page, "users_page", edit=True)
+        await callback_query.answer()
+
+    # Bookings list pagination: replace the page in place
+    @router.callback_query(F.data.startswith("bookings_page_"))
+    async def process_bookings_page(callback_query: CallbackQuery, is_admin: bool):
+        if not is_admin:
+            await callback_query.answer("❌ У вас нет доступа к этой функции.")
+            return
+
+        direction, cursor = callback_query.data[len("bookings_page_"):].split("_", 1)
+        if direction == "n":
+            page = await async_database.get_bookings_page(after=cursor, limit=BOOKINGS_PAGE_SIZE)
+        else:
+            page = await async_database.get_bookings_page(before=cursor, limit=BOOKINGS_PAGE_SIZE)
+
+        if not page['items']:
+            await callback_query.answer("В настоящее время нет забронированных точек.", show_alert=True)
+            return
+        page = fit_page(page, format_bookings_page, backwards=direction == "p")
+
+        await show_page(callback_query.message, page, "bookings_page", edit=True)
+        await callback_query.answer()
+
+    # Admin command to search users and locations
+    @router.message(Command("find"))
+    async def cmd_find(message: Message, is_admin: bool):
+        # Check if user is an admin
+        if not is_admin:
+            await message.answer("❌ У вас нет доступа к этой команде.")
+            return
+
+        args = message.text.split(maxsplit=1)
+        if len(args) != 2 or not args[1].strip():
+            await message.answer("❌ Неверный формат команды. Используйте: /find <имя, email, телефон или адрес>")
+            return
+
+        query = args[1].strip()
+        try:
+            users = await async_database.search_users(query, limit=FIND_LIMIT)
+            locations = await async_database.search_locations(query, limit=FIND_LIMIT)
+            # Many long results may take several messages, the ones after the first go as bulk output
+            first, *rest = pack_html_blocks([format_find_results(query, users, locations)])
+            await message.answer(first, parse_mode="HTML")
+            with bulk():
+                for text in rest:
+                    await message.answer(text, parse_mode="HTML")
+        except Exception as e:
+            logger.error(f"Error in find command: {e}")
+            await message.answer("❌ Произошла ошибка при поиске.")
+
     # Admin command to change cooldown duration
     @router.message(Command("set_cooldown"))
-    async def cmd_set_cooldown(message: Message):
+    async def cmd_set_cooldown(message: Message, is_admin: bool):
         # Check if user is an admin
-        if not is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("❌ У вас нет доступа к этой команде.")
             return
 
-        current_cooldown = database.get_cooldown_days()
+        current_cooldown = await async_database.get_cooldown_days()
         await message.answer(
             f"Текущий период ожидания: {current_cooldown} дней\n\n"
             "Выберите новый период ожидания:",
@@ -133,15 +195,15 @@ def register_admin_handlers(dp):
 
     # Cooldown setting callbacks
     @router.callback_query(F.data.startswith("cooldown_"))
-    async def process_cooldown_setting(callback_query: CallbackQuery):
+    async def process_cooldown_setting(callback_query: CallbackQuery, is_admin: bool):
         # Check if user is an admin
-        if not is_admin(callback_query.from_user.id):
+        if not is_admin:
             await callback_query.answer("❌ У вас нет доступа к этой функции.")
             return
 
         days = int(callback_query.data.split("_")[1])
 
-        success = database.set_cooldown_days(days)
+        success = await async_database.set_cooldown_days(days)
         if success:
             await callback_query.message.answer(
                 f"✅ Период ожидания изменен на {days} дней"
@@ -160,18 +222,19 @@ def register_admin_handlers(dp):
 
     # Admin help command
     @router.message(Command(commands=["admin_help"]))
-    async def cmd_admin_help(message: Message):
+    async def cmd_admin_help(message: Message, is_admin: bool):
         # Check if user is an admin
-        if not is_admin(message.from_user.id):
+        if not is_admin:
             await message.answer("❌ У вас нет доступа к этой команде.")
             return
 
-        current_cooldown = database.get_cooldown_days()
+        current_cooldown = await async_database.get_cooldown_days()
         await message.answer(
             "📋 <b>Команды администратора:</b>\n\n"
             "/users - Просмотреть список всех пользователей\n"
             "/add_admin ID - Назначить пользователя администратором\n"
             "/bookings_list - Просмотреть все точки и зарегистрированных участников\n"
+            "/find текст - Найти пользователей и точки по имени, email, телефону или адресу\n"
             "/set_cooldown - Изменить период ожидания (сейчас: " + str(current_cooldown) + " дней)\n"
             "/admin_help - Показать эту справку\n\n"
             "📊 <b>Веб-интерфейс администратора:</b>\n"
@@ -182,3 +245,85 @@ def register_admin_handlers(dp):
 
     # Add the router to the dispatcher
     dp.include_router(router)
+
+
+def fit_page(page, render, backwards=False):
+    """
+    Render a page of a paginated list as one message, dropping rows from its end (from its
+    start when paging backwards) while it doesn't fit. The cursor on that side moves with
+    them, so the dropped rows open the adjacent page. The messages are added as page['texts']:
+    just one, unless a single row is too long for a message.
+    """
+    items = page['items']
+    while len(items) > 1 and message_length(render(items)) > MESSAGE_LIMIT:
+        items = items[1:] if backwards else items[:-1]
+
+    trimmed = len(items) < len(page['items'])
+    page = {**page, 'items': items}
+    if trimmed:
+        if backwards:
+            page['prev_cursor'] = items[0]['id']
+        else:
+            page['next_cursor'] = items[-1]['id']
+
+    # A single row too long for a message is split over several, see pack_html_blocks()
+    page['texts'] = pack_html_blocks([render(items)])
+    return page
+
+
+async def show_page(message, page, prefix, edit=False):
+    """
+    Show a page made by fit_page() with its prev/next buttons, as a new message or edited
+    into message. Parts of an overlong row after the first follow as bulk messages.
+    """
+    first, *rest = page['texts']
+    keyboard = get_page_keyboard(prefix, page['prev_cursor'], page['next_cursor'])
+    if edit:
+        await message.edit_text(first, parse_mode="HTML", reply_markup=keyboard)
+    else:
+        await message.answer(first, parse_mode="HTML", reply_markup=keyboard)
+
+    with bulk():
+        for text in rest:
+            await message.answer(text, parse_mode="HTML")
+
+
+def format_bookings_page(bookings):
+    """Format a page of bookings with their speakers as one HTML message"""
+    blocks = []
+    for booking in bookings:
+        speaker = booking['speaker']
+        blocks.append(
+            f"🔹 <b>ID:</b> {booking['id']}\n"
+            f"📍 Место: {booking['location_address']}\n"
+            f"📅 Дата: {booking['date']}\n"
+            f"🕒 Время: {booking['time']}\n"
+            f"⏱ Продолжительность: {booking['duration_hours']} час{'а' if booking['duration_hours'] == 2 else ''}\n"
+            f"🎤 <b>Музыкант:</b> {speaker['first_name']} {speaker['second_name']}\n"
+            f"📧 Email: {speaker['email']}\n"
+            f"📱 Телефон: {speaker['phone']}\n"
+            f"🆔 ID: {speaker['id']}"
+        )
+    return "\n\n".join(blocks)
+
+
+def format_find_results(query, users, locations):
+    """Format /find results as HTML (split into messages by pack_html_blocks())"""
+    if not users and not locations:
+        return f"🔍 По запросу «{escape(query)}» ничего не найдено."
+
+    text = f"🔍 <b>Результаты поиска «{escape(query)}»</b>\n"
+    if users:
+        text += "\n<b>Пользователи:</b>\n"
+        for user in users:
+            verified_status = "✅" if user.get('verified') else "❌"
+            text += (
+                f"{verified_status} {escape(user['second_name'])} {escape(user['first_name'])} — "
+                f"{escape(user['email'])}, {escape(user['phone'])}\n"
+                f"🆔 <code>{user['id']}</code>\n"
+            )
+    if locations:
+        text += "\n<b>Точки:</b>\n"
+        for location in locations:
+            text += f"📍 {escape(location['address'])}\n🆔 <code>{location['id']}</code>\n"
+    return text
@@ -4,6 +4,7 @@ import hashlib
 import logging
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 import os
 
 from aiogram import Router, F
@@ -18,8 +19,7 @@ from utils.validators import (
     validate_name, validate_patronymic,
     validate_email, validate_phone, validate_password
 )
-from utils.user import get_user_from_message
-from DataBase import database
+from DataBase import async_database
 
 logger = logging.getLogger(__name__)
 
@@ -34,9 +34,8 @@ def register_auth_handlers(dp):
 
     # Login command handler
     @router.message(Command("login"))
-    async def cmd_login(message: Message, state: FSMContext):
+    async def cmd_login(message: Message, state: FSMContext, user: Optional[dict]):
         # Check if user is already logged in
-        user = get_user_from_message(message)
         if user:
             await message.answer(
                 "Вы уже вошли в систему.\n"
@@ -53,9 +52,8 @@ def register_auth_handlers(dp):
 
     # Logout command handler
     @router.message(Command("logout"))
-    async def cmd_logout(message: Message):
+    async def cmd_logout(message: Message, user: Optional[dict]):
         # Check if user is logged in
-        user = get_user_from_message(message)
         if not user:
             await message.answer(
                 "Вы не вошли в систему.\n"
@@ -64,7 +62,7 @@ def register_auth_handlers(dp):
             return
 
         # Save Telegram ID instead of removing it
-        success = database.remove_user_telegram_id(user['id'])
+        success = await async_database.remove_user_telegram_id(user['id'])
 
         if success:
             await message.answer(
@@ -79,9 +77,8 @@ def register_auth_handlers(dp):
 
     # Register command handler
     @router.message(Command("register"))
-    async def cmd_register(message: Message, state: FSMContext):
+    async def cmd_register(message: Message, state: FSMContext, user: Optional[dict]):
         # Check if user is already registered
-        user = get_user_from_message(message)
         if user:
             await message.answer(
                 "Команда /login, что бы войти в систему")
@@ -145,9 +142,9 @@ def register_auth_handlers(dp):
         # Try to find the user
         user = None
         if is_email:
-            user = database.get_user_by_email(identifier)
+            user = await async_database.get_user_by_email(identifier)
         else:
-            user = database.get_user_by_phone(identifier)
+            user = await async_database.get_user_by_phone(identifier)
 
         if not user or user['hash_password'] != hash_password:
             await message.answer(
@@ -157,7 +154,7 @@ def register_auth_handlers(dp):
 
         # Update the user's Telegram ID to link the account
         try:
-            database.update_user_telegram_id(user['id'], str(message.from_user.id))
+            await async_database.update_user_telegram_id(user['id'], str(message.from_user.id))
         except Exception as e:
             logger.error(f"Error updating Telegram ID: {e}")
             await message.answer("❌ Произошла ошибка при входе в систему. Пожалуйста, попробуйте позже.")
@@ -231,7 +228,7 @@ def register_auth_handlers(dp):
         logger.info(f"Checking email: {email}")
 
         # Check if email already exists
-        existing_user = database.get_user_by_email(email)
+        existing_user = await async_database.get_user_by_email(email)
         if existing_user:
             logger.info(f"Email {email} already exists for user: {existing_user}")
             await message.answer("❌ Пользователь с таким email уже зарегистрирован. Введите другой email:")
@@ -271,7 +268,7 @@ def register_auth_handlers(dp):
         logger.info(f"Checking phone: {phone_number}")
 
         # Check if phone already exists
-        existing_user = database.get_user_by_phone(phone_number)
+        existing_user = await async_database.get_user_by_phone(phone_number)
         if existing_user:
             logger.info(f"Phone {phone_number} already exists for user: {existing_user}")
             await message.answer(
@@ -318,7 +315,7 @@ def register_auth_handlers(dp):
         logger.info(f"Checking manual phone: {phone}")
 
         # Check if phone already exists
-        existing_user = database.get_user_by_phone(phone)
+        existing_user = await async_database.get_user_by_phone(phone)
         if existing_user:
             logger.info(f"Phone {phone} already exists for user: {existing_user}")
             await message.answer("❌ Пользователь с таким номером телефона уже зарегистрирован. Введите другой номер:")
@@ -477,7 +474,7 @@ def register_auth_handlers(dp):
             'artist_form_filled': True
         }
 
-        user_id = database.add_user(user_data)
+        user_id = await async_database.add_user(user_data)
 
         if user_id:
             await message.answer(
@@ -494,14 +491,13 @@ def register_auth_handlers(dp):
         await state.clear()
 
     @router.message(Command("confirm_form"))
-    async def confirm_artist_form(message: Message):
-        user = get_user_from_message(message)
+    async def confirm_artist_form(message: Message, user: Optional[dict]):
         if not user:
             await message.answer("Для подтверждения необходимо войти в систему.")
             return
 
         # Обновляем статус заполнения анкеты
-        if database.update_user_artist_form_status(user['id'], True):
+        if await async_database.update_user_artist_form_status(user['id'], True):
             await message.answer(
                 "✅ Спасибо за заполнение анкеты! Теперь вы можете бронировать точки."
             )
@@ -512,15 +508,13 @@ def register_auth_handlers(dp):
 
     # Callback for logout from profile
     @router.callback_query(F.data == "logout")
-    async def process_logout_callback(callback_query: CallbackQuery):
-        user = get_user_from_callback(callback_query)
-
+    async def process_logout_callback(callback_query: CallbackQuery, user: Optional[dict]):
         if not user:
             await callback_query.answer("Вы не вошли в систему")
             return
 
         # Remove Telegram ID without saving it
-        success = database.remove_user_telegram_id(user['id'])
+        success = await async_database.remove_user_telegram_id(user['id'])
 
         if success:
             await callback_query.message.answer(
@@ -549,12 +543,3 @@ def register_auth_handlers(dp):
 
     # Add the router to the dispatcher
     dp.include_router(router)
-
-
-def get_user_from_callback(callback_query):
-    """Get user from database by Telegram ID from callback query"""
-    if not callback_query.from_user:
-        return None
-
-    telegram_id = str(callback_query.from_user.id)
-    return database.get_user_by_telegram_id(telegram_id)
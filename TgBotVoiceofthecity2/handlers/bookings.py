@@ -3,26 +3,42 @@ from datetime import datetime, timedelta
 import re
 import os
 from pathlib import Path
+from typing import Optional
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
 
 from states.booking import BookingForm
 from utils.keyboards import (
-    get_main_keyboard, get_login_register_keyboard, get_start_booking_keyboard,
-    get_locations_keyboard, get_booking_confirmation_keyboard, get_user_booking_keyboard,
-    get_schedule_keyboard
+    get_main_keyboard, get_login_register_keyboard,
+    get_locations_keyboard, get_booking_confirmation_keyboard, get_schedule_keyboard,
+    get_locations_page_keyboard, get_schedule_browse_keyboard, get_my_bookings_keyboard
 )
-from utils.user import get_user_from_message
-from DataBase import database
+from DataBase import async_database
+from DataBase.async_database import location_views
+from DataBase.cache import MISSING
+from utils.formatters import MESSAGE_LIMIT, split_html_blocks, paginate_html_blocks
 
 logger = logging.getLogger(__name__)
 
 # Путь к директории с документами
 DOCS_DIR = Path(__file__).parent.parent / "docs"
 
+# How many upcoming bookings of every location the 📋 Точки view lists
+UPCOMING_BOOKINGS_PER_LOCATION = 30
+
+# Bookings per page of 📅 Мои бронирования
+MY_BOOKINGS_PAGE_SIZE = 5
+
+# How many days ahead the schedule can be browsed (bookings are accepted up to 30 days ahead)
+SCHEDULE_DAYS_AHEAD = 30
+
+# Room left in a page message for its header and footer
+PAGE_TEXT_RESERVE = 300
+
 
 def register_booking_handlers(dp):
     """Register booking handlers"""
@@ -30,29 +46,27 @@ def register_booking_handlers(dp):
 
     # View available bookings
     @router.message(Command("bookings"))
-    async def cmd_bookings(message: Message):
-        await show_bookings(message)
+    async def cmd_bookings(message: Message, user: Optional[dict]):
+        await show_bookings(message, user)
 
     # Bookings button handler
     @router.message(F.text == "📋 Точки")
-    async def button_bookings(message: Message):
-        await show_bookings(message)
+    async def button_bookings(message: Message, user: Optional[dict]):
+        await show_bookings(message, user)
 
     # View my bookings
     @router.message(Command("mybookings"))
-    async def cmd_my_bookings(message: Message):
-        await show_my_bookings(message)
+    async def cmd_my_bookings(message: Message, user: Optional[dict]):
+        await show_my_bookings(message, user)
 
     # My bookings button handler
     @router.message(F.text == "📅 Мои бронирования")
-    async def button_my_bookings(message: Message):
-        await show_my_bookings(message)
+    async def button_my_bookings(message: Message, user: Optional[dict]):
+        await show_my_bookings(message, user)
 
     # Start booking process
     @router.callback_query(F.data == "start_booking")
-    async def process_start_booking(callback_query: CallbackQuery, state: FSMContext):
-        user = get_user_from_callback(callback_query)
-
+    async def process_start_booking(callback_query: CallbackQuery, state: FSMContext, user: Optional[dict]):
         if not user:
             await callback_query.answer("Для бронирования необходимо войти в систему.")
             return
@@ -67,7 +81,7 @@ def register_booking_handlers(dp):
             return
 
         # Check if user is in cooldown
-        is_in_cooldown, cooldown_date = database.check_user_cooldown(user['id'])
+        is_in_cooldown, cooldown_date = await async_database.check_user_cooldown(user['id'])
         if is_in_cooldown:
             await callback_query.answer(
                 f"Вы не можете бронировать точки до {cooldown_date.strftime('%d.%m.%Y %H:%M')}",
@@ -76,7 +90,7 @@ def register_booking_handlers(dp):
             return
 
         # Get all locations
-        locations = database.get_all_locations()
+        locations = await async_database.get_all_locations()
         if not locations:
             await callback_query.message.answer("В настоящее время нет доступных точек.")
             return
@@ -96,7 +110,7 @@ def register_booking_handlers(dp):
         await state.update_data(location_id=location_id)
         await state.set_state(BookingForm.time_input)
 
-        location = database.get_location_by_id(location_id)
+        location = await async_database.get_location_by_id(location_id)
         await callback_query.message.answer(
             f"Место: {location['address']}\n\n"
             "Введите дату и время в формате: ДД.ММ.ГГГГ ЧЧ:ММ\n"
@@ -169,8 +183,8 @@ def register_booking_handlers(dp):
             location_id = data['location_id']
             date = booking_datetime.date().isoformat()
 
-            schedule = database.get_location_schedule(location_id, date)
-            schedule_text = database.format_schedule_visualization(schedule)
+            schedule = await async_database.get_location_schedule(location_id, date)
+            schedule_text = async_database.format_schedule_visualization(schedule)
 
             await message.answer(schedule_text)
 
@@ -196,9 +210,9 @@ def register_booking_handlers(dp):
 
         # Get booking details for confirmation
         data = await state.get_data()
-        location = database.get_location_by_id(data['location_id'])
+        location = await async_database.get_location_by_id(data['location_id'])
 
-        cooldown_days = database.get_cooldown_days()
+        cooldown_days = await async_database.get_cooldown_days()
         booking_date = datetime.fromisoformat(data['booking_date'])
         cooldown_end = booking_date + timedelta(days=cooldown_days)
 
@@ -231,9 +245,9 @@ def register_booking_handlers(dp):
 
             # Get booking details for confirmation
             data = await state.get_data()
-            location = database.get_location_by_id(data['location_id'])
+            location = await async_database.get_location_by_id(data['location_id'])
 
-            cooldown_days = database.get_cooldown_days()
+            cooldown_days = await async_database.get_cooldown_days()
             booking_date = datetime.fromisoformat(data['booking_date'])
             cooldown_end = booking_date + timedelta(days=cooldown_days)
 
@@ -260,9 +274,10 @@ def register_booking_handlers(dp):
         booking_date = data.get('booking_date')
 
         if location_id and booking_date:
-            schedule = database.get_location_schedule(location_id, booking_date)
-            schedule_text = database.format_schedule_visualization(schedule)
-            await callback_query.message.answer(schedule_text)
+            # Sent once, then browsed day by day in place
+            day = (datetime.fromisoformat(booking_date).date() - datetime.now().date()).days
+            text, keyboard = await render_schedule_page(location_id, day)
+            await callback_query.message.answer(text, reply_markup=keyboard)
         else:
             await callback_query.message.answer("❌ Сначала выберите дату и место.")
 
@@ -270,8 +285,7 @@ def register_booking_handlers(dp):
 
     # Booking confirmation
     @router.callback_query(F.data == "confirm_booking")
-    async def process_booking_confirmation(callback_query: CallbackQuery, state: FSMContext):
-        user = get_user_from_callback(callback_query)
+    async def process_booking_confirmation(callback_query: CallbackQuery, state: FSMContext, user: Optional[dict]):
         if not user:
             await callback_query.answer("Для бронирования необходимо войти в систему.")
             return
@@ -279,7 +293,7 @@ def register_booking_handlers(dp):
         data = await state.get_data()
         
         # Создаем бронирование
-        booking_id = database.create_booking(
+        success, result_message = await async_database.create_booking(
             user_id=user['id'],
             location_id=data['location_id'],
             date=data['booking_date'],
@@ -287,8 +301,8 @@ def register_booking_handlers(dp):
             duration_hours=data['duration_hours']
         )
 
-        if booking_id:
-            location = database.get_location_by_id(data['location_id'])
+        if success:
+            location = await async_database.get_location_by_id(data['location_id'])
             booking_date = datetime.fromisoformat(data['booking_date'])
             
             await callback_query.message.answer(
@@ -305,9 +319,7 @@ def register_booking_handlers(dp):
             )
             await state.clear()
         else:
-            await callback_query.message.answer(
-                "❌ Произошла ошибка при создании бронирования. Пожалуйста, попробуйте позже."
-            )
+            await callback_query.message.answer(f"❌ {result_message}")
         await callback_query.answer()
 
     # Cancel booking process
@@ -317,32 +329,62 @@ def register_booking_handlers(dp):
         await callback_query.message.answer("❌ Бронирование отменено.")
         await callback_query.answer()
 
-    # Cancel existing booking
+    # Cancel existing booking, then refresh the bookings page in place
     @router.callback_query(F.data.startswith("cancel_booking_"))
-    async def cancel_existing_booking(callback_query: CallbackQuery):
-        booking_id = callback_query.data.split("_")[2]
-        user = get_user_from_callback(callback_query)
+    async def cancel_existing_booking(callback_query: CallbackQuery, user: Optional[dict]):
+        # cancel_booking_<id>[_<page>], buttons of older messages carry no page
+        booking_id, *page = callback_query.data[len("cancel_booking_"):].split("_")
 
         if not user:
             await callback_query.answer("Для отмены бронирования необходимо войти в систему.")
             return
 
-        success, message_text = database.cancel_booking(booking_id, user['id'])
-        await callback_query.message.answer(f"✅ {message_text}" if success else f"❌ {message_text}")
+        success, message_text = await async_database.cancel_booking(booking_id, user['id'])
 
         if success:
-            await show_my_bookings(callback_query.message)
+            text, keyboard = await render_my_bookings_page(user, int(page[0]) if page else 0)
+            await edit_page(callback_query.message, text, keyboard)
+
+        await callback_query.answer(f"✅ {message_text}" if success else f"❌ {message_text}", show_alert=not success)
+
+    # Locations view pages
+    @router.callback_query(F.data.startswith("locations_page_"))
+    async def process_locations_page(callback_query: CallbackQuery, user: Optional[dict]):
+        if not user:
+            await callback_query.answer("Для просмотра точек необходимо войти в систему.")
+            return
 
+        text, keyboard = await render_locations_page(user, int(callback_query.data[len("locations_page_"):]))
+        await edit_page(callback_query.message, text, keyboard, parse_mode="HTML")
+        await callback_query.answer()
+
+    # Schedule of a location, day by day
+    @router.callback_query(F.data.startswith("schedule_"))
+    async def process_schedule_page(callback_query: CallbackQuery):
+        # schedule_<location_id>_<day>[_<locations page>]
+        location_id, day, *page = callback_query.data[len("schedule_"):].split("_")
+
+        text, keyboard = await render_schedule_page(location_id, int(day), int(page[0]) if page else None)
+        await edit_page(callback_query.message, text, keyboard)
+        await callback_query.answer()
+
+    # My bookings pages
+    @router.callback_query(F.data.startswith("my_bookings_page_"))
+    async def process_my_bookings_page(callback_query: CallbackQuery, user: Optional[dict]):
+        if not user:
+            await callback_query.answer("Для просмотра бронирований необходимо войти в систему.")
+            return
+
+        text, keyboard = await render_my_bookings_page(user, int(callback_query.data[len("my_bookings_page_"):]))
+        await edit_page(callback_query.message, text, keyboard)
         await callback_query.answer()
 
     # Add the router to the dispatcher
     dp.include_router(router)
 
 
-async def show_bookings(message):
+async def show_bookings(message, user):
     """Show available bookings with location details and booking tables"""
-    user = get_user_from_message(message)
-
     if not user:
         await message.answer(
             "❌ Для просмотра и бронирования точек необходимо войти в систему.\n"
@@ -351,89 +393,150 @@ async def show_bookings(message):
         )
         return
 
-    # Check if user is in cooldown
-    is_in_cooldown, cooldown_date = database.check_user_cooldown(user['id'])
+    # First page of the locations, browsed in place with the buttons below it
+    text, keyboard = await render_locations_page(user, 0)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+async def edit_page(message, text, keyboard, **kwargs):
+    """Replace a browsed message with another page (nothing to do if it's the same)"""
+    try:
+        await message.edit_text(text, reply_markup=keyboard, **kwargs)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
 
+
+async def render_locations_page(user, page):
+    """Text and keyboard of a page of the 📋 Точки view, as many whole locations as fit in a message"""
+    locations = await async_database.get_all_locations()
+    if not locations:
+        return "В настоящее время нет доступных точек.", None
+
+    # Check if user is in cooldown
+    is_in_cooldown, cooldown_date = await async_database.check_user_cooldown(user['id'])
+    header = ""
     if is_in_cooldown:
-        await message.answer(
-            f"⏳ Вы не можете бронировать точки до {cooldown_date.strftime('%d.%m.%Y %H:%M')}\n\n"
-            "Вы можете просмотреть доступные точки, но не можете их забронировать."
+        header = (
+            f"⏳ Вы не можете бронировать точки до {cooldown_date.strftime('%d.%m.%Y %H:%M')}\n"
+            "Вы можете просмотреть доступные точки, но не можете их забронировать.\n\n"
         )
 
-    # Get all locations
-    locations = database.get_all_locations()
-    if not locations:
-        await message.answer("В настоящее время нет доступных точек.")
-        return
+    # Each location with its bookings, a table too long for one message goes on over several pages
+    texts = await get_location_texts(locations)
+    pieces, owners = split_html_blocks(texts, MESSAGE_LIMIT - PAGE_TEXT_RESERVE)
+    pages = paginate_html_blocks(pieces, MESSAGE_LIMIT - PAGE_TEXT_RESERVE)
+    page = min(max(page, 0), len(pages) - 1)
+    start, end = pages[page]
+
+    text = header + "\n\n".join(pieces[start:end])
+    if len(pages) > 1:
+        text += f"\n\n<i>Страница {page + 1} из {len(pages)}</i>"
+
+    page_locations = [locations[index] for index in sorted(set(owners[start:end]))]
+    return text, get_locations_page_keyboard(page_locations, page, len(pages), not is_in_cooldown)
+
+
+async def render_schedule_page(location_id, day, page=None):
+    """Text and keyboard of a location's schedule day days from today (page: locations view to go back to)"""
+    location = await async_database.get_location_by_id(location_id)
+    if not location:
+        return "❌ Точка не найдена.", None
+
+    day = min(max(day, 0), SCHEDULE_DAYS_AHEAD)
+    date = datetime.now().date() + timedelta(days=day)
+    schedule = await async_database.get_location_schedule(location_id, date.isoformat())
+
+    text = (
+        f"📍 {location['address']}\n"
+        f"🗓 {date.strftime('%d.%m.%Y')}\n\n"
+        + async_database.format_schedule_visualization(schedule)
+    )
+    return text, get_schedule_browse_keyboard(location_id, day, SCHEDULE_DAYS_AHEAD, page)
+
+
+async def get_location_texts(locations):
+    """
+    Texts of the 📋 Точки view for the given locations, from the location_views read model.
+    Only locations missing from it (their bookings changed, or the day did) are loaded,
+    with one query, and rendered.
+    """
+    today = datetime.now().date().isoformat()
+    # Read before loading, so tables rendered from data that changed meanwhile aren't stored
+    generation = location_views.generation
+
+    texts = {}
+    for location in locations:
+        cached = location_views.get(location['id'])
+        if cached is not MISSING and cached[0] == today:
+            texts[location['id']] = cached[1]
+
+    missing = [location for location in locations if location['id'] not in texts]
+    if missing:
+        # Upcoming bookings with user details, already sorted by date and time.
+        # One extra per location tells whether there are more than we show
+        upcoming_bookings = await async_database.get_upcoming_bookings_with_users(
+            per_location=UPCOMING_BOOKINGS_PER_LOCATION + 1, today=today,
+            location_ids=[location['id'] for location in missing]
+        )
 
-    # Get all bookings with user details
-    all_bookings = database.get_all_bookings_with_users()
+        # Group bookings by location
+        bookings_by_location = {}
+        for booking in upcoming_bookings:
+            bookings_by_location.setdefault(booking['location_id'], []).append(booking)
 
-    # Group bookings by location
-    bookings_by_location = {}
-    for booking in all_bookings:
-        location_id = booking.get('location_id')
-        if location_id not in bookings_by_location:
-            bookings_by_location[location_id] = []
-        bookings_by_location[location_id].append(booking)
+        for location in missing:
+            text = format_location_bookings(location, bookings_by_location.get(location['id'], []))
+            location_views.set(location['id'], (today, text), generation=generation)
+            texts[location['id']] = text
 
-    # Display each location with its bookings
-    for location in locations:
-        location_id = location['id']
-        location_bookings = bookings_by_location.get(location_id, [])
-
-        # Format location header
-        location_text = f"📍 <b>Адрес:</b> {location['address']}\n\n"
-
-        if location_bookings:
-            # Create table header
-            location_text += "<b>Забронированные времена:</b>\n"
-            location_text += "<pre>"
-            location_text += f"{'Время':<12} | {'ФИО':<25}\n"
-            location_text += "-" * 30 + "\n"
-
-            # Sort bookings by date and time
-            location_bookings.sort(key=lambda x: (x.get('date', ''), x.get('time', '')))
-
-            # Add booking rows
-            for booking in location_bookings:
-                # Format date and time
-                try:
-                    booking_date = datetime.fromisoformat(booking['date']).strftime('%d.%m')
-                    time_str = f"{booking_date} {booking['time']}"
-                except:
-                    time_str = f"{booking.get('date', 'N/A')} {booking.get('time', 'N/A')}"
-
-                # Get user info
-                speaker = booking.get('speaker', {})
-                full_name = f"{speaker.get('first_name', '')} {speaker.get('second_name', '')}".strip()
-                if not full_name:
-                    full_name = "Не указано"
-
-                # Truncate long names and phones for table formatting
-                if len(full_name) > 25:
-                    full_name = full_name[:22] + "..."
-
-                location_text += f"{time_str:<12} | {full_name:<25}\n"
-
-            location_text += "</pre>"
-        else:
-            location_text += "📅 <i>Нет забронированных времен</i>"
+    return [texts[location['id']] for location in locations]
 
-        await message.answer(location_text, parse_mode="HTML")
 
-    # Show booking button if user is not in cooldown
-    if not is_in_cooldown:
-        await message.answer(
-            "Для бронирования точки нажмите кнопку ниже:",
-            reply_markup=get_start_booking_keyboard()
-        )
+def format_location_bookings(location, location_bookings):
+    """Address of a location and the table of its upcoming bookings"""
+    # Format location header
+    location_text = f"📍 <b>Адрес:</b> {location['address']}\n\n"
 
+    if location_bookings:
+        # Create table header
+        location_text += "<b>Забронированные времена:</b>\n"
+        location_text += "<pre>"
+        location_text += f"{'Время':<12} | {'ФИО':<25}\n"
+        location_text += "-" * 30 + "\n"
 
-async def show_my_bookings(message):
-    """Show user's bookings"""
-    user = get_user_from_message(message)
+        # Add booking rows
+        for booking in location_bookings[:UPCOMING_BOOKINGS_PER_LOCATION]:
+            # Format date and time
+            try:
+                booking_date = datetime.fromisoformat(booking['date']).strftime('%d.%m')
+                time_str = f"{booking_date} {booking['time']}"
+            except:
+                time_str = f"{booking.get('date', 'N/A')} {booking.get('time', 'N/A')}"
+
+            # Get user info
+            speaker = booking.get('speaker', {})
+            full_name = f"{speaker.get('first_name', '')} {speaker.get('second_name', '')}".strip()
+            if not full_name:
+                full_name = "Не указано"
+
+            # Truncate long names and phones for table formatting
+            if len(full_name) > 25:
+                full_name = full_name[:22] + "..."
+
+            location_text += f"{time_str:<12} | {full_name:<25}\n"
+
+        location_text += "</pre>"
+        if len(location_bookings) > UPCOMING_BOOKINGS_PER_LOCATION:
+            location_text += f"\n<i>Показаны ближайшие {UPCOMING_BOOKINGS_PER_LOCATION} бронирований</i>"
+    else:
+        location_text += "📅 <i>Нет забронированных времен</i>"
 
+    return location_text
+
+
+async def show_my_bookings(message, user):
+    """Show user's bookings"""
     if not user:
         await message.answer(
             "❌ Для просмотра ваших бронирований необходимо войти в систему.\n"
@@ -442,28 +545,25 @@ async def show_my_bookings(message):
         )
         return
 
-    # Debug the database tables
-    database.debug_database_tables()
+    # First page of the bookings, browsed in place with the buttons below it
+    text, keyboard = await render_my_bookings_page(user, 0)
+    await message.answer(text, reply_markup=keyboard)
 
-    # Get user bookings
-    bookings = database.get_user_bookings(user['id'])
 
-    # Log the bookings for debugging
-    logger.info(f"User {user['id']} has {len(bookings)} bookings")
-    for i, booking in enumerate(bookings):
-        logger.info(f"Booking {i + 1}: {booking}")
+async def render_my_bookings_page(user, page):
+    """Text and keyboard of a page of the user's bookings, with a cancel button for each"""
+    bookings = await async_database.get_user_bookings(user['id'])
+    logger.debug(f"User {user['id']} has {len(bookings)} bookings")
 
     if not bookings:
-        await message.answer("У вас пока нет забронированных точек.")
-        return
+        return "У вас пока нет забронированных точек.", None
 
     # Check if user is in cooldown
-    is_in_cooldown, cooldown_date = database.check_user_cooldown(user['id'])
+    is_in_cooldown, cooldown_date = await async_database.check_user_cooldown(user['id'])
     cooldown_info = f"\n⏳ Вы не можете бронировать до: {cooldown_date.strftime('%d.%m.%Y')}" if is_in_cooldown else ""
 
-    await message.answer(f"📅 Ваши забронированные точки:{cooldown_info}")
-
-    for booking in bookings:
+    blocks = []
+    for number, booking in enumerate(bookings, 1):
         # Parse the date for better formatting
         try:
             booking_date = datetime.fromisoformat(booking['date']).strftime('%d.%m.%Y')
@@ -476,20 +576,25 @@ async def show_my_bookings(message):
         except:
             created_date = booking['created_at']
 
-        await message.answer(
-            f"🔹 📍 {booking['location_address']}\n"
+        blocks.append(
+            f"🔹 {number}. 📍 {booking['location_address']}\n"
             f"📅 Дата: {booking_date}\n"
             f"🕒 Время: {booking['time']}\n"
             f"⏱ Продолжительность: {booking['duration_hours']} час{'а' if booking['duration_hours'] == 2 else ''}\n"
-            f"📝 Забронировано: {created_date}",
-            reply_markup=get_user_booking_keyboard(booking['id'])
+            f"📝 Забронировано: {created_date}"
         )
 
+    # Up to MY_BOOKINGS_PAGE_SIZE bookings per page, fewer if they don't fit in one message
+    pieces, owners = split_html_blocks(blocks, MESSAGE_LIMIT - PAGE_TEXT_RESERVE)
+    pages = paginate_html_blocks(pieces, MESSAGE_LIMIT - PAGE_TEXT_RESERVE, page_size=MY_BOOKINGS_PAGE_SIZE)
+    # The list may have shrunk since the page was shown
+    page = min(max(page, 0), len(pages) - 1)
+    start, end = pages[page]
+    first, last = owners[start], owners[end - 1]
+    page_bookings = bookings[first:last + 1]
 
-def get_user_from_callback(callback_query):
-    """Get user from database by Telegram ID from callback query"""
-    if not callback_query.from_user:
-        return None
+    text = "\n\n".join([f"📅 Ваши забронированные точки:{cooldown_info}"] + pieces[start:end])
+    if len(pages) > 1:
+        text += f"\n\nСтраница {page + 1} из {len(pages)}"
 
-    telegram_id = str(callback_query.from_user.id)
-    return database.get_user_by_telegram_id(telegram_id)
+    return text, get_my_bookings_keyboard(page_bookings, first + 1, page, len(pages))
@@ -9,7 +9,7 @@ def register_common_handlers(dp):
     @router.message()
     async def echo(message: Message):
         # Check if it's a menu button we haven't handled yet
-        if message.text in ["📋 Точки", "👤 Профиль", "📅 Мои бронирования", "ℹ️ Помощь"]:
+        if message.text in ["📋 Точки", "👤 Профиль", "📅 Мои бронирования", "ℹ️ Помощь", "🔍 Свободное время"]:
             # These should be handled by their respective handlers
             return
         
@@ -0,0 +1,180 @@
+import logging
+from datetime import datetime, timedelta
+import re
+from typing import Optional
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+
+from states.booking import BookingForm, FreeSlotSearch
+from utils.keyboards import (
+    get_login_register_keyboard, get_free_slot_duration_keyboard, get_free_slots_keyboard,
+    get_booking_confirmation_keyboard
+)
+from DataBase import async_database
+
+logger = logging.getLogger(__name__)
+
+# How many windows to offer at once
+FREE_SLOTS_LIMIT = 10
+
+# Bookings are accepted at most this many days ahead
+MAX_DAYS_AHEAD = 30
+
+
+def register_free_slot_handlers(dp):
+    """Register free slot search handlers"""
+    router = Router()
+
+    # Start search
+    @router.message(Command("free"))
+    async def cmd_free(message: Message, state: FSMContext, user: Optional[dict]):
+        await start_free_slot_search(message, state, user)
+
+    # Search button handler
+    @router.message(F.text == "🔍 Свободное время")
+    async def button_free(message: Message, state: FSMContext, user: Optional[dict]):
+        await start_free_slot_search(message, state, user)
+
+    # Date or date range input
+    @router.message(FreeSlotSearch.date_input)
+    async def process_date_input(message: Message, state: FSMContext):
+        match = re.match(r'^(\d{2}\.\d{2}\.\d{4})(?:\s*-\s*(\d{2}\.\d{2}\.\d{4}))?$', message.text.strip())
+        if not match:
+            await message.answer(
+                "❌ Неверный формат. Введите дату ДД.ММ.ГГГГ или период ДД.ММ.ГГГГ-ДД.ММ.ГГГГ\n"
+                "Например: 25.06.2025 или 25.06.2025-28.06.2025"
+            )
+            return
+
+        try:
+            date_from = datetime.strptime(match.group(1), '%d.%m.%Y').date()
+            date_to = datetime.strptime(match.group(2), '%d.%m.%Y').date() if match.group(2) else date_from
+        except ValueError:
+            await message.answer("❌ Неверная дата. Проверьте правильность ввода.")
+            return
+
+        today = datetime.now().date()
+        if date_to < date_from:
+            await message.answer("❌ Конец периода раньше начала. Попробуйте снова.")
+            return
+
+        if date_to < today:
+            await message.answer("❌ Дата должна быть в будущем. Попробуйте снова.")
+            return
+
+        if date_from > today + timedelta(days=MAX_DAYS_AHEAD):
+            await message.answer(f"❌ Дата не может быть более чем через {MAX_DAYS_AHEAD} дней. Попробуйте снова.")
+            return
+
+        # Clip the range to what can actually be booked
+        date_from = max(date_from, today)
+        date_to = min(date_to, today + timedelta(days=MAX_DAYS_AHEAD))
+
+        await state.update_data(search_date_from=date_from.isoformat(), search_date_to=date_to.isoformat())
+        await state.set_state(FreeSlotSearch.duration_input)
+        await message.answer(
+            "Выберите продолжительность выступления:",
+            reply_markup=get_free_slot_duration_keyboard()
+        )
+
+    # Duration selection: run the search
+    @router.callback_query(FreeSlotSearch.duration_input, F.data.startswith("free_duration_"))
+    async def process_duration(callback_query: CallbackQuery, state: FSMContext):
+        duration = int(callback_query.data.split("_")[2])
+        data = await state.get_data()
+
+        slots = await async_database.find_free_slots(
+            data['search_date_from'], data['search_date_to'], duration,
+            limit=FREE_SLOTS_LIMIT, not_before=datetime.now()
+        )
+
+        if not slots:
+            await state.clear()
+            await callback_query.message.answer(
+                "😔 В выбранный период нет свободного времени ни на одной точке.\n"
+                "Попробуйте другую дату или продолжительность: /free"
+            )
+            await callback_query.answer()
+            return
+
+        await state.update_data(free_slots=slots)
+        await state.set_state(FreeSlotSearch.results)
+        await callback_query.message.answer(
+            f"🔍 Ближайшее свободное время ({duration} час{'а' if duration == 2 else ''}):\n"
+            "Выберите подходящий вариант:",
+            reply_markup=get_free_slots_keyboard(slots)
+        )
+        await callback_query.answer()
+
+    # Slot chosen: continue with the regular booking confirmation
+    @router.callback_query(FreeSlotSearch.results, F.data.startswith("free_slot_"))
+    async def process_slot_selection(callback_query: CallbackQuery, state: FSMContext):
+        data = await state.get_data()
+        slots = data.get('free_slots', [])
+        index = int(callback_query.data.split("_")[2])
+
+        if index >= len(slots):
+            await callback_query.answer("Вариант устарел, начните поиск заново: /free", show_alert=True)
+            return
+
+        slot = slots[index]
+        await state.set_data({
+            'location_id': slot['location_id'],
+            'booking_date': slot['date'],
+            'booking_time': slot['start_time'],
+            'duration_hours': slot['duration_hours']
+        })
+        await state.set_state(BookingForm.confirmation)
+
+        cooldown_days = await async_database.get_cooldown_days()
+        booking_date = datetime.fromisoformat(slot['date'])
+        cooldown_end = booking_date + timedelta(days=cooldown_days)
+        duration = slot['duration_hours']
+
+        await callback_query.message.answer(
+            f"Подтвердите бронирование:\n\n"
+            f"📍 Место: {slot['location_address']}\n"
+            f"📅 Дата: {booking_date.strftime('%d.%m.%Y')}\n"
+            f"🕒 Время: {slot['start_time']}\n"
+            f"⏱ Продолжительность: {duration} час{'а' if duration == 2 else ''}\n\n"
+            f"⚠️ После этого бронирования вы не сможете бронировать другие точки до {cooldown_end.strftime('%d.%m.%Y')}",
+            reply_markup=get_booking_confirmation_keyboard()
+        )
+        await callback_query.answer()
+
+    # Add the router to the dispatcher
+    dp.include_router(router)
+
+
+async def start_free_slot_search(message, state, user):
+    """Check that the user may book and ask for the date"""
+    if not user:
+        await message.answer(
+            "❌ Для поиска и бронирования точек необходимо войти в систему.\n"
+            "Используйте команду /login для входа или /register для регистрации.",
+            reply_markup=get_login_register_keyboard()
+        )
+        return
+
+    if not user.get('verified'):
+        await message.answer(
+            "⚠️ Ваш аккаунт еще не подтвержден администратором.\n"
+            "После подтверждения вы сможете бронировать точки."
+        )
+        return
+
+    is_in_cooldown, cooldown_date = await async_database.check_user_cooldown(user['id'])
+    if is_in_cooldown:
+        await message.answer(f"⏳ Вы не можете бронировать точки до {cooldown_date.strftime('%d.%m.%Y %H:%M')}")
+        return
+
+    await state.set_state(FreeSlotSearch.date_input)
+    await message.answer(
+        "🔍 Поиск свободного времени на всех точках\n\n"
+        "Введите дату в формате ДД.ММ.ГГГГ или период ДД.ММ.ГГГГ-ДД.ММ.ГГГГ\n"
+        "Например: 25.06.2025 или 25.06.2025-28.06.2025\n\n"
+        "Или отправьте /cancel для отмены."
+    )
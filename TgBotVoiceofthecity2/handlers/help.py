@@ -2,9 +2,6 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import Command
 
-from utils.user import get_user_from_message
-from utils.admin import is_admin
-from DataBase import database
 
 def register_help_handlers(dp):
     """Register help handlers"""
@@ -25,8 +22,6 @@ def register_help_handlers(dp):
 
 async def show_help(message):
     """Show help information"""
-    # Check if user is logged in
-    user = get_user_from_message(message)
     login_register_commands = "/login - Войти в систему\n/register - Зарегистрироваться в системе\n"
     
     # Admin commands are not shown in regular help - only in /admin_help
@@ -37,6 +32,7 @@ async def show_help(message):
         f"{login_register_commands}"
         "/bookings - Просмотреть доступные точки\n"
         "/mybookings - Просмотреть ваши бронирования\n"
+        "/free - Найти свободное время на всех точках\n"
         "/profile - Просмотреть ваш профиль\n"
         "/help - Показать справку\n\n"
         "Вы также можете использовать кнопки меню для навигации.",
@@ -4,15 +4,11 @@ from aiogram.filters import Command
 from pathlib import Path
 
 from utils.keyboards import get_main_keyboard
-from utils.user import get_user_from_message
 
 router = Router()
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
-    # Проверяем, авторизован ли пользователь
-    user = get_user_from_message(message)
-
     # Путь к изображению
     image_path = Path(__file__).parent.parent / "docs" / "image.jpg"
 
@@ -6,3 +6,8 @@ class BookingForm(StatesGroup):
     duration_input = State()
     confirmation = State()
     waiting_for_consent = State()
+
+class FreeSlotSearch(StatesGroup):
+    date_input = State()
+    duration_input = State()
+    results = State()
@@ -0,0 +1,34 @@
+"""
+Concurrent bookings of one slot: exactly one create_booking/update_booking call may win
+Runs the slots mode of DataBase/benchmark_db.py on a throw-away database with fewer calls.
+
+Usage: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DataBase.benchmark_db import run_slot_stress
+
+
+class SlotStressTest(unittest.TestCase):
+
+    def test_one_winner(self):
+        for calls, edits in [(3, 0), (40, 10)]:
+            with self.subTest(calls=calls, edits=edits):
+                result = run_slot_stress(calls, edits)
+                self.assertEqual(result['successes'], 1)
+                self.assertEqual(result['bookings_in_slot'], 1)
+                self.assertEqual(result['slot_owners'], 1)
+
+    def test_adjacent_and_off_grid(self):
+        result = run_slot_stress(5, 2)
+        self.assertTrue(result['adjacent_booked'])
+        self.assertTrue(result['off_grid_refused'])
+
+
+if __name__ == "__main__":
+    unittest.main()
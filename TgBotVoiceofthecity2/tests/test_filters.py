@@ -0,0 +1,100 @@
+"""
+SQL admin filters (DataBase/filters.py) must return exactly what utils/filters.py returns
+The parameter grid of the filters mode of DataBase/benchmark_db.py on a small seeded
+database, and short Cyrillic search terms, which are matched with py_lower() instead of
+the FTS index (SQLite's own lower() only folds ASCII).
+
+Usage: python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DataBase import database
+from DataBase.benchmark_db import run_filter_parity
+from utils import filters as python_filters
+
+NAMES = [('ИВАН', 'ЁЖИКОВ'), ('иван', 'ёжиков'), ('Иван', 'Петров'), ('Ёлка', 'Орлова'), ('Пётр', 'Smith'),
+         ('анна', 'ИВАНОВА')]
+ADDRESSES = ['АРБАТ, 1', 'арбат, 2', 'Невский пр.']
+SEARCHES = ['ив', 'ИВ', 'Ив', 'ё', 'Ё', 'ЁЖ', 'пЁ', 'ар', 'АР', 'не', 'ван']
+
+
+def without_password(users):
+    """get_filtered_users() leaves the password hash out"""
+    return [{key: value for key, value in user.items() if key != 'hash_password'} for user in users]
+
+
+class FilterParityTest(unittest.TestCase):
+
+    def test_parameter_grid(self):
+        cases, mismatches, _ = run_filter_parity(200, 600)
+        self.assertGreater(cases, 0)
+        self.assertEqual(mismatches, [])
+
+
+class CyrillicSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp(prefix='test_filters_')
+        database.init_db(os.path.join(self.db_dir, 'test.db'))
+
+        location_ids = [database.add_location({'address': address, 'img': ''}) for address in ADDRESSES]
+        booking_date = (date.today() + timedelta(days=7)).isoformat()
+        for i, (first_name, second_name) in enumerate(NAMES):
+            user_id = database.add_user({
+                'first_name': first_name,
+                'second_name': second_name,
+                'patronymic': 'Ёсифович' if i % 2 else '',
+                'email': f'user{i}@example.com',
+                'phone': f'+7900{i:07d}',
+                'hash_password': 'test',
+                'verified': True
+            })
+            success, _ = database.create_booking(
+                user_id, location_ids[i % len(location_ids)], booking_date, f'{10 + i}:00', 1
+            )
+            self.assertTrue(success)
+
+    def tearDown(self):
+        database.close_db()
+        shutil.rmtree(self.db_dir)
+
+    def test_users(self):
+        all_users = database.get_all_users()
+        for search in SEARCHES:
+            for sort_by in ['first_name', 'second_name']:
+                for sort_order in ['asc', 'desc']:
+                    with self.subTest(search=search, sort_by=sort_by, sort_order=sort_order):
+                        expected = python_filters.filter_users(
+                            all_users, search=search, sort_by=sort_by, sort_order=sort_order
+                        )
+                        actual = database.get_filtered_users(search=search, sort_by=sort_by, sort_order=sort_order)
+                        self.assertEqual(actual, without_password(expected))
+
+        # Every spelling of "Иван" is found whatever the case of the search term
+        for search in ['ив', 'ИВ', 'иВ']:
+            names = {user['first_name'] for user in database.get_filtered_users(search=search)}
+            self.assertEqual(names, {'ИВАН', 'иван', 'Иван', 'анна'})
+
+    def test_bookings(self):
+        all_bookings = database.get_all_bookings_with_users()
+        for search in SEARCHES:
+            for sort_by in ['location_address', 'speaker_name']:
+                with self.subTest(search=search, sort_by=sort_by):
+                    expected = python_filters.filter_bookings(all_bookings, search=search, sort_by=sort_by)
+                    actual = database.get_filtered_bookings(search=search, sort_by=sort_by)
+                    self.assertEqual(actual, expected)
+
+        addresses = {booking['location_address'] for booking in database.get_filtered_bookings(search='Ар')}
+        self.assertEqual(addresses, {'АРБАТ, 1', 'арбат, 2'})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import re
 from datetime import datetime
 
 
@@ -38,3 +39,130 @@ def format_profile_text(user, is_in_cooldown, cooldown_date):
         f"Статус аккаунта: {verified_status}\n"
         f"Дата регистрации: {format_date(user['cooldown'])}{cooldown_info}{verification_warning}\n"
     )
+
+
+# Telegram's limit for the text of one message
+MESSAGE_LIMIT = 4096
+
+
+def message_length(text):
+    """Length of a message as Telegram counts it (UTF-16 code units), HTML tags included to be safe"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def cut_to_length(text, length):
+    """Cut text into pieces of at most length as counted by message_length(), never inside a tag"""
+    pieces = []
+    piece = ""
+    piece_length = 0
+    # Tags are kept whole, text between them may be cut anywhere
+    for token in re.split(r'(<[^>]*>)', text):
+        units = [token] if token.startswith("<") else token
+        for unit in units:
+            unit_length = message_length(unit)
+            if piece and piece_length + unit_length > length:
+                pieces.append(piece)
+                piece, piece_length = "", 0
+            piece += unit
+            piece_length += unit_length
+    pieces.append(piece)
+    return pieces
+
+
+def split_html_block(block, limit=MESSAGE_LIMIT):
+    """Split a block longer than limit at line breaks, closing and reopening <pre> around the cuts"""
+    open_length, close_length = message_length("<pre>"), message_length("</pre>")
+    parts = []
+    lines = []
+    length = 0
+    in_pre = False
+
+    for line in block.split("\n"):
+        # A line that can't fit even alone is cut into pieces (rare, e.g. a huge table cell)
+        for piece in cut_to_length(line, limit - open_length - close_length):
+            # The last tag in the piece decides whether we're inside <pre> after it
+            opened, closed = piece.rfind("<pre"), piece.rfind("</pre>")
+            in_pre_after = opened > closed or (in_pre and closed == -1)
+
+            piece_length = message_length(piece) + (1 if lines else 0)
+            if lines and length + piece_length + (close_length if in_pre_after else 0) > limit:
+                parts.append("\n".join(lines) + ("</pre>" if in_pre else ""))
+                # The reopened <pre> and the piece go on one line
+                lines = ["<pre>" + piece if in_pre else piece]
+                length = (open_length if in_pre else 0) + message_length(piece)
+            else:
+                lines.append(piece)
+                length += piece_length
+            in_pre = in_pre_after
+
+    parts.append("\n".join(lines))
+    return parts
+
+
+def pack_html_blocks(blocks, limit=MESSAGE_LIMIT, separator="\n\n"):
+    """
+    Pack HTML blocks into as few messages as possible, each at most limit long.
+    Blocks are kept whole when they fit in one message; longer ones are split at line
+    breaks with <pre> closed at the end of one message and reopened in the next.
+    """
+    messages = []
+    current = ""
+    current_length = 0
+    separator_length = message_length(separator)
+
+    for block in blocks:
+        block_length = message_length(block)
+        pieces = [block] if block_length <= limit else split_html_block(block, limit)
+        for piece in pieces:
+            piece_length = message_length(piece)
+            if current and current_length + separator_length + piece_length <= limit:
+                current += separator + piece
+                current_length += separator_length + piece_length
+            else:
+                if current:
+                    messages.append(current)
+                current, current_length = piece, piece_length
+
+    if current:
+        messages.append(current)
+    return messages
+
+
+def split_html_blocks(blocks, limit=MESSAGE_LIMIT):
+    """
+    The blocks with those longer than limit split into pieces that fit (see split_html_block()),
+    and for each piece the index of the block it comes from. Pages of these pieces made by
+    paginate_html_blocks() with the same limit always fit in one message.
+    """
+    pieces = []
+    owners = []
+    for index, block in enumerate(blocks):
+        parts = [block] if message_length(block) <= limit else split_html_block(block, limit)
+        pieces += parts
+        owners += [index] * len(parts)
+    return pieces, owners
+
+
+def paginate_html_blocks(blocks, limit=MESSAGE_LIMIT, separator="\n\n", page_size=None):
+    """
+    Group blocks into pages of whole blocks, each fitting in one message of at most limit
+    and holding at most page_size blocks. Returns (start, end) index ranges of the pages;
+    a block too long for a message gets a page of its own (see pack_html_blocks()).
+    """
+    pages = []
+    start = 0
+    length = 0
+    separator_length = message_length(separator)
+
+    for index, block in enumerate(blocks):
+        block_length = message_length(block)
+        full = page_size is not None and index - start >= page_size
+        if index > start and (full or length + separator_length + block_length > limit):
+            pages.append((start, index))
+            start, length = index, block_length
+        else:
+            length += (separator_length if index > start else 0) + block_length
+
+    if start < len(blocks):
+        pages.append((start, len(blocks)))
+    return pages
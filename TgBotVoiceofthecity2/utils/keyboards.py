@@ -1,5 +1,5 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 def get_main_keyboard():
@@ -7,7 +7,8 @@ def get_main_keyboard():
     return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="📋 Точки"), KeyboardButton(text="👤 Профиль")],
-            [KeyboardButton(text="📅 Мои бронирования"), KeyboardButton(text="ℹ️ Помощь")]
+            [KeyboardButton(text="📅 Мои бронирования"), KeyboardButton(text="ℹ️ Помощь")],
+            [KeyboardButton(text="🔍 Свободное время")]
         ],
         resize_keyboard=True
     )
@@ -76,6 +77,35 @@ def get_schedule_keyboard():
     )
 
 
+def get_free_slot_duration_keyboard():
+    """Return keyboard for duration selection in free slot search"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="1 час", callback_data="free_duration_1"),
+                InlineKeyboardButton(text="2 часа", callback_data="free_duration_2")
+            ],
+            [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_booking")]
+        ]
+    )
+
+
+def get_free_slots_keyboard(slots):
+    """Return keyboard with found free slots, the callback carries the slot index"""
+    keyboard = []
+    for index, slot in enumerate(slots):
+        address = slot['location_address'][:25] + "..." if len(slot['location_address']) > 25 else slot['location_address']
+        slot_date = datetime.fromisoformat(slot['date']).strftime('%d.%m')
+        keyboard.append([InlineKeyboardButton(
+            text=f"{slot_date} {slot['start_time']}-{slot['end_time']} · {address}",
+            callback_data=f"free_slot_{index}"
+        )])
+
+    keyboard.append([InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_booking")])
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 def get_booking_confirmation_keyboard():
     """Return keyboard for booking confirmation"""
     return InlineKeyboardMarkup(
@@ -88,13 +118,85 @@ def get_booking_confirmation_keyboard():
     )
 
 
-def get_user_booking_keyboard(booking_id):
-    """Return keyboard for user booking actions"""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отменить бронирование", callback_data=f"cancel_booking_{booking_id}")]
-        ]
-    )
+def get_page_number_buttons(prefix, page, pages):
+    """Return prev/next buttons of a list browsed by page number, callback data is '<prefix>_<page>'"""
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_{page - 1}"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"{prefix}_{page + 1}"))
+    return buttons
+
+
+def get_my_bookings_keyboard(bookings, first_number, page, pages):
+    """
+    Return keyboard of a page of the user's bookings: a cancel button for each booking,
+    numbered as listed, and prev/next buttons. Cancelling keeps the page number, so the
+    list is refreshed in place.
+    """
+    keyboard = []
+    for number, booking in enumerate(bookings, first_number):
+        try:
+            when = datetime.fromisoformat(booking['date']).strftime('%d.%m')
+        except (ValueError, TypeError):
+            when = booking['date']
+        keyboard.append([InlineKeyboardButton(
+            text=f"❌ Отменить {number}. ({when} {booking['time']})",
+            callback_data=f"cancel_booking_{booking['id']}_{page}"
+        )])
+
+    navigation = get_page_number_buttons("my_bookings_page", page, pages)
+    if navigation:
+        keyboard.append(navigation)
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard) if keyboard else None
+
+
+def get_locations_page_keyboard(locations, page, pages, can_book):
+    """Return keyboard of a page of the locations view: schedule of each location, prev/next, booking"""
+    keyboard = []
+    for location in locations:
+        address = location['address'][:40] + "..." if len(location['address']) > 40 else location['address']
+        keyboard.append([InlineKeyboardButton(
+            text=f"📅 {address}", callback_data=f"schedule_{location['id']}_0_{page}"
+        )])
+
+    navigation = get_page_number_buttons("locations_page", page, pages)
+    if navigation:
+        keyboard.append(navigation)
+
+    if can_book:
+        keyboard += get_start_booking_keyboard().inline_keyboard
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_schedule_browse_keyboard(location_id, day, days, page=None):
+    """
+    Return prev/next day buttons of a location's schedule, day being the number of days
+    from today (0..days). Callback data is 'schedule_<location_id>_<day>[_<page>]', with
+    page of the locations view to go back to, if the schedule was opened from it.
+    """
+    today = datetime.now().date()
+    back = f"_{page}" if page is not None else ""
+
+    navigation = []
+    if day > 0:
+        navigation.append(InlineKeyboardButton(
+            text=f"⬅️ {(today + timedelta(days=day - 1)).strftime('%d.%m')}",
+            callback_data=f"schedule_{location_id}_{day - 1}{back}"
+        ))
+    if day < days:
+        navigation.append(InlineKeyboardButton(
+            text=f"{(today + timedelta(days=day + 1)).strftime('%d.%m')} ➡️",
+            callback_data=f"schedule_{location_id}_{day + 1}{back}"
+        ))
+
+    keyboard = [navigation] if navigation else []
+    if page is not None:
+        keyboard.append([InlineKeyboardButton(text="↩️ К списку точек", callback_data=f"locations_page_{page}")])
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard) if keyboard else None
 
 
 def get_start_booking_keyboard():
@@ -121,3 +223,14 @@ def get_admin_cooldown_keyboard():
             [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_cooldown")]
         ]
     )
+
+
+def get_page_keyboard(prefix, prev_cursor, next_cursor):
+    """Return prev/next buttons of a paginated list, callback data is '<prefix>_p_<id>' / '<prefix>_n_<id>'"""
+    buttons = []
+    if prev_cursor:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_p_{prev_cursor}"))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"{prefix}_n_{next_cursor}"))
+
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
@@ -0,0 +1,239 @@
+"""
+Outgoing message scheduler keeping the bot within Telegram's flood limits
+Every API call addressed to a chat waits for a token from a global bucket (~30 messages
+per second for the whole bot) and from the chat's own bucket (~1 message per second,
+with a small burst). Calls waiting at the same time are served by priority: replies to
+the user first, bulk output (long lists sent as many messages) after them.
+Used through Main.middlewares.SendSchedulerMiddleware on the bot's session.
+"""
+import asyncio
+import bisect
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Telegram's limits for bots: ~30 messages per second overall, ~1 per second per chat
+GLOBAL_RATE = 30
+GLOBAL_BURST = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+
+# Lower is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+# Idle chat buckets are dropped once there are more than this many
+MAX_CHAT_BUCKETS = 1000
+
+# Priority of the calls made by the current task, see bulk()
+_priority = ContextVar('send_priority', default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def bulk():
+    """Send the messages of the block with bulk priority (interactive replies go first)"""
+    token = _priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """rate tokens per second, at most capacity of them saved up"""
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        # Set by pause() after Telegram answered with retry_after
+        self.paused_until = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def ready_at(self, now):
+        """Time at which a token can be taken"""
+        self._refill(now)
+        ready = now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+        return max(ready, self.paused_until)
+
+    def take(self, now):
+        """Take a token (check ready_at() first)"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until):
+        """Hand out nothing until the given time, then a single token with no burst saved up"""
+        self.paused_until = max(self.paused_until, until)
+        self.tokens = 1
+        self.updated = self.paused_until
+
+    def is_idle(self, now):
+        """Full again: the same as a fresh bucket"""
+        self._refill(now)
+        return self.paused_until <= now and self.tokens >= self.capacity
+
+
+class Waiter:
+    """A call waiting for its tokens, ordered by priority and then arrival"""
+
+    def __init__(self, chat_id, priority, sequence, future, queued_at):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.sequence = sequence
+        self.future = future
+        self.queued_at = queued_at
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class SendScheduler:
+    """
+    Grants send permissions in priority order within the global and per-chat rates.
+    Runs a worker task in the event loop of the first acquire(), stop it with close().
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = None
+        self._chats = {}
+        self._waiters = []  # sorted, see Waiter.__lt__
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._loop = None
+        # Counters by priority name
+        self._sent = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        self._wait_total = dict.fromkeys(PRIORITY_NAMES.values(), 0.0)
+        self._wait_max = dict.fromkeys(PRIORITY_NAMES.values(), 0.0)
+        self.retries = 0
+        self.retry_after_total = 0.0
+
+    def _start(self):
+        """Start the worker in the running loop (again, if the previous loop is gone)"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+
+        self._loop = loop
+        self._global = TokenBucket(self.global_rate, self.global_burst, loop.time())
+        self._chats.clear()
+        self._waiters.clear()
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def acquire(self, chat_id, priority=None):
+        """Wait until a message may be sent to chat_id (priority defaults to that of bulk())"""
+        self._start()
+        if priority is None:
+            priority = _priority.get()
+
+        waiter = Waiter(chat_id, priority, next(self._sequence), self._loop.create_future(), self._loop.time())
+        bisect.insort(self._waiters, waiter)
+        self._wakeup.set()
+        await waiter.future
+
+    def retry_after(self, chat_id, seconds):
+        """Telegram answered 429: send nothing more to the chat for the given seconds"""
+        self._start()
+        self.retries += 1
+        self.retry_after_total += seconds
+        self._chat_bucket(chat_id).pause(self._loop.time() + seconds)
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            now = self._loop.time()
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {chat: b for chat, b in self._chats.items() if not b.is_idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def _grant_next(self, now):
+        """Grant the first waiter that can go now; otherwise return when one will be able to"""
+        wake_at = None
+        for index, waiter in enumerate(self._waiters):
+            if waiter.future.done():
+                # Cancelled while waiting
+                del self._waiters[index]
+                return now
+
+            chat = self._chat_bucket(waiter.chat_id)
+            ready = max(self._global.ready_at(now), chat.ready_at(now))
+            if ready <= now:
+                del self._waiters[index]
+                self._global.take(now)
+                chat.take(now)
+                self._record(waiter, now - waiter.queued_at)
+                waiter.future.set_result(None)
+                return now
+
+            wake_at = ready if wake_at is None else min(wake_at, ready)
+        return wake_at
+
+    def _record(self, waiter, waited):
+        name = PRIORITY_NAMES[waiter.priority]
+        self._sent[name] += 1
+        self._wait_total[name] += waited
+        self._wait_max[name] = max(self._wait_max[name], waited)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = self._loop.time()
+            wake_at = self._grant_next(now)
+            if wake_at == now:
+                continue
+
+            try:
+                timeout = None if wake_at is None else wake_at - now
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """Stop the worker, calls still waiting are cancelled"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for waiter in self._waiters:
+            waiter.future.cancel()
+        self._waiters.clear()
+
+    def stats(self):
+        """Queue depth, sent messages and waiting times by priority, retry_after counters"""
+        queued = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                queued[PRIORITY_NAMES[waiter.priority]] += 1
+
+        return {
+            'queued': queued,
+            'sent': dict(self._sent),
+            'avg_wait': {
+                name: round(self._wait_total[name] / sent, 4) if sent else 0.0 for name, sent in self._sent.items()
+            },
+            'max_wait': {name: round(wait, 4) for name, wait in self._wait_max.items()},
+            'chats': len(self._chats),
+            'retries': self.retries,
+            'retry_after_total': round(self.retry_after_total, 1)
+        }
+
+
+# Shared by the bot's session middleware and the admin API's stats endpoint
+send_scheduler = SendScheduler()